@@ -1,51 +1,117 @@
 # audio_stego_utils.py
 import io
 import wave
+from typing import Optional
 import numpy as np
+from bitplane import bytes_to_bits, bits_to_bytes, embed_bits, extract_bits
+from payload import (HEADER_BITS, HEADER_SIZE, PAYLOAD_COMPRESSION, PAYLOAD_PARITY, lsb_capacity, pack,
+                     parse_header, unpack)
 
-def encode_message_audio(audio_bytes, message):
-    """Encode a text message into a WAV audio file (LSB method)."""
-    # Convert message to bits
-    message_bits = ''.join(f"{ord(c):08b}" for c in message)
-    
+LEGACY_HEADER_BITS = 32  # bare 4-byte big-endian length, written before the payload container
+CHUNK_FRAMES = 1 << 16  # frames per read when streaming; bounds peak memory
+
+# -------------------------
+# Helper functions
+# -------------------------
+def _open_wav(source) -> wave.Wave_read:
+    """Open WAV bytes, a path or a binary file object for reading."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
     try:
-        with io.BytesIO(audio_bytes) as audio_file:
-            with wave.open(audio_file, 'rb') as wav:
-                params = wav.getparams()
-                frames = np.frombuffer(wav.readframes(params.nframes), dtype=np.int16)
-    except wave.Error:
+        return wave.open(source, 'rb')
+    except (wave.Error, EOFError):
         raise ValueError("Invalid WAV file. Make sure your audio is uncompressed PCM WAV.")
 
-    if len(message_bits) > len(frames):
-        raise ValueError("Message too long for this audio file.")
+def _lsb_view(raw, sampwidth: int) -> np.ndarray:
+    """
+    uint8 view of the least significant byte of every sample.
+    WAV PCM is little-endian for every width (8/16/24/32-bit), and channels are
+    interleaved, so this walks samples in frame order across all channels.
+    """
+    return np.frombuffer(raw, dtype=np.uint8)[::sampwidth]
 
-    # Encode message bits into LSB of audio frames
-    encoded_frames = frames.copy()
-    for i, bit in enumerate(message_bits):
-        encoded_frames[i] = (encoded_frames[i] & ~1) | int(bit)
+def _frames_for_bits(nbits: int, nchannels: int) -> int:
+    return -(-nbits // nchannels)
 
-    # Save encoded audio to bytes
-    output = io.BytesIO()
-    with wave.open(output, 'wb') as wav_out:
-        wav_out.setparams(params)
-        wav_out.writeframes(encoded_frames.tobytes())
-    return output.getvalue()
+def _read_bits(wav: wave.Wave_read, nbits: int) -> np.ndarray:
+    """LSBs of the first `nbits` samples, reading only the frames that hold them."""
+    wav.rewind()
+    raw = wav.readframes(_frames_for_bits(nbits, wav.getnchannels()))
+    return extract_bits(_lsb_view(raw, wav.getsampwidth()), nbits)
 
-def decode_message_audio(audio_bytes, msg_length):
-    """Decode a hidden text message from a WAV audio file."""
-    try:
-        with io.BytesIO(audio_bytes) as audio_file:
-            with wave.open(audio_file, 'rb') as wav:
-                frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
-    except wave.Error:
-        raise ValueError("Invalid WAV file. Make sure your audio is uncompressed PCM WAV.")
+def _capacity_bits(wav: wave.Wave_read) -> int:
+    return wav.getnframes() * wav.getnchannels()  # 1 bit per sample per channel
 
-    if len(frames) < msg_length * 8:
-        raise ValueError("Audio file too short for the given message length.")
+# -------------------------
+# Main functions
+# -------------------------
+def encode_audio_stream(src, dst, message, compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY,
+                        chunk_frames: int = CHUNK_FRAMES) -> None:
+    """
+    Encode `message` while copying `src` to `dst` one chunk of frames at a time.
+    Both may be paths or binary file objects. Only the leading chunks that carry
+    payload bits are touched; the rest pass straight through, so peak memory is
+    one chunk regardless of file size.
+    """
+    bits = bytes_to_bits(pack(message.encode("utf-8"), compression, parity))
+
+    with _open_wav(src) as wav:
+        params = wav.getparams()
+        if len(bits) > _capacity_bits(wav):
+            raise ValueError("Message too long for this audio file.")
+        with wave.open(dst, 'wb') as wav_out:
+            wav_out.setparams(params)
+            written = 0
+            while True:
+                raw = wav.readframes(chunk_frames)
+                if not raw:
+                    break
+                if written < len(bits):
+                    raw = bytearray(raw)
+                    view = _lsb_view(raw, params.sampwidth)
+                    take = min(len(view), len(bits) - written)
+                    embed_bits(view, bits[written:written + take])
+                    written += take
+                wav_out.writeframes(raw)
+
+def audio_capacity(source, parity: int = PAYLOAD_PARITY) -> dict:
+    """WAV parameters and the largest message that fits, read from the header alone."""
+    with _open_wav(source) as wav:
+        params = wav.getparams()
+        return {"channels": params.nchannels, "sample_rate": params.framerate,
+                "bit_depth": params.sampwidth * 8, "frames": params.nframes,
+                "duration_s": round(params.nframes / params.framerate, 3) if params.framerate else 0.0,
+                "capacity": [lsb_capacity(_capacity_bits(wav), parity)]}
+
+def encode_message_audio(audio_bytes, message, compression: str = PAYLOAD_COMPRESSION,
+                         parity: int = PAYLOAD_PARITY):
+    """Encode a text message into a WAV audio file (LSB method, payload container)."""
+    output = io.BytesIO()
+    encode_audio_stream(audio_bytes, output, message, compression, parity)
+    return output.getvalue()
 
-    # Read the LSB of the first msg_length * 8 samples
-    bits = [str(frames[i] & 1) for i in range(msg_length * 8)]
-    
-    # Convert bits to characters
-    chars = [chr(int(''.join(bits[i:i+8]), 2)) for i in range(0, len(bits), 8)]
-    return ''.join(chars)
+def decode_message_audio(source, msg_length: Optional[int] = None):
+    """
+    Decode a hidden text message from a WAV audio file.
+    Only the samples the payload header accounts for are read. Older files carry
+    a bare 4-byte length instead; `msg_length` is only used for files written
+    before any header existed (one byte per character).
+    """
+    with _open_wav(source) as wav:
+        capacity = _capacity_bits(wav)
+        header = parse_header(bits_to_bytes(_read_bits(wav, HEADER_BITS)))
+        if header is not None:
+            if header.total_bits > capacity:
+                raise ValueError("Corrupted payload header: length exceeds the audio capacity")
+            payload = bits_to_bytes(_read_bits(wav, header.total_bits))
+            return unpack(header, payload[HEADER_SIZE:]).decode("utf-8", errors="replace")
+        header_bits = _read_bits(wav, LEGACY_HEADER_BITS)
+        length = int.from_bytes(bits_to_bytes(header_bits), 'big') if len(header_bits) == LEGACY_HEADER_BITS else 0
+        if 0 < length and LEGACY_HEADER_BITS + length * 8 <= capacity:
+            bits = _read_bits(wav, LEGACY_HEADER_BITS + length * 8)
+            return bits_to_bytes(bits[LEGACY_HEADER_BITS:]).decode("utf-8", errors="replace")
+        if not msg_length:
+            return "[No hidden message]"
+        if capacity < msg_length * 8:
+            raise ValueError("Audio file too short for the given message length.")
+        return bits_to_bytes(_read_bits(wav, msg_length * 8)).decode("latin-1")
@@ -0,0 +1,87 @@
+# bench_detect.py
+# Throughput of model-backed /detect under concurrent load: one forward pass per
+# request versus the MicroBatcher in model_server.py.
+# Usage:
+#   python benchmarks/bench_detect.py
+#   python benchmarks/bench_detect.py --concurrency 1 8 32 --requests 64 --size 512 --wait-ms 5
+#   python benchmarks/bench_detect.py --weights models/best_stego_resnet18.pth
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detector_model import build_detector  # noqa: E402
+from model_server import Detector, MicroBatcher, configure_threads, load_detector  # noqa: E402
+
+def make_png(size: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+async def drive(handler, images, concurrency):
+    """Run every image through `handler` with at most `concurrency` in flight."""
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(data):
+        async with gate:
+            t0 = time.perf_counter()
+            await handler(data)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(data) for data in images))
+    return time.perf_counter() - t0, np.asarray(latencies)
+
+async def bench(detector, images, concurrency, max_crops, wait_ms):
+    async def per_request(data):
+        return await asyncio.to_thread(detector.predict_image, data)
+
+    batcher = MicroBatcher(detector, max_crops=max_crops, max_wait_ms=wait_ms)
+    batcher.start()
+
+    async def batched(data):
+        return await batcher.submit(await asyncio.to_thread(detector.prepare, data))
+
+    rows = []
+    for name, handler in (("per-request", per_request), ("batched", batched)):
+        elapsed, lat = await drive(handler, images, concurrency)
+        rows.append((name, len(images) / elapsed, np.percentile(lat, 50) * 1000, np.percentile(lat, 99) * 1000))
+    stats = batcher.stats()
+    await batcher.stop()
+    return rows, stats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="images per run")
+    parser.add_argument("--size", type=int, default=512, help="image edge in pixels")
+    parser.add_argument("--max-crops", type=int, default=64)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: STEGO_TORCH_THREADS)")
+    parser.add_argument("--weights", type=str, default=None, help="checkpoint to serve (default: random-init detector)")
+    args = parser.parse_args()
+
+    configure_threads(*([args.threads] if args.threads else []))
+    detector = load_detector([args.weights]) if args.weights else Detector(build_detector(pretrained=False))
+    images = [make_png(args.size, seed) for seed in range(args.requests)]
+    detector.predict_image(images[0])  # warm-up
+
+    print(f"{args.requests} x {args.size}px images, {len(detector.prepare(images[0]))} crops each, "
+          f"max_crops={args.max_crops}, wait={args.wait_ms} ms")
+    print(f"{'conc':>5} {'mode':>12} {'img/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        rows, stats = asyncio.run(bench(detector, images, concurrency, args.max_crops, args.wait_ms))
+        for name, throughput, p50, p99 in rows:
+            print(f"{concurrency:>5} {name:>12} {throughput:>8.2f} {p50:>9.1f} {p99:>9.1f}")
+        print(f"{'':>5} {'':>12} mean batch {stats['mean_batch']} requests")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench_detector_backends.py
+# p50/p99 latency and accuracy of the exported detector backends (ONNX fp32,
+# ONNX int8, TorchScript int8) against the fp32 torch model they came from.
+# Usage:
+#   python benchmarks/bench_detector_backends.py
+#   python benchmarks/bench_detector_backends.py --weights models/best_stego_resnet18.pth --data dataset/val
+#   python benchmarks/bench_detector_backends.py --images 64 --size 512 --runs 50
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detector_export import artifact_paths, export_all  # noqa: E402
+from detector_model import build_detector, checkpoint  # noqa: E402
+from model_server import Detector, configure_threads, load_detector  # noqa: E402
+from shards import list_image_folder  # noqa: E402
+
+def synthetic_set(n: int, size: int, seed: int = 0):
+    """Smooth covers and fully LSB-embedded copies, labelled 0 / 1 (clean / stego)."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    items = []
+    for i in range(n):
+        base = np.stack([np.sin(xx * rng.uniform(2, 9) + c) + np.cos(yy * rng.uniform(2, 9)) for c in range(3)], -1)
+        pixels = np.clip((base + 2) * 60 + rng.normal(0, 2, base.shape), 0, 255).astype(np.uint8)
+        label = i % 2
+        if label:
+            pixels = (pixels & 0xFE) | rng.integers(0, 2, pixels.shape, dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, format="PNG")
+        items.append((buf.getvalue(), label))
+    return items
+
+def folder_set(root: str, limit: int):
+    paths, labels, _ = list_image_folder(root)
+    picks = np.linspace(0, len(paths) - 1, min(limit, len(paths))).astype(int)
+    items = []
+    for i in picks:
+        with open(paths[i], "rb") as f:
+            items.append((f.read(), labels[i]))
+    return items
+
+def measure(detector: Detector, inputs, runs: int):
+    """(latencies in ms over `runs` single-image calls, stego probability per image)."""
+    detector.predict(inputs[0])  # warm-up
+    latencies = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        detector.predict(inputs[i % len(inputs)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    probs = np.asarray([float(detector.predict(batch).mean()) for batch in inputs])
+    return np.asarray(latencies), probs
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default=None, help="fp32 checkpoint (default: random-init detector)")
+    parser.add_argument("--data", type=str, default=None, help="ImageFolder root with clean/ and stego/ (default: synthetic)")
+    parser.add_argument("--images", type=int, default=32, help="images scored per backend")
+    parser.add_argument("--size", type=int, default=512, help="synthetic image edge in pixels")
+    parser.add_argument("--runs", type=int, default=30, help="timed single-image calls per backend")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads (default: STEGO_TORCH_THREADS)")
+    args = parser.parse_args()
+
+    configure_threads(*([args.threads] if args.threads else []))
+    items = folder_set(args.data, args.images) if args.data else synthetic_set(args.images, args.size)
+    labels = np.asarray([label for _, label in items])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "detector.pth")
+        if args.weights:
+            fp32 = load_detector([args.weights])
+        else:
+            fp32 = Detector(build_detector(pretrained=False))
+        torch.save(checkpoint(fp32.model) if fp32.input_mode == "native" else fp32.model.state_dict(), weights)
+        inputs = [fp32.prepare(data) for data, _ in items]
+        calibration = [torch.cat(inputs[i:i + 4]) for i in range(0, min(len(inputs), 16), 4)]
+        export_all(fp32.model, weights, calibration, fp32.crop_size, fp32.input_mode)
+
+        backends = [("fp32", fp32)] + [(kind, load_detector([path])) for kind, path in artifact_paths(weights).items()
+                                       if os.path.exists(path)]
+        print(f"{len(items)} images, {len(inputs[0])} crops each, {args.runs} timed runs, "
+              f"{torch.get_num_threads()} threads")
+        print(f"{'backend':>11} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8} {'acc %':>7} {'d acc':>7} "
+              f"{'agree %':>8} {'max |dp|':>9}")
+        base_p50 = base_pred = base_probs = base_acc = None
+        for kind, detector in backends:
+            latencies, probs = measure(detector, inputs, args.runs)
+            pred = probs >= 0.5
+            acc = 100 * float(np.mean(pred == labels))
+            p50, p99 = np.percentile(latencies, 50), np.percentile(latencies, 99)
+            if base_p50 is None:
+                base_p50, base_pred, base_probs, base_acc = p50, pred, probs, acc
+            print(f"{kind:>11} {p50:>8.1f} {p99:>8.1f} {base_p50 / p50:>7.2f}x {acc:>7.1f} {acc - base_acc:>+7.1f} "
+                  f"{100 * np.mean(pred == base_pred):>8.1f} {np.max(np.abs(probs - base_probs)):>9.4f}")
+
+if __name__ == "__main__":
+    main()
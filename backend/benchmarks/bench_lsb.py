@@ -0,0 +1,135 @@
+# bench_lsb.py
+# Compares the old per-pixel LSB loop against the NumPy bit-plane engine.
+# Usage:
+#   python benchmarks/bench_lsb.py
+#   python benchmarks/bench_lsb.py --sizes 1 12 48 --fill 0.25 --skip-legacy
+# Both sides embed the same payload container (payload.pack), so outputs match byte for byte,
+# including for an ICC-tagged JPEG (the profile must survive into the PNG).
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageCms
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from payload import HEADER_BITS, HEADER_SIZE, pack, parse_header, unpack  # noqa: E402
+from stego_utils import PNG_COMPRESS_LEVEL, encode_message, decode_message  # noqa: E402
+
+# -------------------------
+# Reference implementation (pre-NumPy loops)
+# -------------------------
+def legacy_encode(image_bytes: bytes, message: str, compression: str = "none") -> bytes:
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB").copy()
+    payload = pack(message.encode("utf-8"), compression, 0)
+    bits = ''.join(f'{b:08b}' for b in payload)
+    pixels = img.load()
+    idx = 0
+    w, h = img.size
+    for y in range(h):
+        for x in range(w):
+            if idx >= len(bits):
+                break
+            r, g, b = pixels[x, y]
+            r = (r & ~1) | int(bits[idx]) if idx < len(bits) else r; idx += 1
+            g = (g & ~1) | int(bits[idx]) if idx < len(bits) else g; idx += 1
+            b = (b & ~1) | int(bits[idx]) if idx < len(bits) else b; idx += 1
+            pixels[x, y] = (r, g, b)
+        if idx >= len(bits):
+            break
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buf.getvalue()
+
+def legacy_decode(image_bytes: bytes) -> str:
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    pixels = img.load()
+    w, h = img.size
+
+    def read(nbits):
+        bits = []
+        for y in range(h):
+            for x in range(w):
+                if len(bits) >= nbits:
+                    return ''.join(bits)
+                for c in pixels[x, y]:
+                    if len(bits) < nbits:
+                        bits.append(str(c & 1))
+        return ''.join(bits)
+
+    def to_bytes(bits):
+        return bytes(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
+
+    header = parse_header(to_bytes(read(HEADER_BITS)))
+    if header is None or header.total_bits > w * h * 3:
+        return "[No hidden message]"
+    body = to_bytes(read(header.total_bits)[HEADER_BITS:])
+    return unpack(header, body).decode("utf-8", errors="replace")
+
+# -------------------------
+# Benchmark driver
+# -------------------------
+def make_image(megapixels: float, seed: int = 0) -> bytes:
+    side = int((megapixels * 1_000_000) ** 0.5)
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+def make_icc_jpeg(side: int = 320, seed: int = 1) -> bytes:
+    """Phone-style input: a JPEG carrying an sRGB ICC profile."""
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    arr = np.random.default_rng(seed).integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=90, icc_profile=icc)
+    return buf.getvalue()
+
+def check_icc(compression: str) -> None:
+    image_bytes = make_icc_jpeg()
+    message = "icc-tagged input"
+    encoded = encode_message(image_bytes, message, PNG_COMPRESS_LEVEL, compression, 0)
+    assert legacy_encode(image_bytes, message, compression) == encoded, "ICC-tagged output differs from legacy loop"
+    assert Image.open(io.BytesIO(encoded)).info.get("icc_profile") == Image.open(io.BytesIO(image_bytes)).info["icc_profile"]
+    assert decode_message(encoded) == message
+    print("ICC-tagged JPEG: output matches the legacy loop, profile kept")
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 12, 48], help="image sizes in megapixels")
+    parser.add_argument("--fill", type=float, default=0.25, help="fraction of LSB capacity used by the payload")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the NumPy engine")
+    parser.add_argument("--compression", default="none", help="payload codec: none, zlib, lzma or auto")
+    args = parser.parse_args()
+
+    if not args.skip_legacy:
+        check_icc(args.compression)
+    print(f"{'MP':>5} {'engine':>8} {'encode s':>10} {'decode s':>10}")
+    for mp in args.sizes:
+        image_bytes = make_image(mp)
+        side = int((mp * 1_000_000) ** 0.5)
+        n_chars = max(1, int(side * side * 3 * args.fill) // 8 - HEADER_SIZE)
+        message = ("stego-forensics " * (n_chars // 16 + 1))[:n_chars]
+
+        encoded, t_enc = timed(encode_message, image_bytes, message, PNG_COMPRESS_LEVEL, args.compression, 0)
+        decoded, t_dec = timed(decode_message, encoded)
+        assert decoded == message, "round-trip mismatch"
+        print(f"{mp:>5g} {'numpy':>8} {t_enc:>10.3f} {t_dec:>10.3f}")
+
+        if not args.skip_legacy:
+            legacy_bytes, l_enc = timed(legacy_encode, image_bytes, message, args.compression)
+            legacy_msg, l_dec = timed(legacy_decode, encoded)
+            assert legacy_bytes == encoded, "encoded output differs from legacy loop"
+            assert legacy_msg == message
+            print(f"{mp:>5g} {'legacy':>8} {l_enc:>10.3f} {l_dec:>10.3f}"
+                  f"   speedup x{l_enc / t_enc:.1f} / x{l_dec / t_dec:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# bench_suite.py
+# Reproducible benchmarks for the image, audio and video engines over a size grid.
+# Inputs are synthetic and seeded, so two runs on the same machine time the same bytes.
+# Each case runs in a freshly spawned interpreter: timings are the best of --repeat runs
+# and peak memory is that process's peak RSS above its RSS once the inputs are loaded
+# (Linux /proc counters).
+# Usage:
+#   python benchmarks/bench_suite.py --quick --out results.json
+#   python benchmarks/bench_suite.py --out new.json --baseline results.json --tolerance 0.15
+#   python benchmarks/bench_suite.py --engines image audio --image-mp 1 12 48 --payload-kb 1 256
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audio_stego_utils import decode_message_audio, encode_message_audio  # noqa: E402
+from payload import CODECS, max_message_bytes  # noqa: E402
+from stego_utils import PNG_COMPRESS_LEVEL, decode_message, detect_stego, encode_message  # noqa: E402
+
+ENGINES = ("image", "audio", "video")
+VIDEO_SIZES = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080)}
+AUDIO_RATE = 44100
+AUDIO_CHANNELS = 2
+QUICK = {"image_mp": [0.25, 1], "audio_s": [5], "video": ["360p:10"], "payload_kb": [1, 16]}
+FULL = {"image_mp": [1, 4, 12], "audio_s": [10, 60, 300], "video": ["720p:30", "1080p:30"],
+        "payload_kb": [1, 64, 512]}
+MIN_TIME_DELTA = 0.005  # s; slowdowns smaller than this are timer noise, whatever the ratio
+
+# -------------------------
+# Synthetic inputs (seeded)
+# -------------------------
+def make_message(kb: float) -> str:
+    n = max(1, int(kb * 1024))
+    return ("stego-forensics " * (n // 16 + 1))[:n]
+
+def make_image(megapixels: float, seed: int = 0) -> bytes:
+    """Smooth gradient plus noise: compresses like a photo rather than like pure noise."""
+    side = int((megapixels * 1_000_000) ** 0.5)
+    rng = np.random.default_rng(seed)
+    ramp = np.add.outer(np.arange(side), np.arange(side)) * (255 / max(1, 2 * side - 2))
+    arr = np.clip(ramp[..., None] + rng.normal(0, 12, (side, side, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+def make_wav(seconds: float, seed: int = 0) -> bytes:
+    frames = int(seconds * AUDIO_RATE)
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames) / AUDIO_RATE
+    tone = 8000 * np.sin(2 * np.pi * 440 * t)[:, None] + rng.normal(0, 500, (frames, AUDIO_CHANNELS))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(AUDIO_CHANNELS)
+        wav.setsampwidth(2)
+        wav.setframerate(AUDIO_RATE)
+        wav.writeframes(tone.astype("<i2").tobytes())
+    return buf.getvalue()
+
+def make_clip(path: str, size, frames: int, seed: int = 0) -> None:
+    """Lossless FFV1 clip of a drifting noise frame."""
+    import cv2
+    w, h = size
+    base = np.random.default_rng(seed).integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"FFV1"), 25, (w, h))
+    for i in range(frames):
+        out.write(np.roll(base, i, axis=1))
+    out.release()
+
+# -------------------------
+# Cases
+# -------------------------
+def image_cases(sizes, payloads, packing):
+    for mp_ in sizes:
+        image_bytes = make_image(mp_)
+        side = int((mp_ * 1_000_000) ** 0.5)
+        raw, pixels = side * side * 3, side * side
+        for kb in payloads:
+            message = make_message(kb)
+            if len(message) > max_message_bytes(pixels * 3, packing[1]):
+                continue
+            encoded = encode_message(image_bytes, message, PNG_COMPRESS_LEVEL, *packing)
+            key = {"size": f"{mp_:g}MP", "payload_kb": kb, "raw_bytes": raw, "pixels": pixels}
+            yield dict(key, engine="image.encode", fn=encode_message,
+                       args=(image_bytes, message, PNG_COMPRESS_LEVEL, *packing))
+            yield dict(key, engine="image.decode", fn=decode_message, args=(encoded,), expect=message)
+        yield {"engine": "image.detect", "size": f"{mp_:g}MP", "payload_kb": 0, "raw_bytes": raw,
+               "pixels": pixels, "fn": detect_stego, "args": (image_bytes,)}
+
+def audio_cases(durations, payloads, packing):
+    for seconds in durations:
+        wav_bytes = make_wav(seconds)
+        frames = int(seconds * AUDIO_RATE)
+        raw = frames * AUDIO_CHANNELS * 2
+        for kb in payloads:
+            message = make_message(kb)
+            if len(message) > max_message_bytes(frames * AUDIO_CHANNELS, packing[1]):
+                continue
+            encoded = encode_message_audio(wav_bytes, message, *packing)
+            key = {"size": f"{seconds:g}s", "payload_kb": kb, "raw_bytes": raw, "pixels": None}
+            yield dict(key, engine="audio.encode", fn=encode_message_audio, args=(wav_bytes, message, *packing))
+            yield dict(key, engine="audio.decode", fn=decode_message_audio, args=(encoded,), expect=message)
+
+def video_cases(specs, payloads, packing, tmp):
+    import vid  # cv2 only when video is benchmarked; children import it while unpickling, untimed
+    for spec in specs:
+        name, _, frames = spec.partition(":")
+        frames = int(frames or 30)
+        w, h = VIDEO_SIZES[name]
+        clip = os.path.join(tmp, f"{name}_{frames}.mkv")
+        make_clip(clip, (w, h), frames)
+        raw, pixels = w * h * 3 * frames, w * h * frames
+        for kb in payloads:
+            message = make_message(kb)
+            if len(message) > max_message_bytes(raw, packing[1]):
+                continue
+            encoded = os.path.join(tmp, f"{name}_{frames}_{kb}.avi")
+            vid.encode_video(clip, message, encoded, vid.DEFAULT_CODEC, None, *packing)
+            key = {"size": f"{name}/{frames}f", "payload_kb": kb, "raw_bytes": raw, "pixels": pixels}
+            yield dict(key, engine="video.encode", fn=vid.encode_video,
+                       args=(clip, message, os.path.join(tmp, "bench_out.avi"), vid.DEFAULT_CODEC, None, *packing))
+            yield dict(key, engine="video.decode", fn=vid.decode_video, args=(encoded,), expect=message)
+
+# -------------------------
+# Measurement
+# -------------------------
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"^{field}:\s+(\d+) kB", f.read(), re.M).group(1)) / 1e3
+
+def _child(conn, fn, args, repeat, expect):
+    try:
+        # exec keeps the parent's high-water mark; reset it so the peak is this case's own
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        start_rss = _status_mb("VmRSS")
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn(*args)
+            times.append(time.perf_counter() - t0)
+            if expect is not None and out != expect:
+                raise AssertionError("round-trip mismatch")
+        conn.send({"times": times, "peak_mb": max(0.0, _status_mb("VmHWM") - start_rss)})
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def measure(case: dict, repeat: int) -> dict:
+    ctx = mp.get_context("spawn")  # a fork would reuse the parent's freed heap and hide allocations
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(child, case["fn"], case["args"], repeat, case.get("expect")))
+    proc.start()
+    child.close()
+    report = parent.recv()
+    proc.join()
+    row = {k: case[k] for k in ("engine", "size", "payload_kb")}
+    if "error" in report:
+        return dict(row, error=report["error"])
+    best = min(report["times"])
+    row.update(seconds=round(best, 4), median_s=round(statistics.median(report["times"]), 4),
+               mb_s=round(case["raw_bytes"] / 1e6 / best, 2), peak_mb=round(report["peak_mb"], 1))
+    if case["pixels"]:
+        row["mpx_s"] = round(case["pixels"] / 1e6 / best, 2)
+    return row
+
+# -------------------------
+# Baseline comparison
+# -------------------------
+def _key(row: dict) -> tuple:
+    return row["engine"], row["size"], row["payload_kb"]
+
+def compare(results: list, baseline: dict, tolerance: float) -> int:
+    """Print time and memory ratios against a baseline run; returns the number of regressions."""
+    old = {_key(r): r for r in baseline["results"] if "seconds" in r}
+    regressions = 0
+    print(f"\n{'engine':<14} {'size':>10} {'KiB':>6} {'time x':>8} {'mem x':>8}")
+    for row in results:
+        prev = old.get(_key(row))
+        if prev is None or "seconds" not in row:
+            continue
+        t_ratio = row["seconds"] / max(prev["seconds"], 1e-9)
+        m_ratio = (row["peak_mb"] + 1) / (prev["peak_mb"] + 1)  # +1 MB keeps tiny peaks from dominating
+        slower = ((t_ratio > 1 + tolerance and row["seconds"] - prev["seconds"] > MIN_TIME_DELTA)
+                  or m_ratio > 1 + tolerance)
+        regressions += slower
+        print(f"{row['engine']:<14} {row['size']:>10} {row['payload_kb']:>6g} {t_ratio:>8.2f} {m_ratio:>8.2f}"
+              f"{'  REGRESSION' if slower else ''}")
+    return regressions
+
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__,
+            "pillow": Image.__version__, "machine": platform.machine(), "cpus": os.cpu_count(),
+            "repeat": args.repeat, "compression": args.compression, "parity": args.parity,
+            "grid": {k: getattr(args, k) for k in FULL}}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--quick", action="store_true", help="small grid (defaults below become the quick ones)")
+    parser.add_argument("--image-mp", dest="image_mp", type=float, nargs="+", help="image sizes in megapixels")
+    parser.add_argument("--audio-s", dest="audio_s", type=float, nargs="+", help="WAV durations in seconds")
+    parser.add_argument("--video", nargs="+", help=f"RES:FRAMES, RES one of {', '.join(VIDEO_SIZES)}")
+    parser.add_argument("--payload-kb", dest="payload_kb", type=float, nargs="+", help="payload sizes in KiB")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported")
+    # "none" keeps --payload-kb the embedded size; the repeated benchmark text compresses ~100x
+    parser.add_argument("--compression", default="none", choices=("auto",) + CODECS, help="payload compression")
+    parser.add_argument("--parity", type=int, default=0, help="Reed-Solomon parity bytes per 255-byte block")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown / memory growth")
+    args = parser.parse_args()
+    grid = QUICK if args.quick else FULL
+    for k, default in grid.items():
+        if getattr(args, k) is None:
+            setattr(args, k, default)
+
+    results = []
+    print(f"{'engine':<14} {'size':>10} {'KiB':>6} {'best s':>9} {'MB/s':>9} {'Mpx/s':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        packing = (args.compression, args.parity)
+        sources = {"image": lambda: image_cases(args.image_mp, args.payload_kb, packing),
+                   "audio": lambda: audio_cases(args.audio_s, args.payload_kb, packing),
+                   "video": lambda: video_cases(args.video, args.payload_kb, packing, tmp)}
+        for engine in args.engines:
+            for case in sources[engine]():
+                row = measure(case, args.repeat)
+                results.append(row)
+                if "error" in row:
+                    print(f"{row['engine']:<14} {row['size']:>10} {row['payload_kb']:>6g}  {row['error']}")
+                    continue
+                mpx = f"{row['mpx_s']:>8.1f}" if "mpx_s" in row else f"{'-':>8}"
+                print(f"{row['engine']:<14} {row['size']:>10} {row['payload_kb']:>6g} {row['seconds']:>9.3f} "
+                      f"{row['mb_s']:>9.1f} {mpx} {row['peak_mb']:>8.1f}")
+
+    report = {"meta": _meta(args), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{regressions} case(s) beyond the {args.tolerance:.0%} tolerance")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# bitplane.py
+# Whole-array LSB embedding / extraction shared by the image, audio and video engines.
+import numpy as np
+
+# -------------------------
+# Bit packing
+# -------------------------
+def bytes_to_bits(data: bytes) -> np.ndarray:
+    """Unpack bytes into a uint8 array of 0/1 values, MSB first."""
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+def bits_to_bytes(bits: np.ndarray) -> bytes:
+    """Pack 0/1 values back into bytes, dropping any trailing partial byte."""
+    usable = len(bits) - (len(bits) % 8)
+    return np.packbits(bits[:usable]).tobytes()
+
+# -------------------------
+# Embedding / extraction
+# -------------------------
+def embed_bits(flat: np.ndarray, bits: np.ndarray, offset: int = 0) -> None:
+    """Write `bits` into the LSBs of `flat[offset:]` in place."""
+    end = offset + len(bits)
+    if end > flat.size:
+        raise ValueError("Carrier too small for this message")
+    view = flat[offset:end]
+    np.bitwise_and(view, ~np.array(1, dtype=view.dtype), out=view)
+    np.bitwise_or(view, bits.astype(view.dtype, copy=False), out=view)
+
+def extract_bits(flat: np.ndarray, nbits: int, offset: int = 0) -> np.ndarray:
+    """Return up to `nbits` LSBs from `flat[offset:]` as a uint8 array."""
+    return (flat[offset:offset + nbits] & 1).astype(np.uint8, copy=False)
+
+def embed_payload(flat: np.ndarray, payload: bytes, offset: int = 0) -> None:
+    embed_bits(flat, bytes_to_bits(payload), offset)
+
+def extract_payload(flat: np.ndarray, nbytes: int, offset: int = 0) -> bytes:
+    return bits_to_bytes(extract_bits(flat, nbytes * 8, offset))
@@ -0,0 +1,136 @@
+# detector_export.py
+# Export a trained detector for CPU serving: ONNX (fp32 + int8 for ONNX Runtime)
+# and a static int8 TorchScript model. Artifacts sit next to the .pth weights and
+# stego_utils.detector_artifacts() picks whichever exists.
+import copy
+import json
+import os
+import warnings
+from typing import List, Optional
+
+import torch
+import torch.nn as nn
+
+from detector_model import CROP_SIZE, to_input
+
+ONNX_OPSET = 17
+CALIBRATION_BATCHES = 8
+
+def artifact_paths(weights_path: str) -> dict:
+    base = os.path.splitext(weights_path)[0]
+    return {"onnx": base + ".onnx", "onnx_int8": base + ".int8.onnx", "torch_int8": base + ".int8.pt"}
+
+def calibration_batches(loader, n: int = CALIBRATION_BATCHES) -> List[torch.Tensor]:
+    """First `n` input batches of a (validation) loader, scaled like training inputs."""
+    batches = []
+    for images, _ in loader:
+        batches.append(to_input(images).cpu())
+        if len(batches) >= n:
+            break
+    return batches
+
+# -------------------------
+# ONNX
+# -------------------------
+def _set_onnx_metadata(path: str, meta: dict) -> None:
+    import onnx
+    model = onnx.load(path)
+    for key, value in meta.items():
+        entry = model.metadata_props.add()
+        entry.key, entry.value = key, str(value)
+    onnx.save(model, path)
+
+def export_onnx(model: nn.Module, path: str, crop_size: int = CROP_SIZE, input_mode: str = "native") -> str:
+    """fp32 ONNX graph with a dynamic batch axis; input settings go in the metadata."""
+    model = copy.deepcopy(model).cpu().eval()
+    example = torch.zeros(1, 3, crop_size, crop_size)
+    torch.onnx.export(model, (example,), path, input_names=["input"], output_names=["logits"],
+                      dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                      opset_version=ONNX_OPSET, dynamo=False)
+    _set_onnx_metadata(path, {"input_mode": input_mode, "crop_size": crop_size})
+    return path
+
+class _BatchReader:
+    """onnxruntime CalibrationDataReader over a list of input batches."""
+    def __init__(self, batches):
+        self._batches = iter(batches)
+
+    def get_next(self):
+        batch = next(self._batches, None)
+        return None if batch is None else {"input": batch.numpy()}
+
+    def rewind(self):
+        pass
+
+def quantize_onnx(fp32_path: str, path: str, calibration: Optional[List[torch.Tensor]] = None,
+                  crop_size: int = CROP_SIZE, input_mode: str = "native") -> str:
+    """
+    int8 ONNX: static (QDQ, per-channel, calibrated) when calibration batches are
+    given, dynamic otherwise. The SRM front-end stays fp32 so +-1 residuals survive.
+    """
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = path + ".pre.onnx"
+    quant_pre_process(fp32_path, prepared)
+    keep_fp32 = [n.name for n in onnx.load(prepared).graph.node if n.name.startswith("/0/")]
+    try:
+        if calibration:
+            quantize_static(prepared, path, _BatchReader(calibration), quant_format=QuantFormat.QDQ,
+                            weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8,
+                            per_channel=True, nodes_to_exclude=keep_fp32)
+        else:
+            quantize_dynamic(prepared, path, weight_type=QuantType.QUInt8, nodes_to_exclude=keep_fp32)
+    finally:
+        os.remove(prepared)
+    _set_onnx_metadata(path, {"input_mode": input_mode, "crop_size": crop_size})
+    return path
+
+# -------------------------
+# int8 TorchScript
+# -------------------------
+def quantize_torch(model: nn.Module, path: str, calibration: List[torch.Tensor],
+                   crop_size: int = CROP_SIZE, input_mode: str = "native") -> str:
+    """Static int8 (FX graph mode, x86 backend) saved as frozen TorchScript."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.fx.custom_config import PrepareCustomConfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not calibration:
+        raise ValueError("Static int8 quantization needs calibration batches")
+    model = copy.deepcopy(model).cpu().eval()
+    qconfig = get_default_qconfig_mapping("x86")
+    custom = PrepareCustomConfig()
+    if input_mode == "native":
+        # SRM front-end stays fp32, and out of the FX graph: its autocast guard reads x.device
+        qconfig = qconfig.set_module_name("0", None)
+        custom = custom.set_non_traceable_module_names(["0"])
+    example = calibration[0][:1]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", (UserWarning, FutureWarning))  # FX / TorchScript deprecation notices
+        prepared = prepare_fx(model, qconfig, (example,), prepare_custom_config=custom)
+        with torch.inference_mode():
+            for batch in calibration:
+                prepared(batch)
+        quantized = convert_fx(prepared)
+        scripted = torch.jit.freeze(torch.jit.trace(quantized, (example,)))
+        meta = json.dumps({"input_mode": input_mode, "crop_size": crop_size})
+        torch.jit.save(scripted, path, _extra_files={"meta.json": meta})
+    return path
+
+def export_all(model: nn.Module, weights_path: str, calibration: Optional[List[torch.Tensor]] = None,
+               crop_size: int = CROP_SIZE, input_mode: str = "native") -> dict:
+    """Write every serving artifact that the installed packages allow; returns {kind: path}."""
+    paths = artifact_paths(weights_path)
+    written = {}
+    try:
+        written["onnx"] = export_onnx(model, paths["onnx"], crop_size, input_mode)
+        written["onnx_int8"] = quantize_onnx(paths["onnx"], paths["onnx_int8"], calibration, crop_size, input_mode)
+    except ImportError as e:
+        print(f"Skipping ONNX export ({e})")
+    if calibration:
+        written["torch_int8"] = quantize_torch(model, paths["torch_int8"], calibration, crop_size, input_mode)
+    for kind, path in written.items():
+        print(f"  {kind}: {path}")
+    return written
@@ -0,0 +1,130 @@
+# detector_model.py
+# Detector input pipeline shared by the trainers and stego_utils: native-resolution
+# crops (no resampling, so LSB noise survives) and an SRM high-pass residual front-end.
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from PIL import Image
+from torchvision import models
+
+CROP_SIZE = 256        # crop edge fed to the network
+MAX_EVAL_CROPS = 16    # grid crops scored per image at validation / serving time
+TLU_THRESHOLD = 3.0    # residuals are truncated to +-3 grey levels (SRNet / Yedroudj-Net style)
+
+# SRM high-pass kernels (Fridrich & Kodovsky), as used in RGB-N: 2nd-order "KB",
+# 5x5 "KV" and a 2nd-order horizontal line filter
+_SRM = np.array([
+    [[0, 0, 0, 0, 0],
+     [0, -1, 2, -1, 0],
+     [0, 2, -4, 2, 0],
+     [0, -1, 2, -1, 0],
+     [0, 0, 0, 0, 0]],
+    [[-1, 2, -2, 2, -1],
+     [2, -6, 8, -6, 2],
+     [-2, 8, -12, 8, -2],
+     [2, -6, 8, -6, 2],
+     [-1, 2, -2, 2, -1]],
+    [[0, 0, 0, 0, 0],
+     [0, 0, 0, 0, 0],
+     [0, 1, -2, 1, 0],
+     [0, 0, 0, 0, 0],
+     [0, 0, 0, 0, 0]],
+], dtype=np.float32) / np.array([4, 12, 2], dtype=np.float32)[:, None, None]
+
+# -------------------------
+# Crops (uint8 CxHxW tensors, no resampling)
+# -------------------------
+def to_uint8_tensor(image) -> torch.Tensor:
+    """PIL image or HxWx3 array -> uint8 CxHxW tensor."""
+    if isinstance(image, Image.Image):
+        image = np.array(image.convert("RGB"))  # writable copy for torch.from_numpy
+    if isinstance(image, np.ndarray):
+        image = torch.from_numpy(np.ascontiguousarray(image)).permute(2, 0, 1)
+    return image
+
+def _pad_to(image: torch.Tensor, size: int) -> torch.Tensor:
+    _, h, w = image.shape
+    pad_h, pad_w = max(0, size - h), max(0, size - w)
+    if not pad_h and not pad_w:
+        return image
+    mode = "reflect" if pad_h < h and pad_w < w else "replicate"
+    padded = F.pad(image[None].float(), (0, pad_w, 0, pad_h), mode=mode)
+    return padded[0].to(image.dtype)
+
+def random_crop(image, size: int = CROP_SIZE, generator=None) -> torch.Tensor:
+    image = _pad_to(to_uint8_tensor(image), size)
+    _, h, w = image.shape
+    top = int(torch.randint(0, h - size + 1, (1,), generator=generator))
+    left = int(torch.randint(0, w - size + 1, (1,), generator=generator))
+    return image[:, top:top + size, left:left + size]
+
+def center_crop(image, size: int = CROP_SIZE) -> torch.Tensor:
+    image = _pad_to(to_uint8_tensor(image), size)
+    _, h, w = image.shape
+    top, left = (h - size) // 2, (w - size) // 2
+    return image[:, top:top + size, left:left + size]
+
+def grid_crops(image, size: int = CROP_SIZE, max_crops: int = MAX_EVAL_CROPS) -> torch.Tensor:
+    """Evenly spaced crops covering the image, as an (N, C, size, size) uint8 batch."""
+    image = _pad_to(to_uint8_tensor(image), size)
+    _, h, w = image.shape
+    rows = max(1, min(h // size, int(max_crops ** 0.5)))
+    cols = max(1, min(w // size, max_crops // rows))
+    tops = np.linspace(0, h - size, rows).round().astype(int)
+    lefts = np.linspace(0, w - size, cols).round().astype(int)
+    return torch.stack([image[:, t:t + size, l:l + size] for t in tops for l in lefts])
+
+def to_input(batch: torch.Tensor) -> torch.Tensor:
+    """uint8 batch -> float [0, 1], the scale SRMResidual expects."""
+    return batch.float().div_(255) if batch.dtype == torch.uint8 else batch
+
+def inference_batch(image, crop_size: int = CROP_SIZE, max_crops: int = MAX_EVAL_CROPS) -> torch.Tensor:
+    """Grid crops of one image as a float model batch; used by the serving-side detector."""
+    return to_input(grid_crops(image, crop_size, max_crops))
+
+class RandomNativeCrop:
+    """Dataset transform: random crop at native resolution, returned as uint8 CxHxW."""
+    def __init__(self, size: int = CROP_SIZE):
+        self.size = size
+
+    def __call__(self, image):
+        return random_crop(image, self.size)
+
+class CenterNativeCrop:
+    def __init__(self, size: int = CROP_SIZE):
+        self.size = size
+
+    def __call__(self, image):
+        return center_crop(image, self.size)
+
+# -------------------------
+# Model
+# -------------------------
+class SRMResidual(nn.Module):
+    """
+    Fixed SRM high-pass filters applied to a [0, 1] batch in one conv2d, truncated
+    to +-TLU_THRESHOLD grey levels and rescaled to [-1, 1]. Output keeps 3 channels
+    so it drops straight in front of an ImageNet ResNet.
+    """
+    def __init__(self, threshold: float = TLU_THRESHOLD):
+        super().__init__()
+        weight = torch.from_numpy(_SRM)[:, None].repeat(1, 3, 1, 1)  # same kernel on R, G, B
+        self.register_buffer("weight", weight)
+        self.threshold = threshold
+
+    def forward(self, x):
+        # always fp32: under bf16 autocast the +-1 residuals would drown in rounding error
+        with torch.autocast(x.device.type, enabled=False):
+            residual = F.conv2d(x.float() * 255.0, self.weight.float(), padding=2)
+        return torch.clamp(residual, -self.threshold, self.threshold) / self.threshold
+
+def build_detector(pretrained: bool = True) -> nn.Module:
+    """SRM front-end + ResNet18 with a 2-way (clean / stego) head."""
+    resnet = models.resnet18(weights=models.ResNet18_Weights.DEFAULT if pretrained else None)
+    resnet.fc = nn.Linear(resnet.fc.in_features, 2)
+    return nn.Sequential(SRMResidual(), resnet)
+
+def checkpoint(model: nn.Module) -> dict:
+    """State dict plus the input settings serving must reproduce."""
+    return {"input_mode": "native", "crop_size": CROP_SIZE, "state_dict": model.state_dict()}
@@ -2,11 +2,33 @@
 # Usage:
 #   python generate_stego_dataset.py
 #   python generate_stego_dataset.py --message "my secret" --src dataset/train/clean --dst dataset/train/stego
+#   python generate_stego_dataset.py --workers 8   # interrupted runs resume from dst/manifest.jsonl
+#   python generate_stego_dataset.py --config synth.json   # random payloads, sampled rates and schemes
+#
+# synth.json (all keys optional):
+#   {"bpp": [0.05, 1.0],                                   # payload bits per pixel, sampled uniformly
+#    "schemes": {"lsb": 1, "lsb_random": 1, "lsb_matching": 1},  # relative weights
+#    "seed": 1234, "batch_size": 16}
 import os
 import argparse
+import csv
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 from PIL import Image
 import sys
+from bitplane import bytes_to_bits, embed_bits
+from payload import HEADER_SIZE, pack
+
+MANIFEST_NAME = "manifest.jsonl"
+LABELS_NAME = "labels.csv"
+PROGRESS_EVERY = 2.0  # seconds between throughput lines
+DEFAULT_SYNTH = {"bpp": [0.05, 1.0], "schemes": {"lsb": 1, "lsb_random": 1, "lsb_matching": 1},
+                 "seed": 0, "batch_size": 16}
+LABEL_FIELDS = ["file", "label", "scheme", "bpp", "embedding_rate", "payload_bytes", "seed"]
 
 def ensure_dirs(path):
     Path(path).mkdir(parents=True, exist_ok=True)
@@ -35,40 +57,180 @@ def lsb_encode_image(input_path, out_path, message="HELLO"):
     """
     Simple LSB text steganography for 24-bit PNGs.
     Not robust — for dataset generation only.
+    Returns the embedding rate (payload bits / LSB capacity).
     """
     img = Image.open(input_path).convert("RGB")
     w, h = img.size
     max_bytes = (w * h * 3) // 8
-    data = message.encode('utf-8')
-    if len(data) + 1 > max_bytes:
-        raise ValueError(f"Message too large for image {input_path}. Max bytes: {max_bytes}")
-
-    # build payload: length byte(s) + data
-    payload = bytes([len(data)]) + data  # one-byte length prefix (works if message <256 bytes)
-    bits = []
-    for byte in payload:
-        for i in range(8):
-            bits.append((byte >> (7 - i)) & 1)
-    # pad remaining pixels with zeros
-    pixels = list(img.getdata())
-    new_pixels = []
-    bit_idx = 0
-    total_bits = len(bits)
-    for px in pixels:
-        r, g, b = px
-        if bit_idx < total_bits:
-            r = (r & ~1) | bits[bit_idx]; bit_idx += 1
-        if bit_idx < total_bits:
-            g = (g & ~1) | bits[bit_idx]; bit_idx += 1
-        if bit_idx < total_bits:
-            b = (b & ~1) | bits[bit_idx]; bit_idx += 1
-        new_pixels.append((r,g,b))
-    stego = Image.new("RGB", img.size)
-    stego.putdata(new_pixels)
-    stego.save(out_path, "PNG")
+    # same payload container as the app (uncompressed, no parity), so any message length works
+    payload = pack(message.encode('utf-8'), "none", 0)
+    if len(payload) > max_bytes:
+        raise ValueError(f"Message too large for image {input_path}. Max bytes: {max_bytes - HEADER_SIZE}")
+
+    pixels = np.array(img, dtype=np.uint8)
+    embed_bits(pixels.reshape(-1), bytes_to_bits(payload))
+    Image.fromarray(pixels).save(out_path, "PNG")
+    return len(payload) * 8 / pixels.size
+
+# ---------- Embedding schemes for synthesized payloads ----------
+def embed_sequential(flat, bits, rng):
+    """Plain LSB replacement from the first sample on."""
+    embed_bits(flat, bits)
+
+def embed_random_walk(flat, bits, rng):
+    """LSB replacement at a seeded random subset of samples."""
+    positions = rng.choice(flat.size, size=len(bits), replace=False)
+    flat[positions] = (flat[positions] & 0xFE) | bits
+
+def embed_lsb_matching(flat, bits, rng):
+    """±1 embedding: samples whose LSB differs move up or down at random (clamped at 0/255)."""
+    positions = rng.choice(flat.size, size=len(bits), replace=False)
+    values = flat[positions].astype(np.int16)
+    change = (values & 1) != bits
+    step = np.where(rng.random(len(bits)) < 0.5, -1, 1)
+    step[values == 0] = 1
+    step[values == 255] = -1
+    values[change] += step[change]
+    flat[positions] = values.astype(np.uint8)
+
+SCHEMES = {
+    "lsb": embed_sequential,
+    "lsb_random": embed_random_walk,
+    "lsb_matching": embed_lsb_matching,
+}
+
+def load_synth_config(path):
+    cfg = dict(DEFAULT_SYNTH)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            cfg.update(json.load(f))
+    lo, hi = cfg["bpp"]
+    if not 0 < lo <= hi <= 3:
+        raise ValueError("bpp range must satisfy 0 < min <= max <= 3 (RGB has 3 LSBs per pixel)")
+    unknown = set(cfg["schemes"]) - set(SCHEMES)
+    if unknown:
+        raise ValueError(f"Unknown schemes {sorted(unknown)}; choose from {sorted(SCHEMES)}")
+    return cfg
+
+def synthesize_image(input_path, out_path, cfg, seed):
+    """
+    Embed a random payload at a sampled rate with a sampled scheme.
+    Everything is drawn from `seed`, so a resumed run reproduces the same choices.
+    """
+    rng = np.random.default_rng(seed)
+    names = sorted(cfg["schemes"])
+    weights = np.array([cfg["schemes"][n] for n in names], dtype=np.float64)
+    scheme = names[rng.choice(len(names), p=weights / weights.sum())]
+    bpp = float(rng.uniform(*cfg["bpp"]))
+
+    pixels = np.array(Image.open(input_path).convert("RGB"), dtype=np.uint8)
+    flat = pixels.reshape(-1)
+    n_bits = min(flat.size, max(8, int(round(bpp * flat.size / 3))))
+    bits = rng.integers(0, 2, size=n_bits, dtype=np.uint8)
+    SCHEMES[scheme](flat, bits, rng)
+    Image.fromarray(pixels).save(out_path, "PNG")
+    return {"scheme": scheme, "bpp": round(n_bits * 3 / flat.size, 6),
+            "embedding_rate": round(n_bits / flat.size, 6), "payload_bytes": n_bits // 8, "seed": seed}
+
+def image_seed(base_seed, name):
+    digest = hashlib.blake2b(f"{base_seed}:{name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+# ---------- Per-image worker ----------
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def encode_one(encode_fn, src_path, out_path, message, done_hash=None):
+    """
+    Encode one image (runs in a pool worker) and return its manifest entry.
+    If the manifest already records this source hash and the output exists,
+    the image is skipped so interrupted runs resume where they stopped.
+    """
+    src_hash = file_hash(src_path)
+    if done_hash == src_hash and os.path.exists(out_path):
+        return {"status": "skipped"}
+    if encode_fn is not None:
+        # the encode_fn should accept (input_path, output_path, message) OR (PIL.Image, message)->PIL.Image
+        try:
+            # try path based call first
+            encode_fn(src_path, out_path, message)
+        except TypeError:
+            # maybe the function expects PIL input and returns PIL output
+            out_img = encode_fn(Image.open(src_path), message)
+            if not isinstance(out_img, Image.Image):
+                raise ValueError("encode_fn returned unexpected type")
+            out_img.save(out_path)
+        w, h = Image.open(src_path).size
+        rate = (len(message.encode("utf-8")) + HEADER_SIZE) * 8 / (w * h * 3)
+        via = "app encode"
+    else:
+        rate = lsb_encode_image(src_path, out_path, message)
+        via = "LSB"
+    return {"status": "ok", "via": via, "source": src_path, "source_hash": src_hash,
+            "output": out_path, "payload": message, "scheme": "lsb",
+            "bpp": round(rate * 3, 6), "embedding_rate": round(rate, 6),
+            "payload_bytes": len(message.encode("utf-8")) + HEADER_SIZE, "seed": None}
+
+def synthesize_one(src_path, out_path, cfg, seed, done_hash=None):
+    """Synthesis-mode counterpart of encode_one."""
+    src_hash = file_hash(src_path)
+    if done_hash == src_hash and os.path.exists(out_path):
+        return {"status": "skipped"}
+    params = synthesize_image(src_path, out_path, cfg, seed)
+    return {"status": "ok", "via": "synth", "source": src_path, "source_hash": src_hash,
+            "output": out_path, **params}
+
+def run_batch(jobs):
+    """Run a batch of (fn, args) jobs in one worker call; failures are reported per image."""
+    results = []
+    for fn, args in jobs:
+        try:
+            results.append(fn(*args))
+        except Exception as e:
+            results.append({"status": "error", "source": args[1] if fn is encode_one else args[0],
+                            "error": str(e)})
+    return results
 
 # ---------- Main dataset generator ----------
-def process_folder(src_folder, dst_folder, encode_fn, message):
+def load_manifest(path):
+    """Map of source path -> source hash for every image already written."""
+    done = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                done[entry["source"]] = entry["source_hash"]
+    return done
+
+def write_labels(dst, manifest_path):
+    """labels.csv for the trainers: one row per stego image, latest manifest entry wins."""
+    rows = {}
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            rows[entry["output"]] = {"file": os.path.basename(entry["output"]), "label": 1,
+                                     **{k: entry.get(k) for k in LABEL_FIELDS[2:]}}
+    with open(dst / LABELS_NAME, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=LABEL_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows.values())
+
+def process_folder(src_folder, dst_folder, encode_fn, message, workers=None, synth=None):
+    """
+    Encode every image in src_folder into dst_folder. With `synth` (a config from
+    load_synth_config) each image gets a random payload, rate and scheme instead
+    of the fixed message; images are sent to the workers in batches.
+    """
     src = Path(src_folder)
     dst = Path(dst_folder)
     if not src.exists():
@@ -77,29 +239,45 @@ def process_folder(src_folder, dst_folder, encode_fn, message):
     ensure_dirs(dst)
     files = sorted([p for p in src.glob("*") if p.suffix.lower() in (".png", ".jpg", ".jpeg")])
     print(f"Found {len(files)} images in {src}")
-    for f in files:
-        out_name = dst / f.name
-        try:
-            if encode_fn is not None:
-                # the encode_fn should accept (input_path, output_path, message) OR (PIL.Image, message)->PIL.Image
-                try:
-                    # try path based call first
-                    encode_fn(str(f), str(out_name), message)
-                except TypeError:
-                    # maybe the function expects PIL input and returns PIL output
-                    img = Image.open(f)
-                    out_img = encode_fn(img, message)
-                    if isinstance(out_img, Image.Image):
-                        out_img.save(out_name)
-                    else:
-                        # fallback: assume returned path
-                        print("encode_fn returned unexpected type; skipping", f)
-                print(f"Saved (via app encode) -> {out_name}")
-            else:
-                lsb_encode_image(str(f), str(out_name), message)
-                print(f"Saved (via LSB) -> {out_name}")
-        except Exception as e:
-            print(f"Error processing {f}: {e}")
+
+    manifest_path = dst / MANIFEST_NAME
+    done = load_manifest(manifest_path)
+    if synth is not None:
+        jobs = [(synthesize_one, (str(f), str(dst / f.name), synth, image_seed(synth["seed"], f.name),
+                                  done.get(str(f)))) for f in files]
+        batch_size = max(1, int(synth["batch_size"]))
+    else:
+        jobs = [(encode_one, (encode_fn, str(f), str(dst / f.name), message, done.get(str(f))))
+                for f in files]
+        batch_size = 1
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+    written = skipped = failed = 0
+    start = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(manifest_path, "a", encoding="utf-8") as manifest:
+        futures = [pool.submit(run_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for entry in future.result():
+                status = entry.pop("status")
+                if status == "skipped":
+                    skipped += 1
+                elif status == "error":
+                    failed += 1
+                    print(f"Error processing {entry['source']}: {entry['error']}")
+                else:
+                    written += 1
+                    manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY:
+                last_report = now
+                print(f"  {written + skipped + failed}/{len(files)} images, "
+                      f"{written / (now - start):.1f} img/s")
+    elapsed = time.perf_counter() - start
+    print(f"Saved {written}, resumed past {skipped}, failed {failed} in {elapsed:.1f}s "
+          f"({written / max(elapsed, 1e-9):.1f} img/s) -> {dst}")
+    if manifest_path.exists():
+        write_labels(dst, manifest_path)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -108,18 +286,27 @@ def main():
     parser.add_argument("--val-src", type=str, default="dataset/val/clean", help="validation source clean folder")
     parser.add_argument("--val-dst", type=str, default="dataset/val/stego", help="validation destination stego folder")
     parser.add_argument("--message", type=str, default="hidden_message", help="message to hide in images")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--config", type=str, default=None,
+                        help="JSON synthesis config (random payloads, bpp range, schemes); overrides --message")
     args = parser.parse_args()
 
-    # try to reuse your app's encode function
-    encode_fn = try_import_encode()
-    if encode_fn:
-        print("Using encode function imported from your app.")
+    synth = None
+    encode_fn = None
+    if args.config:
+        synth = load_synth_config(args.config)
+        print(f"Synthesizing random payloads: bpp {synth['bpp']}, schemes {synth['schemes']}")
     else:
-        print("No encode function found in app — falling back to internal LSB encoder.")
+        # try to reuse your app's encode function
+        encode_fn = try_import_encode()
+        if encode_fn:
+            print("Using encode function imported from your app.")
+        else:
+            print("No encode function found in app — falling back to internal LSB encoder.")
 
     # process train and val
-    process_folder(args.src, args.dst, encode_fn, args.message)
-    process_folder(args.val_src, args.val_dst, encode_fn, args.message)
+    process_folder(args.src, args.dst, encode_fn, args.message, args.workers, synth)
+    process_folder(args.val_src, args.val_dst, encode_fn, args.message, args.workers, synth)
     print("Done.")
 
 if __name__ == "__main__":
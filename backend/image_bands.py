@@ -0,0 +1,227 @@
+# image_bands.py
+# Decode an image one row band at a time with bounded memory.
+# PNG: the IDAT stream is inflated incrementally and each band is unfiltered by a
+# fresh Pillow decoder; raw layouts (BMP, PPM, uncompressed TIFF) are read by seeking.
+# Anything else (JPEG, interlaced or 16-bit colour PNG, ...) falls back to a full decode.
+import io
+import struct
+import zlib
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import BmpImagePlugin, Image, PngImagePlugin, PpmImagePlugin, TiffImagePlugin, UnidentifiedImageError
+
+READ_CHUNK = 1 << 16
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}   # colour type -> samples per pixel
+_STREAMABLE_FORMATS = (PngImagePlugin.PngImageFile, BmpImagePlugin.BmpImageFile,
+                       PpmImagePlugin.PpmImageFile, TiffImagePlugin.TiffImageFile)
+
+# -------------------------
+# Opening
+# -------------------------
+def open_image(source, max_pixels: Optional[int] = None) -> Image.Image:
+    """
+    Image.open on bytes, a path, a file object or an mmap. With `max_pixels`, images
+    iter_bands can stream (so the full frame is never held) may have up to that many
+    pixels instead of Pillow's decompression-bomb limit; anything else keeps Pillow's.
+    File-like sources are rewound, so the same one can be opened repeatedly.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if max_pixels is not None:
+        img = _open_streamable(source)
+        if img is not None:
+            w, h = img.size
+            if w * h > max_pixels:
+                _release(img)
+                raise ValueError(f"Image too large: {w}x{h} exceeds {max_pixels} pixels")
+            return img
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return _open(source)
+
+def _open(source) -> Image.Image:
+    try:
+        return Image.open(source)
+    except UnidentifiedImageError:
+        # Pillow's message names the spooled temp file; keep that out of API errors
+        raise ValueError("Unsupported or corrupt image file") from None
+
+def _open_streamable(source) -> Optional[Image.Image]:
+    """
+    A PNG / BMP / PPM / TIFF that iter_bands can stream, or None. The plugin classes
+    are used directly because Image.open applies the process-wide MAX_IMAGE_PIXELS.
+    """
+    for factory in _STREAMABLE_FORMATS:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            img = factory(source)
+        except (SyntaxError, IndexError, TypeError, ValueError, OSError, struct.error):
+            continue
+        if is_streamable(img):
+            return img
+        _release(img)
+        return None
+    return None
+
+def _release(img: Image.Image) -> None:
+    """Close a file open_image opened itself; callers' file objects stay open."""
+    if getattr(img, "_exclusive_fp", False):
+        img.close()
+
+def _band_edges(height: int, rows: int):
+    return [(y0, min(height, y0 + rows)) for y0 in range(0, height, rows)]
+
+def _to_rgb(img: Image.Image, core) -> np.ndarray:
+    band = img._new(core)  # carries the palette / mode of the source image
+    return np.asarray(band if band.mode == "RGB" else band.convert("RGB"))
+
+def _raw_row_bytes(img: Image.Image, core, rawmode: str, stride: int) -> Optional[bytes]:
+    """Last row of a decoded band packed back into the file's raw layout, or None."""
+    w, n = core.size
+    try:
+        row = img._new(core).crop((0, n - 1, w, n)).tobytes("raw", rawmode)
+    except (ValueError, OSError):
+        return None
+    return row if len(row) == stride else None
+
+# -------------------------
+# PNG
+# -------------------------
+def _png_header(fp) -> Optional[tuple]:
+    fp.seek(0)
+    head = fp.read(33)
+    if len(head) < 33 or head[:8] != _PNG_SIGNATURE or head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">IIBBBBB", head[16:29])  # w, h, depth, colour, compression, filter, interlace
+
+def _idat_stream(fp, offset: int) -> Iterator[bytes]:
+    """Payloads of the consecutive IDAT chunks, READ_CHUNK bytes at a time."""
+    fp.seek(offset - 8)  # Pillow's tile offset is the first IDAT payload
+    while True:
+        head = fp.read(8)
+        if len(head) < 8:
+            return
+        length, ctype = struct.unpack(">I4s", head)
+        if ctype != b"IDAT":
+            return
+        while length:
+            chunk = fp.read(min(READ_CHUNK, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+        fp.read(4)  # CRC
+
+def _inflate(fp, offset: int) -> Iterator[bytes]:
+    """Filtered scanline bytes, never more than READ_CHUNK per step however well they compress."""
+    inflater = zlib.decompressobj()
+    for chunk in _idat_stream(fp, offset):
+        data = chunk
+        while data:
+            out = inflater.decompress(data, READ_CHUNK)
+            if out:
+                yield out
+            data = inflater.unconsumed_tail
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+def _png_bands(img: Image.Image, rows: int) -> Optional[Iterator[Tuple[int, np.ndarray]]]:
+    header = _png_header(img.fp)
+    if header is None or len(img.tile) != 1 or img.tile[0][0] != "zip":
+        return None
+    w, h, depth, colour, _, _, interlace = header
+    rawmode = img.tile[0][3]
+    if interlace or colour not in _PNG_CHANNELS or (depth == 16 and _PNG_CHANNELS[colour] > 1):
+        return None  # Adam7 passes / 16-bit colour (Pillow keeps 8 bits, so rows can't be re-packed)
+    stride = (w * depth * _PNG_CHANNELS[colour] + 7) // 8
+    offset = img.tile[0][2]
+
+    def bands():
+        scanlines = _inflate(img.fp, offset)
+        pending = bytearray()
+        prev_row = None  # previous band's last row, re-fed unfiltered so Up/Avg/Paeth stay exact
+        for y0, y1 in _band_edges(h, rows):
+            need = (y1 - y0) * (stride + 1)
+            while len(pending) < need:
+                more = next(scanlines, None)
+                if more is None:
+                    raise ValueError("Truncated PNG image data")
+                pending += more
+            filtered = bytes(pending[:need])
+            del pending[:need]
+            lead = 0 if prev_row is None else 1
+            core = Image.core.new(img.mode, (w, y1 - y0 + lead))
+            decoder = Image._getdecoder(img.mode, "zip", rawmode)
+            decoder.setimage(core, (0, 0, w, y1 - y0 + lead))
+            stream = (b"\x00" + prev_row if lead else b"") + filtered
+            n, err = decoder.decode(zlib.compress(stream, 0))
+            if err < 0:
+                raise ValueError("Corrupt PNG image data")
+            if lead:
+                band = img._new(core).crop((0, 1, w, y1 - y0 + 1))
+                core = band.im
+            prev_row = _raw_row_bytes(img, core, rawmode, stride)
+            if prev_row is None:
+                raise ValueError(f"Cannot stream PNG rawmode {rawmode}")
+            yield y0, _to_rgb(img, core)
+
+    # probe one row so unsupported rawmodes fall back before anything is yielded
+    probe = Image.core.new(img.mode, (w, 1))
+    if _raw_row_bytes(img, probe, rawmode, stride) is None:
+        return None
+    return bands()
+
+# -------------------------
+# Raw (BMP / PPM / uncompressed TIFF)
+# -------------------------
+def _raw_bands(img: Image.Image, rows: int) -> Optional[Iterator[Tuple[int, np.ndarray]]]:
+    if len(img.tile) != 1 or img.tile[0][0] != "raw":
+        return None
+    args = img.tile[0][3]
+    rawmode, stride, orientation = (args + (0, 1))[:3] if isinstance(args, tuple) else (args, 0, 1)
+    w, h = img.size
+    if img.tile[0][1] != (0, 0, w, h) or orientation not in (1, -1):
+        return None
+    if not stride:
+        try:
+            stride = len(Image.new(img.mode, (w, 1)).tobytes("raw", rawmode))
+        except (ValueError, OSError):
+            return None
+    offset = img.tile[0][2]
+
+    def bands():
+        for y0, y1 in _band_edges(h, rows):
+            # bottom-up files (BMP) store the last row first
+            start = y0 if orientation == 1 else h - y1
+            img.fp.seek(offset + start * stride)
+            data = img.fp.read((y1 - y0) * stride)
+            if len(data) < (y1 - y0) * stride:
+                raise ValueError("Truncated image data")
+            band = Image.frombuffer(img.mode, (w, y1 - y0), data, "raw", rawmode, stride, orientation)
+            yield y0, _to_rgb(img, band.im)
+
+    return bands()
+
+# -------------------------
+# Entry point
+# -------------------------
+def _full_bands(img: Image.Image, rows: int) -> Iterator[Tuple[int, np.ndarray]]:
+    w, h = img.size
+    for y0, y1 in _band_edges(h, rows):
+        band = img.crop((0, y0, w, y1))
+        yield y0, np.asarray(band if band.mode == "RGB" else band.convert("RGB"))
+
+def iter_bands(img: Image.Image, rows: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (y0, RGB uint8 band) top to bottom, at most `rows` rows each. PNG and raw
+    layouts never hold more than about one band; other formats are decoded whole.
+    """
+    return _png_bands(img, rows) or _raw_bands(img, rows) or _full_bands(img, rows)
+
+def is_streamable(img: Image.Image, rows: int = 1) -> bool:
+    """Whether iter_bands can avoid a full decode for this image."""
+    return (_png_bands(img, rows) or _raw_bands(img, rows)) is not None
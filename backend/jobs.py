@@ -0,0 +1,300 @@
+# jobs.py
+# Local job queue for work that outlives an HTTP request (video, very large files):
+# job state in SQLite, a bounded set of asyncio workers taking the highest priority
+# first, progress reporting, result files kept per job and removed after a TTL.
+# Several server processes can share one database: a job is claimed with a conditional
+# UPDATE, its owner keeps a heartbeat, and jobs whose owner stopped beating are requeued.
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from uploads import remove_quietly
+
+JOBS_DIR = os.environ.get("STEGO_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "stego-jobs")
+JOBS_DB = os.environ.get("STEGO_JOBS_DB") or os.path.join(JOBS_DIR, "jobs.db")
+JOB_WORKERS = int(os.environ.get("STEGO_JOB_WORKERS", "2"))        # jobs run at once
+JOB_TTL = float(os.environ.get("STEGO_JOB_TTL", str(24 * 3600)))   # seconds a finished job is kept
+PROGRESS_INTERVAL = 0.5   # seconds between progress writes to the database
+HEARTBEAT_INTERVAL = 5.0  # seconds between heartbeats for the jobs a process is running
+HEARTBEAT_TIMEOUT = float(os.environ.get("STEGO_JOB_HEARTBEAT_TIMEOUT", "60"))  # then the job is requeued
+FINISHED = ("done", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    pass
+
+@contextmanager
+def _connect(db_path: str):
+    db = sqlite3.connect(db_path, timeout=5)
+    db.row_factory = sqlite3.Row
+    try:
+        with db:  # commits on success
+            yield db
+    finally:
+        db.close()
+
+def _update_running(db_path: str, job_id: str, owner: str, **fields) -> bool:
+    """Update a running job of `owner`; False (and no change) once it is cancelled or claimed elsewhere."""
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _connect(db_path) as db:
+        cur = db.execute(f"UPDATE jobs SET {cols} WHERE id = ? AND status = 'running' AND owner = ?",
+                         (*fields.values(), job_id, owner))
+    return cur.rowcount > 0
+
+class ProgressWriter:
+    """
+    Picklable progress(done, total) hook: throttled writes straight to the database,
+    so it also works inside the worker pool. Raises JobCancelled once the job has
+    been cancelled, here or by another process (the row stops being ours).
+    """
+    def __init__(self, db_path: str, job_id: str, owner: str):
+        self.db_path, self.job_id, self.owner = db_path, job_id, owner
+        self._last_write = 0.0
+
+    def __call__(self, done: int, total: int) -> None:
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_INTERVAL or done >= total:
+            self._last_write = now
+            if not _update_running(self.db_path, self.job_id, self.owner,
+                                   progress_done=done, progress_total=total):
+                raise JobCancelled(self.job_id)
+
+class Job:
+    """What a handler sees: its input, parameters, a directory for outputs and a progress hook."""
+    def __init__(self, queue: "JobQueue", row: dict):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.input_path = row["input_path"]
+        self.params = json.loads(row["params"])
+        self.dir = os.path.dirname(self.input_path)
+        self.output = None  # (path, media type, download name) once set_output is called
+        self._queue = queue
+        self.progress_writer = ProgressWriter(queue.db_path, self.id, queue.owner)  # for pool handlers
+
+    def output_path(self, suffix: str) -> str:
+        return os.path.join(self.dir, "output" + suffix)
+
+    def set_output(self, path: str, media_type: str, filename: str) -> None:
+        self.output = (path, media_type, filename)
+
+    def progress(self, done: int, total: int) -> None:
+        """Thread-safe; like progress_writer, but also sees a cancel from this process at once."""
+        if self.id in self._queue._cancelled:
+            raise JobCancelled(self.id)
+        self.progress_writer(done, total)
+
+Handler = Callable[[Job], Awaitable[dict]]
+
+class JobQueue:
+    def __init__(self, handlers: Dict[str, Handler], db_path: str = JOBS_DB, jobs_dir: str = JOBS_DIR,
+                 workers: int = JOB_WORKERS, ttl: float = JOB_TTL):
+        self.handlers = handlers
+        self.db_path, self.jobs_dir = db_path, jobs_dir
+        self.workers, self.ttl = max(1, workers), ttl
+        self._cancelled = set()
+        self._running = set()  # ids of jobs this process is working on
+        self._tasks = []
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # this process, in the owner column
+        os.makedirs(jobs_dir, exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                       "id TEXT PRIMARY KEY, kind TEXT NOT NULL, priority INTEGER NOT NULL, "
+                       "status TEXT NOT NULL, input_path TEXT NOT NULL, params TEXT NOT NULL, "
+                       "created REAL NOT NULL, started REAL, finished REAL, "
+                       "progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER NOT NULL DEFAULT 0, "
+                       "result TEXT, error TEXT, output_path TEXT, output_type TEXT, output_name TEXT, "
+                       "owner TEXT, heartbeat REAL)")
+            columns = {r["name"] for r in db.execute("PRAGMA table_info(jobs)")}
+            for column in ("owner TEXT", "heartbeat REAL"):  # databases from before multi-process support
+                if column.split()[0] not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+
+    def _db(self):
+        return _connect(self.db_path)
+
+    def _update(self, job_id: str, **fields) -> bool:
+        return _update_running(self.db_path, job_id, self.owner, **fields)
+
+    # -------------------------
+    # Client side
+    # -------------------------
+    def new_job_dir(self) -> tuple:
+        """(job id, directory) to move the upload into before submit()."""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(path)
+        return job_id, path
+
+    def submit(self, job_id: str, kind: str, input_path: str, params: dict, priority: int = 0) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        with self._db() as db:
+            db.execute("INSERT INTO jobs (id, kind, priority, status, input_path, params, created) "
+                       "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                       (job_id, kind, priority, input_path, json.dumps(params), time.time()))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._db() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def describe(self, job_id: str) -> Optional[dict]:
+        """Public view of a job for the API."""
+        row = self.get(job_id)
+        if row is None:
+            return None
+        done, total = row["progress_done"], row["progress_total"]
+        # a decode can finish early, as soon as the message is complete
+        fraction = 1.0 if row["status"] == "done" else round(done / total, 4) if total else 0.0
+        info = {"id": row["id"], "kind": row["kind"], "status": row["status"], "priority": row["priority"],
+                "progress": {"done": done, "total": total, "fraction": fraction},
+                "created": row["created"], "started": row["started"], "finished": row["finished"]}
+        if row["result"] is not None:
+            info["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            info["error"] = row["error"]
+        if row["output_path"] is not None:
+            info["expires"] = row["finished"] + self.ttl
+        return info
+
+    def stats(self) -> dict:
+        with self._db() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "ttl_s": self.ttl, "running": len(self._running), "jobs": counts}
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancel a queued or running job (a running one stops at its next progress
+        report, in whichever process runs it, so its worker slot stays taken until
+        then); a finished job is deleted.
+        """
+        row = self.get(job_id)
+        if row is None:
+            return None
+        if row["status"] in FINISHED:
+            self._remove(job_id)
+            return {"id": job_id, "status": "deleted"}
+        self._cancelled.add(job_id)
+        with self._db() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished = ? "
+                       "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+        return self.describe(job_id)
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def _claim(self) -> Optional[dict]:
+        """Next queued job, now running and owned by this process; the UPDATE only wins once."""
+        while True:
+            with self._db() as db:
+                row = db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                                 "ORDER BY priority DESC, created LIMIT 1").fetchone()
+                if row is None or self._stopping:  # a claim finishing after stop() would be orphaned
+                    return None
+                now = time.time()
+                cur = db.execute("UPDATE jobs SET status = 'running', owner = ?, started = ?, heartbeat = ? "
+                                 "WHERE id = ? AND status = 'queued'", (self.owner, now, now, row["id"]))
+            if cur.rowcount:
+                return dict(row)
+            # another worker or process claimed it first
+
+    def _requeue(self, where: str, args: tuple = ()) -> int:
+        """Put matching running jobs back in the queue, to run again from the start."""
+        with self._db() as db:
+            cur = db.execute("UPDATE jobs SET status = 'queued', owner = NULL, started = NULL, heartbeat = NULL, "
+                             f"progress_done = 0 WHERE status = 'running' AND {where}", args)
+        return cur.rowcount
+
+    def _beat(self) -> None:
+        now = time.time()
+        with self._db() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?", (now, self.owner))
+        # jobs of a process that crashed or was killed
+        if self._requeue("(heartbeat IS NULL OR heartbeat < ?)", (now - HEARTBEAT_TIMEOUT,)) and self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self, row: dict) -> None:
+        job = Job(self, row)
+        self._running.add(job.id)
+        try:
+            result = await self.handlers[job.kind](job)
+        except JobCancelled:
+            return
+        except Exception as e:
+            self._update(job.id, status="failed", error=str(e), finished=time.time())
+            return
+        finally:
+            self._running.discard(job.id)
+        out_path, out_type, out_name = job.output or (None, None, None)
+        self._update(job.id, status="done", result=json.dumps(result), finished=time.time(),
+                     output_path=out_path, output_type=out_type, output_name=out_name)
+        remove_quietly(job.input_path)
+
+    async def _worker(self) -> None:
+        # the flag, not just task.cancel(): 3.11's wait_for can swallow a cancellation
+        while not self._stopping:
+            row = await asyncio.to_thread(self._claim)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(row)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.to_thread(self._beat)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def _janitor(self) -> None:
+        while True:
+            await asyncio.to_thread(self.cleanup)
+            await asyncio.sleep(min(300.0, max(1.0, self.ttl / 10)))
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Remove finished jobs older than the TTL, with their files; returns how many."""
+        cutoff = (now or time.time()) - self.ttl
+        with self._db() as db:
+            ids = [r["id"] for r in db.execute(
+                f"SELECT id FROM jobs WHERE status IN {FINISHED} AND finished < ?", (cutoff,)).fetchall()]
+        for job_id in ids:
+            self._remove(job_id)
+        return len(ids)
+
+    def _remove(self, job_id: str) -> None:
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+        with self._db() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._cancelled.discard(job_id)
+
+    def start(self) -> None:
+        # jobs left running by a process that is gone run again from the start once their
+        # heartbeat goes stale (see _beat); jobs other live processes are running are left alone
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._heartbeat()))
+        self._tasks.append(asyncio.ensure_future(self._janitor()))
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._requeue("owner = ?", (self.owner,))
@@ -1,12 +1,76 @@
  # main.py
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-import io  # ✅ ensure io is imported for StreamingResponse
-from stego_utils import encode_message_image, decode_message_image, detect_stego
-from audio_stego_utils import encode_message_audio, decode_message_audio
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, Response
+from starlette.background import BackgroundTask
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from stego_utils import (encode_message_file, decode_message_image, detect_stego_report, image_capacity,
+                         model_verdict, load_detector_backend, detector_artifacts, PNG_COMPRESS_LEVEL)
+from media import SNIFF_BYTES, sniff_file, sniff_media
+from payload import PAYLOAD_COMPRESSION, PAYLOAD_PARITY
+from jobs import JobQueue
+from audio_stego_utils import audio_capacity, encode_audio_stream, decode_message_audio
+from workers import get_pool, run_in_pool, shutdown_pool
+from metrics import MetricsMiddleware, render as render_metrics, stage, staged
+from tiled_detection import detect_tiled, heatmap_png
+from result_cache import ResultCache, source_fingerprint, weights_fingerprint
+from uploads import expand_archives, hash_file, remove_quietly, spool_upload, spooled, upload_suffix
 
-app = FastAPI(title="Steganography Forensics API")
+# Loaded by the first request that needs it, so torch is only imported when there are
+# weights and a detection request; None means /detect uses the chi2-RS heuristic
+detector = None
+batcher = None
+_detector_version = ""  # fingerprint of the weights actually loaded, for detect cache keys
+_detector_ready = False
+_detector_lock = asyncio.Lock()
+
+def _load_model():
+    """Import torch only when there is a detector artifact to serve."""
+    if not any(os.path.exists(p) for p in detector_artifacts()):
+        return None, None
+    from model_server import MicroBatcher, configure_threads
+    configure_threads()
+    model = load_detector_backend()
+    return (model, MicroBatcher(model)) if model is not None else (None, None)
+
+async def _get_detector():
+    global detector, batcher, _detector_version, _detector_ready
+    if not _detector_ready:
+        async with _detector_lock:
+            if not _detector_ready:
+                detector, batcher = await asyncio.to_thread(_load_model)
+                # this process keeps serving these weights even if a retrain replaces the file
+                _detector_version = weights_fingerprint([detector.path]) if detector is not None else "chi2-rs"
+                if batcher is not None:
+                    batcher.start()
+                _detector_ready = True
+    return detector, batcher
+
+def _video():
+    """vid (and with it cv2 / PyAV) is imported on the first video request."""
+    import vid
+    return vid
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global detector, batcher, _detector_version, _detector_ready
+    # fork the pool workers before torch or cv2 can start their thread pools
+    await run_in_pool(os.getpid)
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    if batcher is not None:
+        await batcher.stop()
+    detector, batcher, _detector_version, _detector_ready = None, None, "", False
+    shutdown_pool()
+
+app = FastAPI(title="Steganography Forensics API", lifespan=lifespan)
 
 # ===== CORS =====
 app.add_middleware(
@@ -16,60 +80,429 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ===== IMAGE ENDPOINTS =====
+# ===== METRICS (GET /metrics; per-request latency, stage timings, opt-in heap/profile sampling) =====
+app.add_middleware(MetricsMiddleware)
+
+# ===== RESULT CACHE =====
+result_cache = ResultCache()
+# Any edit to the engine modules changes the key, so stale results are never served
+_ENGINE_SOURCES = {
+    "detect": source_fingerprint(["stego_utils", "steganalysis", "bitplane", "image_bands", "tiled_detection",
+                                  "detector_model", "model_server"]),
+    "decode": source_fingerprint(["stego_utils", "bitplane", "image_bands", "payload", "reed_solomon"]),
+}
+
+# Engines get the spooled upload's path and read it themselves: nothing is pickled
+# over to the pool but the path, and no request holds the whole file in memory.
+async def _run_detect(path: str):
+    detector, batcher = await _get_detector()
+    if batcher is None:
+        return await run_in_pool(detect_stego_report, path)
+    # heuristic report (pool) and crop preparation (thread) overlap; the forward pass is batched
+    (_, _, _, report), crops = await asyncio.gather(
+        run_in_pool(detect_stego_report, path),
+        asyncio.to_thread(staged, "detector.crops", detector.prepare, path))
+    with stage("detector.batch"):  # queueing for a micro-batch plus the forward pass
+        prob = await batcher.submit(crops)
+    return model_verdict(prob, report)
+
+async def _run_decode(path: str):
+    return await run_in_pool(decode_message_image, path)
+
+_ENGINE_RUNNERS = {"detect": _run_detect, "decode": _run_decode}
+
+def _cache_key(kind: str, path: str) -> str:
+    version = _ENGINE_SOURCES[kind]
+    if kind == "detect":
+        version += _detector_version  # _cached_run loads the detector first
+    with stage("cache.hash"):
+        return f"{kind}:{version}:{hash_file(path)}"
+
+async def _cached_run(kind: str, path: str):
+    if kind == "detect":
+        await _get_detector()
+    key = await asyncio.to_thread(_cache_key, kind, path)
+    result = result_cache.get(key)
+    if result is None:
+        result = await _ENGINE_RUNNERS[kind](path)
+        await asyncio.to_thread(result_cache.put, key, result)
+    return result
+
+# ===== HELPERS =====
+def _detect_payload(label, prob, mode, report, tile_map: bool = False) -> dict:
+    payload = {"result": label, "mode": mode,
+               "embedding_rate": round(report["embedding_rate"], 4)}
+    if prob is not None:
+        payload["probability"] = round(float(prob), 4)
+    if tile_map:
+        payload["tile_size"] = report["tile_size"]
+        payload["tile_map"] = report["tile_map"]
+    return payload
+
+async def _batch_items(files: List[UploadFile]):
+    """
+    Spool the uploads into (filename, path) pairs; zip archives contribute every
+    member as its own temp file. The caller owns (and removes) the paths.
+    """
+    items = []
+    try:
+        for file in files:
+            items.append((file.filename, await spool_upload(file, upload_suffix(file))))
+    except BaseException:
+        for _, path in items:
+            remove_quietly(path)
+        raise
+    return await asyncio.to_thread(expand_archives, items)
+
+def _ndjson_stream(items, kind, format_result):
+    """Fan items out to the pool and yield one NDJSON line per file as it finishes."""
+    async def job(name, path):
+        try:
+            return {"filename": name, **format_result(await _cached_run(kind, path))}
+        except Exception as e:
+            return {"filename": name, "detail": str(e)}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(job(name, path)) for name, path in items]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for _, path in items:
+                remove_quietly(path)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _media_type(path: str) -> str:
+    # unrecognised signatures go to the image engine; Pillow knows more formats than
+    # the sniffer and reports anything it cannot open
+    return sniff_file(path) or "image"
+
+def _encoded_file(out_path: str, media_type: str, filename: str) -> FileResponse:
+    return FileResponse(
+        out_path,
+        media_type=media_type,
+        headers={"Content-Disposition": f"inline; filename={filename}"},
+        background=BackgroundTask(remove_quietly, out_path),
+    )
+
+async def _encode_image(path: str, message: str, compress_level: int, codec: Optional[str],
+                        compression: str, parity: int):
+    # embedded and compressed in the worker pool, written to disk and streamed back from there
+    if not 0 <= compress_level <= 9:
+        raise ValueError("compress_level must be between 0 and 9")
+    out_fd, out_path = tempfile.mkstemp(suffix=".png")
+    os.close(out_fd)
+    try:
+        await run_in_pool(staged, "image.embed", encode_message_file, path, out_path, message, compress_level,
+                          compression, parity)
+    except BaseException:
+        remove_quietly(out_path)
+        raise
+    return _encoded_file(out_path, "image/png", "encoded.png")
+
+async def _encode_audio(path: str, message: str, compress_level: Optional[int] = None, codec: Optional[str] = None,
+                        compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY):
+    # written to disk and streamed back so large recordings never sit in RAM
+    out_fd, out_path = tempfile.mkstemp(suffix=".wav")
+    os.close(out_fd)
+    try:
+        await run_in_pool(staged, "audio.embed", encode_audio_stream, path, out_path, message, compression, parity)
+    except BaseException:
+        remove_quietly(out_path)
+        raise
+    return _encoded_file(out_path, "audio/wav", "encoded.wav")
+
+async def _encode_video(path: str, message: str, compress_level: int, codec: Optional[str],
+                        compression: str, parity: int):
+    vid = _video()
+    codec = codec or vid.DEFAULT_CODEC
+    _, suffix, media_type = vid.LOSSLESS_CODECS.get(codec, vid.LOSSLESS_CODECS[vid.DEFAULT_CODEC])
+    out_fd, out_path = tempfile.mkstemp(suffix=suffix)
+    os.close(out_fd)
+    try:
+        await run_in_pool(staged, "video.embed", vid.encode_video, path, message, out_path, codec, None,
+                          compression, parity)
+    except BaseException:
+        remove_quietly(out_path)
+        raise
+    return _encoded_file(out_path, media_type, "encoded" + suffix)
+
+_ENCODERS = {"image": _encode_image, "audio": _encode_audio, "video": _encode_video}
+
+# ===== ENCODE / DECODE (image, WAV audio or video, sniffed from the upload) =====
 @app.post("/encode")
-async def encode(file: UploadFile = File(...), message: str = Form(...)):
+async def encode(file: UploadFile = File(...), message: str = Form(...),
+                 compress_level: int = Form(PNG_COMPRESS_LEVEL), codec: Optional[str] = Form(None),
+                 compression: str = Form(PAYLOAD_COMPRESSION), parity: int = Form(PAYLOAD_PARITY)):
+    """
+    Hide `message` in an image, WAV or video upload. Images come back as PNG
+    (compress_level 0-9 trades size for speed), video in the lossless `codec`.
+    The message is stored in a payload container: `compression` (auto, none,
+    zlib, lzma) shrinks it, `parity` adds Reed-Solomon bytes per 255-byte block.
+    """
     try:
-        image_bytes = await file.read()
-        encoded_bytes = encode_message_image(image_bytes, message)
-        return StreamingResponse(
-            io.BytesIO(encoded_bytes),
-            media_type="image/png",
-            headers={"Content-Disposition": "inline; filename=encoded.png"}
-        )
+        async with spooled(file, upload_suffix(file)) as path:
+            return await _ENCODERS[_media_type(path)](path, message, compress_level, codec, compression, parity)
     except Exception as e:
         return JSONResponse(status_code=400, content={"detail": str(e)})
 
 @app.post("/decode")
-async def decode(file: UploadFile = File(...)):
+async def decode(file: UploadFile = File(...), msg_length: Optional[int] = Form(None)):
     try:
-        image_bytes = await file.read()
-        message = decode_message_image(image_bytes)
-        return {"message": message}
+        async with spooled(file, upload_suffix(file)) as path:
+            media = _media_type(path)
+            if media == "image":
+                message = await _cached_run("decode", path)
+            elif media == "audio":
+                # msg_length is only needed for legacy files without a length header
+                message = await run_in_pool(staged, "audio.extract", decode_message_audio, path, msg_length)
+            else:
+                # frame ranges decode on the pool; the thread only waits on them and stitches
+                message = await asyncio.to_thread(staged, "video.extract", _video().decode_video, path)
+        return {"message": message, "media": media}
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+# ===== CAPACITY (header only: no pixel, sample or frame data is decoded) =====
+def _capacity(fp, suffix: str, parity: int) -> dict:
+    media = sniff_media(fp.read(SNIFF_BYTES)) or "image"
+    fp.seek(0)
+    if media == "image":
+        info = image_capacity(fp, parity)
+    elif media == "audio":
+        info = audio_capacity(fp, parity)
+    else:
+        vid = _video()
+        if vid.av is not None:
+            info = vid.video_capacity(fp, parity)
+        else:  # OpenCV opens paths only
+            fd, path = tempfile.mkstemp(suffix=suffix)
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    shutil.copyfileobj(fp, out)
+                info = vid.video_capacity(path, parity)
+            finally:
+                remove_quietly(path)
+    return {"media": media, **info}
+
+@app.post("/capacity")
+async def capacity(file: UploadFile = File(...), parity: int = PAYLOAD_PARITY):
+    """
+    Largest uncompressed message /encode accepts for this carrier with `parity`
+    Reed-Solomon bytes per block, per embedding mode. Reads the
+    upload in place (no spooling copy); the leading part of a PNG, JPEG, WAV or AVI
+    file is enough, so clients can send just the first few KiB of a large file.
+    """
+    try:
+        return await asyncio.to_thread(_capacity, file.file, upload_suffix(file), parity)
     except Exception as e:
         return JSONResponse(status_code=400, content={"detail": str(e)})
 
+# ===== DETECTION (images) =====
 @app.post("/detect")
-async def detect(file: UploadFile = File(...)):
+async def detect(file: UploadFile = File(...), tile_map: bool = False):
+    try:
+        async with spooled(file, upload_suffix(file)) as path:
+            media = _media_type(path)
+            if media != "image":
+                raise ValueError(f"Detection works on images, not {media}")
+            label, prob, mode, report = await _cached_run("detect", path)
+        return _detect_payload(label, prob, mode, report, tile_map)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+@app.post("/detect/tiled")
+async def detect_tiled_endpoint(file: UploadFile = File(...), tile_size: Optional[int] = None,
+                                heatmap: str = "json"):
+    """
+    Sliding-window detection for very large images: the upload is spooled to disk,
+    decoded band by band and scored tile by tile across the worker pool.
+    heatmap=png returns the rendered heatmap with the verdict in X-Stego-* headers.
+    """
+    if heatmap not in ("json", "png"):
+        return JSONResponse(status_code=400, content={"detail": "heatmap must be 'json' or 'png'"})
+    try:
+        detector, _ = await _get_detector()
+        async with spooled(file, upload_suffix(file)) as path:
+            report = await asyncio.to_thread(staged, "image.tiled", detect_tiled, path, tile_size, detector,
+                                             get_pool())
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    if heatmap == "png":
+        png = await asyncio.to_thread(heatmap_png, report["heatmap"])
+        return Response(png, media_type="image/png", headers={
+            "X-Stego-Result": report["result"],
+            "X-Stego-Probability": str(report["probability"]),
+            "X-Stego-Mode": report["mode"],
+            "X-Stego-Heatmap-Cell": str(report["heatmap_cell"]),
+        })
+    return report
+
+# ===== BATCH ENDPOINTS (NDJSON, one line per file in completion order) =====
+@app.post("/batch/detect")
+async def batch_detect(files: List[UploadFile] = File(...), tile_map: bool = False):
+    try:
+        items = await _batch_items(files)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    return _ndjson_stream(items, "detect",
+                          lambda result: _detect_payload(*result, tile_map=tile_map))
+
+@app.post("/batch/decode")
+async def batch_decode(files: List[UploadFile] = File(...)):
     try:
-        image_bytes = await file.read()
-        label, prob, mode = detect_stego(image_bytes)
-        payload = {"result": label, "mode": mode}
-        if prob is not None:
-            payload["probability"] = round(float(prob), 4)
-        return payload
+        items = await _batch_items(files)
     except Exception as e:
         return JSONResponse(status_code=400, content={"detail": str(e)})
+    return _ndjson_stream(items, "decode", lambda message: {"message": message})
 
-# ===== AUDIO ENDPOINTS =====
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: request latency, per-stage timings, upload sizes, concurrency."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/detector")
+async def detector_info():
+    detector, batcher = await _get_detector()
+    if detector is None:
+        return {"mode": "chi2-rs", "weights": None}
+    return {"mode": "resnet18", "backend": detector.backend, "weights": os.path.basename(detector.path),
+            "input_mode": detector.input_mode, "crop_size": detector.crop_size, **batcher.stats()}
+
+# ===== AUDIO ENDPOINTS (the WAV-only routes the frontend calls; /encode and /decode also take WAV) =====
 @app.post("/encode_audio")
 async def encode_audio(file: UploadFile = File(...), message: str = Form(...)):
     try:
-        audio_bytes = await file.read()
-        encoded_bytes = encode_message_audio(audio_bytes, message)  # your function
-        return StreamingResponse(
-            io.BytesIO(encoded_bytes),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "inline; filename=encoded.wav"}
-        )
+        async with spooled(file, ".wav") as path:
+            return await _encode_audio(path, message)
     except Exception as e:
         return JSONResponse(status_code=400, content={"detail": str(e)})
 
 @app.post("/decode_audio")
-async def decode_audio(file: UploadFile = File(...), msg_length: int = Form(...)):
+async def decode_audio(file: UploadFile = File(...), msg_length: Optional[int] = Form(None)):
     try:
-        audio_bytes = await file.read()
-        message = decode_message_audio(audio_bytes, int(msg_length))  # convert to int
+        # msg_length is only needed for legacy files without a length header
+        async with spooled(file, ".wav") as path:
+            message = await run_in_pool(staged, "audio.extract", decode_message_audio, path, msg_length)
         return {"message": message}
     except Exception as e:
         return JSONResponse(status_code=400, content={"detail": str(e)})
+
+# ===== JOBS (long video / large-file work: submit, poll progress, download the result) =====
+async def _job_encode(job):
+    media, message = job.params["media"], job.params["message"]
+    packing = (job.params["compression"], job.params["parity"])
+    if media == "image":
+        out_path = job.output_path(".png")
+        await run_in_pool(staged, "image.embed", encode_message_file, job.input_path, out_path, message,
+                          job.params["compress_level"], *packing)
+        job.set_output(out_path, "image/png", "encoded.png")
+    elif media == "audio":
+        out_path = job.output_path(".wav")
+        await run_in_pool(staged, "audio.embed", encode_audio_stream, job.input_path, out_path, message, *packing)
+        job.set_output(out_path, "audio/wav", "encoded.wav")
+    else:
+        vid = _video()
+        codec = job.params["codec"] or vid.DEFAULT_CODEC
+        _, suffix, media_type = vid.LOSSLESS_CODECS.get(codec, vid.LOSSLESS_CODECS[vid.DEFAULT_CODEC])
+        out_path = job.output_path(suffix)
+        await run_in_pool(staged, "video.embed", vid.encode_video, job.input_path, message, out_path,
+                          codec, job.progress_writer, *packing)
+        job.set_output(out_path, media_type, "encoded" + suffix)
+    return {"media": media}
+
+async def _job_decode(job):
+    media = job.params["media"]
+    if media == "image":
+        message = await _cached_run("decode", job.input_path)
+    elif media == "audio":
+        message = await run_in_pool(staged, "audio.extract", decode_message_audio, job.input_path,
+                                    job.params["msg_length"])
+    else:
+        vid = _video()
+        message = await asyncio.to_thread(staged, "video.extract", vid.decode_video, job.input_path,
+                                          vid.VIDEO_WORKERS, job.progress)  # ranges run on the pool
+    return {"message": message, "media": media}
+
+async def _job_detect(job):
+    return _detect_payload(*await _cached_run("detect", job.input_path))
+
+job_queue = JobQueue({"encode": _job_encode, "decode": _job_decode, "detect": _job_detect})
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), op: str = Form(...), message: Optional[str] = Form(None),
+                     priority: int = Form(0), compress_level: int = Form(PNG_COMPRESS_LEVEL),
+                     codec: Optional[str] = Form(None), msg_length: Optional[int] = Form(None),
+                     compression: str = Form(PAYLOAD_COMPRESSION), parity: int = Form(PAYLOAD_PARITY)):
+    """
+    Queue an encode, decode or detect job and return its id at once; higher
+    `priority` runs first. Poll GET /jobs/{id}, then fetch GET /jobs/{id}/result.
+    """
+    try:
+        if op not in job_queue.handlers:
+            raise ValueError(f"op must be one of: {', '.join(job_queue.handlers)}")
+        if op == "encode" and message is None:
+            raise ValueError("encode jobs need a message")
+        if not 0 <= compress_level <= 9:
+            raise ValueError("compress_level must be between 0 and 9")
+        path = await spool_upload(file, upload_suffix(file))
+        job_id, job_dir = job_queue.new_job_dir()
+        try:
+            media = _media_type(path)
+            if op == "detect" and media != "image":
+                raise ValueError(f"Detection works on images, not {media}")
+            input_path = os.path.join(job_dir, "input" + upload_suffix(file))
+            await asyncio.to_thread(shutil.move, path, input_path)
+            params = {"media": media, "message": message, "compress_level": compress_level,
+                      "codec": codec, "msg_length": msg_length, "compression": compression, "parity": parity}
+            await asyncio.to_thread(job_queue.submit, job_id, op, input_path, params, priority)
+        except BaseException:
+            remove_quietly(path)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    return {"job_id": job_id, "status": "queued", "media": media}
+
+@app.get("/jobs")
+async def jobs_stats():
+    return await asyncio.to_thread(job_queue.stats)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    info = await asyncio.to_thread(job_queue.describe, job_id)
+    if info is None:
+        return JSONResponse(status_code=404, content={"detail": "Unknown or expired job"})
+    if "expires" in info:
+        info["download"] = f"/jobs/{job_id}/result"
+    return info
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """The output file of a finished encode job, or the JSON result of any other finished job."""
+    row = await asyncio.to_thread(job_queue.get, job_id)
+    if row is None:
+        return JSONResponse(status_code=404, content={"detail": "Unknown or expired job"})
+    if row["status"] != "done":
+        detail = row["error"] or f"Job is {row['status']}"
+        return JSONResponse(status_code=409, content={"detail": detail, "status": row["status"]})
+    if row["output_path"] is None:
+        return json.loads(row["result"])
+    return FileResponse(row["output_path"], media_type=row["output_type"],
+                        headers={"Content-Disposition": f"inline; filename={row['output_name']}"})
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a queued or running job, or delete a finished one and its files."""
+    info = await asyncio.to_thread(job_queue.cancel, job_id)
+    if info is None:
+        return JSONResponse(status_code=404, content={"detail": "Unknown or expired job"})
+    return info
@@ -0,0 +1,39 @@
+# media.py
+# Media-type sniffing from magic bytes, so one /encode or /decode route can hand an
+# upload to the image, audio or video engine whatever its filename claims.
+from typing import Optional
+
+SNIFF_BYTES = 16
+# (leading magic, media type); RIFF and ISO-BMFF containers are told apart below
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image"),
+    (b"\xff\xd8\xff", "image"),           # JPEG
+    (b"GIF87a", "image"),
+    (b"GIF89a", "image"),
+    (b"BM", "image"),
+    (b"II*\x00", "image"),                # TIFF, little-endian
+    (b"MM\x00*", "image"),                # TIFF, big-endian
+    (b"\x1aE\xdf\xa3", "video"),          # Matroska / WebM (EBML)
+)
+_RIFF_FORMS = {b"WAVE": "audio", b"WEBP": "image", b"AVI ": "video"}
+# ISO-BMFF major brands of HEIF/AVIF stills (and image sequences); any other ftyp is MP4 / MOV / M4V
+_ISOBMFF_IMAGE_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"mif2", b"msf1",
+                         b"avif", b"avis", b"avci"}
+_NETPBM = (b"P1", b"P2", b"P3", b"P4", b"P5", b"P6")
+
+def sniff_media(head: bytes) -> Optional[str]:
+    """Media type ("image", "audio" or "video") from the first SNIFF_BYTES of a file, or None."""
+    if head[:4] == b"RIFF":
+        return _RIFF_FORMS.get(head[8:12])
+    if head[4:8] == b"ftyp":
+        return "image" if head[8:12] in _ISOBMFF_IMAGE_BRANDS else "video"
+    if head[:2] in _NETPBM and head[2:3].isspace():
+        return "image"
+    for magic, media in _SIGNATURES:
+        if head.startswith(magic):
+            return media
+    return None
+
+def sniff_file(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return sniff_media(f.read(SNIFF_BYTES))
@@ -0,0 +1,185 @@
+# metrics.py
+# Request and per-stage instrumentation, rendered in Prometheus text format for /metrics.
+# Stages (upload read, decode, convert, embed/extract/analyze, serialize, ...) are timed
+# with `stage()`; work in the process pool sends its samples back with the result
+# (see workers.run_in_pool). Optional: tracemalloc peaks for a sample of requests and a
+# cProfile dump of every request slower than STEGO_PROFILE_SLOW_MS.
+import cProfile
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(12))          # 1 KiB .. 4 GiB
+TRACEMALLOC_SAMPLE = float(os.environ.get("STEGO_TRACEMALLOC_SAMPLE", "0"))  # fraction of requests
+PROFILE_SLOW_MS = float(os.environ.get("STEGO_PROFILE_SLOW_MS", "0"))      # 0 = profiling off
+PROFILE_DIR = os.environ.get("STEGO_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "stego-profiles")
+
+# -------------------------
+# Metric types
+# -------------------------
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name, self.help, self.buckets, self.labels = name, help, tuple(buckets), tuple(labels)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (f'{bound:g}',))} {n}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]:.6g}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+class Gauge:
+    """Single value; kind="counter" for one that only goes up."""
+    def __init__(self, name: str, help: str, kind: str = "gauge"):
+        self.name, self.help, self.kind = name, help, kind
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, delta: float) -> None:
+        with self._lock:
+            self.value += delta
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.value:g}"]
+
+REQUEST_SECONDS = Histogram("stego_request_seconds", "Request latency until the last body byte is sent.",
+                            LATENCY_BUCKETS, ("route", "status"))
+STAGE_SECONDS = Histogram("stego_stage_seconds", "Time spent per processing stage.", LATENCY_BUCKETS, ("stage",))
+UPLOAD_BYTES = Histogram("stego_upload_bytes", "Size of each spooled upload.", SIZE_BUCKETS)
+TRACEMALLOC_PEAK = Histogram("stego_request_tracemalloc_peak_bytes",
+                             "Python heap peak of sampled requests (API process only, not pool workers).",
+                             SIZE_BUCKETS, ("route",))
+IN_FLIGHT = Gauge("stego_requests_in_flight", "Requests currently being handled.")
+PROFILES_WRITTEN = Gauge("stego_slow_profiles_total", "cProfile dumps written for slow requests.", "counter")
+_METRICS = (REQUEST_SECONDS, STAGE_SECONDS, UPLOAD_BYTES, TRACEMALLOC_PEAK, IN_FLIGHT, PROFILES_WRITTEN)
+
+def render() -> str:
+    return "\n".join(line for metric in _METRICS for line in metric.render()) + "\n"
+
+# -------------------------
+# Stages
+# -------------------------
+# Set in pool workers so samples travel back with the result instead of being lost
+_pending_samples: ContextVar[Optional[list]] = ContextVar("stego_stage_samples", default=None)
+
+def record_stage(name: str, seconds: float) -> None:
+    samples = _pending_samples.get()
+    if samples is not None:
+        samples.append((name, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, name)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+def staged(name: str, fn, *args):
+    """fn(*args) timed as one stage; picklable, so it can be sent to the pool or a thread."""
+    with stage(name):
+        return fn(*args)
+
+def traced(fn, *args):
+    """Pool-side wrapper: run fn and return (result, stage samples) for record_samples."""
+    samples = []
+    token = _pending_samples.set(samples)
+    try:
+        return fn(*args), samples
+    finally:
+        _pending_samples.reset(token)
+
+def record_samples(samples) -> None:
+    for name, seconds in samples:
+        record_stage(name, seconds)
+
+# -------------------------
+# Request middleware
+# -------------------------
+_exclusive = threading.Lock()  # tracemalloc and the profiler are process-wide: one request at a time
+
+class MetricsMiddleware:
+    """ASGI middleware: latency per route/status, in-flight count, sampled heap peak, slow-request profiles."""
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        want_trace = TRACEMALLOC_SAMPLE > 0 and random.random() < TRACEMALLOC_SAMPLE
+        owns = (want_trace or PROFILE_SLOW_MS > 0) and _exclusive.acquire(blocking=False)
+        trace = owns and want_trace and not tracemalloc.is_tracing()
+        profiler = cProfile.Profile() if owns and PROFILE_SLOW_MS > 0 else None
+        if trace:
+            tracemalloc.start()
+        if profiler is not None:
+            # profiles the event-loop thread, so overlapping requests show up in it too
+            profiler.enable()
+        IN_FLIGHT.add(1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.add(-1)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, route, status)
+            if owns:
+                self._finish_exclusive(route, elapsed, trace, profiler)
+
+    def _finish_exclusive(self, route: str, elapsed: float, trace: bool, profiler) -> None:
+        try:
+            if trace:
+                TRACEMALLOC_PEAK.observe(tracemalloc.get_traced_memory()[1], route)
+                tracemalloc.stop()
+            if profiler is not None:
+                profiler.disable()
+                if elapsed * 1000 >= PROFILE_SLOW_MS:
+                    os.makedirs(PROFILE_DIR, exist_ok=True)
+                    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{route.strip('/').replace('/', '_') or 'root'}" \
+                           f"-{elapsed * 1000:.0f}ms.prof"
+                    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+                    PROFILES_WRITTEN.add(1)
+        finally:
+            _exclusive.release()
@@ -0,0 +1,218 @@
+# model_server.py
+# Loads the trained ResNet18 detector once and serves it through a micro-batcher,
+# so concurrent /detect requests share a single forward pass.
+import asyncio
+import json
+import os
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from detector_model import CROP_SIZE, build_detector
+from stego_utils import ARTIFACT_SUFFIXES, artifact_kind, detector_artifacts, detector_input
+
+TORCH_THREADS = int(os.environ.get("STEGO_TORCH_THREADS", "0")) or os.cpu_count() or 1
+BATCH_MAX_CROPS = int(os.environ.get("STEGO_BATCH_MAX_CROPS", "64"))   # crops per forward pass
+BATCH_WAIT_MS = float(os.environ.get("STEGO_BATCH_WAIT_MS", "5"))      # max wait to fill a batch
+
+# -------------------------
+# Model
+# -------------------------
+class Detector:
+    """A loaded torch detector (fp32 module or int8 TorchScript) plus its input settings."""
+    backend = "fp32"
+
+    def __init__(self, model: nn.Module, input_mode: str = "native", crop_size: int = CROP_SIZE, path: str = ""):
+        self.model = model.eval()
+        self.input_mode = input_mode
+        self.crop_size = crop_size
+        self.path = path
+
+    def prepare(self, source) -> torch.Tensor:
+        return detector_input(source, self.crop_size, self.input_mode)
+
+    @torch.inference_mode()
+    def predict(self, batch: torch.Tensor) -> torch.Tensor:
+        """Stego probability per crop."""
+        return torch.softmax(self.model(batch), dim=1)[:, 1]
+
+    def predict_image(self, source) -> float:
+        """Per-request path: mean stego probability over the image's crops."""
+        return float(self.predict(self.prepare(source)).mean())
+
+class OnnxDetector(Detector):
+    """Same interface, run by ONNX Runtime on the CPU execution provider."""
+    backend = "onnx"
+
+    def __init__(self, session, input_mode: str = "native", crop_size: int = CROP_SIZE, path: str = ""):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.input_mode = input_mode
+        self.crop_size = crop_size
+        self.path = path
+
+    def predict(self, batch: torch.Tensor) -> torch.Tensor:
+        logits = torch.from_numpy(self.session.run(None, {self.input_name: batch.numpy()})[0])
+        return torch.softmax(logits, dim=1)[:, 1]
+
+def configure_threads(threads: int = TORCH_THREADS) -> None:
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)  # one forward pass at a time; parallelism is intra-op
+    except RuntimeError:
+        pass  # already fixed for this process
+
+def _load_fp32(path: str) -> Detector:
+    state = torch.load(path, map_location="cpu", weights_only=True)
+    if "state_dict" in state:
+        model = build_detector(pretrained=False)
+        model.load_state_dict(state["state_dict"])
+        return Detector(model, state.get("input_mode", "native"), state.get("crop_size", CROP_SIZE), path)
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, 2)
+    model.load_state_dict(state)
+    return Detector(model, "resize", 224, path)
+
+def _load_torch_int8(path: str) -> Detector:
+    extra = {"meta.json": ""}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)  # TorchScript deprecation notice
+        model = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+    meta = json.loads(extra["meta.json"] or "{}")
+    detector = Detector(model, meta.get("input_mode", "native"), meta.get("crop_size", CROP_SIZE), path)
+    detector.backend = "torch_int8"
+    return detector
+
+def _load_onnx(path: str) -> Detector:
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    options.inter_op_num_threads = 1
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    meta = session.get_modelmeta().custom_metadata_map
+    detector = OnnxDetector(session, meta.get("input_mode", "native"), int(meta.get("crop_size", CROP_SIZE)), path)
+    detector.backend = artifact_kind(path)
+    return detector
+
+def _stale_export(path: str) -> bool:
+    """An export older than the .pth it came from would serve an outdated model."""
+    kind = artifact_kind(path)
+    if kind == "fp32":
+        return False
+    weights = path[:-len(dict(ARTIFACT_SUFFIXES)[kind])] + ".pth"
+    return os.path.exists(weights) and os.path.getmtime(weights) > os.path.getmtime(path)
+
+_LOADERS = {"fp32": _load_fp32, "torch_int8": _load_torch_int8, "onnx": _load_onnx, "onnx_int8": _load_onnx}
+
+def load_detector(paths: Optional[Iterable[str]] = None) -> Optional[Detector]:
+    """
+    First artifact that exists and loads, or None (callers fall back to the heuristic).
+    Handles checkpoint(model) dicts from the crop pipeline, the bare ResNet18 state
+    dicts the trainers used to write, and the exports from detector_export.py.
+    An ONNX artifact is skipped when onnxruntime is not installed.
+    """
+    for path in (detector_artifacts() if paths is None else paths):
+        if not os.path.exists(path) or _stale_export(path):
+            continue
+        try:
+            return _LOADERS[artifact_kind(path)](path)
+        except ImportError:
+            continue
+    return None
+
+# -------------------------
+# Micro-batching
+# -------------------------
+class MicroBatcher:
+    """
+    Queue of (crops, future) from concurrent requests. The first arrival opens a
+    window of at most `max_wait_ms`; everything queued by then (up to `max_crops`)
+    goes through one forward pass on a dedicated thread, off the event loop.
+    """
+    def __init__(self, detector: Detector, max_crops: int = BATCH_MAX_CROPS, max_wait_ms: float = BATCH_WAIT_MS):
+        self.detector = detector
+        self.max_crops = max_crops
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: deque = deque()
+        self._pending_crops = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.requests = 0
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, crops: torch.Tensor) -> float:
+        """Mean stego probability over `crops` (one image), computed in a shared batch."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((crops, future))
+        self._pending_crops += len(crops)
+        self._wakeup.set()
+        return await future
+
+    def _take_batch(self):
+        batch, n = [], 0
+        while self._pending and (not batch or n + len(self._pending[0][0]) <= self.max_crops):
+            crops, future = self._pending.popleft()
+            self._pending_crops -= len(crops)
+            if not future.cancelled():
+                batch.append((crops, future))
+                n += len(crops)
+        if not self._pending:
+            self._wakeup.clear()
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            deadline = loop.time() + self.max_wait
+            while self._pending_crops < self.max_crops:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                probs = await loop.run_in_executor(
+                    self._executor, self.detector.predict, torch.cat([crops for crops, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for crops, future in batch:
+                if not future.done():
+                    future.set_result(float(probs[start:start + len(crops)].mean()))
+                start += len(crops)
+            self.batches += 1
+            self.requests += len(batch)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "requests": self.requests,
+                "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "max_crops": self.max_crops, "max_wait_ms": self.max_wait * 1000.0}
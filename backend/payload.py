@@ -0,0 +1,125 @@
+# payload.py
+# Versioned container for hidden messages, shared by the image, audio and video engines:
+# a 16-byte header (magic, version, codec, parity, body length, body CRC, header CRC)
+# followed by the body - the message, optionally zlib/lzma-compressed, optionally
+# followed by Reed-Solomon parity. Decoders read the header first, so they know exactly
+# how many bits to extract and reject a damaged header before touching the rest.
+import lzma
+import os
+import struct
+import zlib
+from typing import NamedTuple, Optional
+
+import reed_solomon
+
+MAGIC = b"SG"
+VERSION = 1
+_HEADER = struct.Struct(">2sBBBxIIH")  # magic, version, codec, parity, -, length, body crc32, header crc
+HEADER_SIZE = _HEADER.size
+HEADER_BITS = HEADER_SIZE * 8
+CODECS = ("none", "zlib", "lzma")
+# "auto" keeps zlib output only when it is smaller; lzma is smaller still on long text but slower
+PAYLOAD_COMPRESSION = os.environ.get("STEGO_PAYLOAD_COMPRESSION", "auto")
+# Reed-Solomon parity bytes per 255-byte block (0 = off); each block survives parity // 2 bad bytes
+PAYLOAD_PARITY = int(os.environ.get("STEGO_PAYLOAD_PARITY", "0"))
+MAX_PARITY = 128
+MAX_MESSAGE_BYTES = int(os.environ.get("STEGO_MAX_MESSAGE_BYTES", str(1 << 28)))  # decompression cap
+
+class Header(NamedTuple):
+    codec: int
+    parity: int
+    length: int  # stored body bytes, parity included
+    crc: int     # crc32 of the body before parity
+
+    @property
+    def total_bits(self) -> int:
+        return (HEADER_SIZE + self.length) * 8
+
+def _header_crc(raw: bytes) -> int:
+    return zlib.crc32(raw) & 0xffff
+
+# -------------------------
+# Packing
+# -------------------------
+def _compress(data: bytes, compression: str) -> tuple:
+    if compression == "auto":
+        packed = zlib.compress(data, 9)
+        return (1, packed) if len(packed) < len(data) else (0, data)
+    if compression not in CODECS:
+        raise ValueError(f"Unsupported compression '{compression}'. Choose one of: auto, {', '.join(CODECS)}")
+    codec = CODECS.index(compression)
+    if codec == 1:
+        return codec, zlib.compress(data, 9)
+    if codec == 2:
+        return codec, lzma.compress(data, preset=6)
+    return codec, data
+
+def _check_parity(parity: int) -> None:
+    if not 0 <= parity <= MAX_PARITY:
+        raise ValueError(f"parity must be between 0 and {MAX_PARITY}")
+
+def pack(message: bytes, compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY) -> bytes:
+    """Header + body for `message`, ready to embed."""
+    _check_parity(parity)
+    codec, body = _compress(message, compression)
+    crc = zlib.crc32(body)
+    if parity:
+        body = reed_solomon.encode(body, parity)
+    head = _HEADER.pack(MAGIC, VERSION, codec, parity, len(body), crc, 0)[:-2]
+    return head + struct.pack(">H", _header_crc(head)) + body
+
+def max_message_bytes(carrier_bits: int, parity: int = PAYLOAD_PARITY) -> int:
+    """Longest uncompressed message that fits in `carrier_bits` LSBs."""
+    _check_parity(parity)
+    room = max(0, carrier_bits // 8 - HEADER_SIZE)
+    return reed_solomon.max_data_size(room, parity) if parity else room
+
+def lsb_capacity(carrier_bits: int, parity: int = PAYLOAD_PARITY) -> dict:
+    """/capacity entry for one LSB per carrier sample (channel value, PCM sample)."""
+    max_bytes = max_message_bytes(carrier_bits, parity)
+    return {"mode": "lsb", "bits_per_sample": 1, "carrier_bits": carrier_bits, "parity": parity,
+            "overhead_bits": carrier_bits - max_bytes * 8,
+            "max_message_bytes": max_bytes}
+
+# -------------------------
+# Unpacking
+# -------------------------
+def parse_header(raw: bytes) -> Optional[Header]:
+    """
+    Header from the first HEADER_SIZE bytes, or None when they are not a container
+    (files written before it existed). A container header that fails its CRC or
+    names an unknown version or codec raises ValueError.
+    """
+    if len(raw) < HEADER_SIZE or raw[:2] != MAGIC:
+        return None
+    _, version, codec, parity, length, crc, check = _HEADER.unpack(raw[:HEADER_SIZE])
+    if check != _header_crc(raw[:HEADER_SIZE - 2]):
+        raise ValueError("Corrupted payload header")
+    if version != VERSION:
+        raise ValueError(f"Unsupported payload version {version}")
+    if codec >= len(CODECS) or parity > MAX_PARITY:
+        raise ValueError("Corrupted payload header")
+    return Header(codec, parity, length, crc)
+
+def _decompress(codec: int, body: bytes) -> bytes:
+    if codec == 0:
+        return body
+    engine = zlib.decompressobj() if codec == 1 else lzma.LZMADecompressor()
+    try:
+        out = engine.decompress(body, MAX_MESSAGE_BYTES)
+    except (zlib.error, lzma.LZMAError):
+        raise ValueError("Corrupted payload body") from None
+    if len(out) >= MAX_MESSAGE_BYTES:
+        raise ValueError("Hidden message exceeds STEGO_MAX_MESSAGE_BYTES")
+    return out
+
+def unpack(header: Header, body: bytes) -> bytes:
+    """Message bytes from the stored body; repairs what the parity allows, then checks the CRC."""
+    if len(body) < header.length:
+        raise ValueError("Payload is truncated")
+    body = body[:header.length]
+    if header.parity:
+        body = reed_solomon.decode(body, header.parity)
+    if zlib.crc32(body) != header.crc:
+        raise ValueError("Payload CRC mismatch: the hidden data is corrupted")
+    return _decompress(header.codec, body)
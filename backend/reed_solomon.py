@@ -0,0 +1,164 @@
+# reed_solomon.py
+# Systematic Reed-Solomon over GF(2^8) (primitive polynomial 0x11d, first consecutive
+# root alpha^0), in 255-byte blocks of 255 - nsym data bytes plus nsym parity bytes;
+# the last block is shortened. Each block corrects up to nsym // 2 corrupted bytes.
+# Encoding and syndromes are vectorised across blocks with numpy; only blocks with
+# a non-zero syndrome go through Berlekamp-Massey, Chien search and Forney.
+from typing import List
+
+import numpy as np
+
+BLOCK = 255
+
+# -------------------------
+# GF(2^8) arithmetic
+# -------------------------
+def _tables():
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i], log[x] = x, i
+        x <<= 1
+        if x & 0x100:
+            x ^= 0x11d
+    exp[255:510] = exp[:255]
+    return exp, log
+
+_EXP, _LOG = _tables()
+_EXP_L, _LOG_L = _EXP.tolist(), _LOG.tolist()  # scalar lookups in the per-block decoder
+
+def _mul(a: int, b: int) -> int:
+    return 0 if a == 0 or b == 0 else _EXP_L[_LOG_L[a] + _LOG_L[b]]
+
+def _div(a: int, b: int) -> int:
+    return 0 if a == 0 else _EXP_L[(_LOG_L[a] - _LOG_L[b]) % 255]
+
+def _mul_arrays(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    out = _EXP[_LOG[a] + _LOG[b]]
+    return np.where((a == 0) | (b == 0), 0, out).astype(np.uint8)
+
+def _generator(nsym: int) -> np.ndarray:
+    """prod_{j < nsym} (x - alpha^j), highest degree first."""
+    g = [1]
+    for j in range(nsym):
+        root = _EXP_L[j]
+        g = [a ^ _mul(b, root) for a, b in zip(g + [0], [0] + g)]
+    return np.array(g, dtype=np.uint8)
+
+def _blocks(data: bytes, width: int) -> np.ndarray:
+    """Rows of `width` bytes; the last one is left-padded with zeros (a shortened block)."""
+    full = len(data) // width
+    rows = np.zeros((max(1, -(-len(data) // width)), width), dtype=np.uint8)
+    rows[:full] = np.frombuffer(data, dtype=np.uint8, count=full * width).reshape(full, width)
+    tail = data[full * width:]
+    if tail:
+        rows[-1, width - len(tail):] = np.frombuffer(tail, dtype=np.uint8)
+    return rows
+
+def _split(data: bytes, width: int) -> List[bytes]:
+    return [data[i:i + width] for i in range(0, len(data), width)] or [b""]
+
+# -------------------------
+# Encoding
+# -------------------------
+def encoded_size(data_len: int, nsym: int) -> int:
+    return data_len + nsym * max(1, -(-data_len // (BLOCK - nsym)))
+
+def max_data_size(encoded_len: int, nsym: int) -> int:
+    """Largest data length whose encoding fits in `encoded_len` bytes."""
+    full, rest = divmod(encoded_len, BLOCK)
+    return full * (BLOCK - nsym) + max(0, rest - nsym)
+
+def encode(data: bytes, nsym: int) -> bytes:
+    if not 0 < nsym < BLOCK:
+        raise ValueError(f"Reed-Solomon parity must be between 1 and {BLOCK - 1} bytes")
+    k = BLOCK - nsym
+    gen = _generator(nsym)[1:]
+    blocks = _blocks(data, k)
+    remainder = np.zeros((len(blocks), nsym), dtype=np.uint8)
+    for i in range(k):  # polynomial division by the generator, all blocks at once
+        coef = blocks[:, i] ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        remainder ^= _mul_arrays(coef[:, None], gen[None, :])
+    chunks = _split(data, k)
+    return b"".join(chunk + remainder[i].tobytes() for i, chunk in enumerate(chunks))
+
+# -------------------------
+# Decoding
+# -------------------------
+def _syndromes(blocks: np.ndarray, nsym: int) -> np.ndarray:
+    """S_j = c(alpha^j) for every block (Horner, highest degree first)."""
+    roots = _EXP[:nsym][None, :]
+    synd = np.zeros((len(blocks), nsym), dtype=np.uint8)
+    for i in range(blocks.shape[1]):
+        synd = _mul_arrays(synd, roots) ^ blocks[:, i:i + 1]
+    return synd
+
+def _correct(block: bytearray, synd: List[int]) -> None:
+    """Fix one block in place from its syndromes, or raise ValueError."""
+    nsym, n = len(synd), len(block)
+    # Berlekamp-Massey: error locator, lowest degree first
+    locator, prev, errors, shift, scale = [1], [1], 0, 1, 1
+    for r in range(nsym):
+        delta = synd[r]
+        for i in range(1, errors + 1):
+            if i < len(locator):
+                delta ^= _mul(locator[i], synd[r - i])
+        if delta == 0:
+            shift += 1
+            continue
+        coef = _div(delta, scale)
+        updated = locator + [0] * max(0, len(prev) + shift - len(locator))
+        for i, p in enumerate(prev):
+            updated[i + shift] ^= _mul(coef, p)
+        if 2 * errors <= r:
+            prev, errors, scale, shift = locator, r + 1 - errors, delta, 1
+        else:
+            shift += 1
+        locator = updated
+    if 2 * errors > nsym:
+        raise ValueError("Too many corrupted bytes to repair")
+
+    def evaluate(poly, x):
+        y = 0
+        for c in reversed(poly):
+            y = _mul(y, x) ^ c
+        return y
+
+    # Chien search: alpha^-d is a root for an error at degree d (index n - 1 - d)
+    positions = [d for d in range(n) if evaluate(locator, _EXP_L[(255 - d) % 255]) == 0]
+    if len(positions) != errors:
+        raise ValueError("Too many corrupted bytes to repair")
+    # Forney: Y = X * Omega(X^-1) / Lambda'(X^-1), Omega = S * Lambda mod x^nsym
+    omega = [0] * nsym
+    for i, s in enumerate(synd):
+        for j, l in enumerate(locator[:nsym - i]):
+            omega[i + j] ^= _mul(s, l)
+    derivative = [locator[i] if i % 2 else 0 for i in range(1, len(locator))]
+    for d in positions:
+        x, x_inv = _EXP_L[d % 255], _EXP_L[(255 - d) % 255]
+        denominator = evaluate(derivative, x_inv)
+        if denominator == 0:
+            raise ValueError("Too many corrupted bytes to repair")
+        block[n - 1 - d] ^= _mul(x, _div(evaluate(omega, x_inv), denominator))
+
+def decode(encoded: bytes, nsym: int) -> bytes:
+    """Data bytes of `encoded`, repairing what the parity allows; ValueError otherwise."""
+    if not 0 < nsym < BLOCK:
+        raise ValueError(f"Reed-Solomon parity must be between 1 and {BLOCK - 1} bytes")
+    chunks = _split(encoded, BLOCK)
+    if len(chunks[-1]) < nsym:
+        raise ValueError("Truncated Reed-Solomon block")
+    synd = _syndromes(_blocks(encoded, BLOCK), nsym)  # leading zeros leave syndromes unchanged
+    out = []
+    for i, chunk in enumerate(chunks):
+        if synd[i].any():
+            block = bytearray(chunk)
+            _correct(block, synd[i].tolist())
+            if _syndromes(np.frombuffer(bytes(block), dtype=np.uint8)[None, :], nsym).any():
+                raise ValueError("Too many corrupted bytes to repair")
+            chunk = bytes(block)
+        out.append(chunk[:-nsym])
+    return b"".join(out)
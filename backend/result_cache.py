@@ -0,0 +1,152 @@
+# result_cache.py
+# Content-addressed cache for /detect and /decode results: in-memory LRU plus optional SQLite tier.
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+
+CACHE_SIZE = int(os.environ.get("STEGO_CACHE_SIZE", "1024"))   # in-memory entries
+CACHE_DB = os.environ.get("STEGO_CACHE_DB")                     # SQLite path; unset = memory only
+CACHE_DB_SIZE = int(os.environ.get("STEGO_CACHE_DB_SIZE", "100000"))              # SQLite rows kept
+CACHE_DB_TTL = float(os.environ.get("STEGO_CACHE_DB_TTL", str(30 * 24 * 3600)))  # seconds; 0 = no age limit
+PRUNE_EVERY = 64  # SQLite inserts between prunes, so the row bound may be overshot by this much
+
+# -------------------------
+# Keys
+# -------------------------
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def source_fingerprint(module_names: Iterable[str]) -> str:
+    """Hash of the source of the given modules; located without importing them."""
+    h = hashlib.blake2b(digest_size=8)
+    for name in module_names:
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path is None:
+            spec = importlib.util.find_spec(name)
+            path = spec.origin if spec else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def weights_fingerprint(paths: Iterable[str]) -> str:
+    """Size + mtime of whichever weight files exist, so retraining invalidates old entries."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
+
+# -------------------------
+# Cache
+# -------------------------
+class ResultCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, db_path: Optional[str] = CACHE_DB,
+                 max_disk_entries: int = CACHE_DB_SIZE, disk_ttl: float = CACHE_DB_TTL):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_disk_entries, self.disk_ttl = max_disk_entries, disk_ttl
+        self._lru: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evicted_disk = 0
+        self._inserts = 0
+        if db_path:
+            with self._db() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS results "
+                           "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+                db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            self.prune()
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with db:  # commits on success
+                yield db
+        finally:
+            db.close()
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits_memory += 1
+                return self._lru[key]
+        if self.db_path:
+            with self._db() as db:
+                row = db.execute("SELECT value FROM results WHERE key = ? AND created >= ?",
+                                 (key, self._cutoff())).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value)
+                with self._lock:
+                    self.hits_disk += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        if self.db_path:
+            with self._db() as db:
+                db.execute("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), time.time()))
+            with self._lock:
+                self._inserts += 1
+                due = self._inserts % PRUNE_EVERY == 0
+            if due:
+                self.prune()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.disk_ttl if self.disk_ttl > 0 else 0.0
+
+    def prune(self) -> int:
+        """Drop SQLite rows older than the TTL, then the oldest beyond max_disk_entries; returns how many."""
+        with self._db() as db:
+            removed = db.execute("DELETE FROM results WHERE created < ?", (self._cutoff(),)).rowcount
+            removed += db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results "
+                                  "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,)).rowcount
+        with self._lock:
+            self.evicted_disk += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            stats = {
+                "entries_memory": len(self._lru),
+                "max_entries": self.max_entries,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                "disk_enabled": bool(self.db_path),
+            }
+        if self.db_path:
+            with self._db() as db:
+                stats["entries_disk"] = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            stats.update(max_entries_disk=self.max_disk_entries, ttl_disk_s=self.disk_ttl,
+                         evicted_disk=self.evicted_disk)
+        return stats
@@ -0,0 +1,229 @@
+# shards.py
+# Decode the training set once into fixed-size uint8 memmap shards, then read them zero-copy.
+# Usage:
+#   python shards.py --src dataset/train --dst shards/train
+#   python shards.py --src dataset/val --dst shards/val --size 224 --shard-size 2048
+#   python shards.py --src dataset/train --dst shards/train --mode crop   # native-resolution crops, CROP_SIZE edge
+# Class folders may carry a labels.csv (generate_stego_dataset.py); its label, scheme and
+# embedding rate per file override the folder label and travel with the shards.
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.utils.data
+from PIL import Image
+from torchvision import datasets
+
+from detector_model import CROP_SIZE
+from generate_stego_dataset import LABELS_NAME
+
+INDEX_NAME = "index.json"
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+MODES = ("resize", "crop")  # crop keeps native pixels (LSBs intact) for the detector's crop pipeline
+RESIZE_SIZE = 224
+
+# -------------------------
+# Building shards
+# -------------------------
+def read_labels(folder):
+    """labels.csv rows of one class folder keyed by file name; {} when it has none."""
+    path = Path(folder) / LABELS_NAME
+    if not path.exists():
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["file"]: row for row in csv.DictReader(f)}
+
+def label_metadata(paths, labels):
+    """
+    (labels, embedding rates, schemes) per image. Files listed in their folder's
+    labels.csv take its values; others keep the folder label, with rate 0 and
+    scheme "clean" for class 0 and an unknown rate (nan) otherwise.
+    """
+    tables, out_labels, rates, schemes = {}, [], [], []
+    for path, label in zip(paths, labels):
+        folder = os.path.dirname(path)
+        if folder not in tables:
+            tables[folder] = read_labels(folder)
+        row = tables[folder].get(os.path.basename(path))
+        if row is not None:
+            out_labels.append(int(row["label"]))
+            rates.append(float(row["embedding_rate"]) if row.get("embedding_rate") else float("nan"))
+            schemes.append(row.get("scheme") or "unknown")
+        else:
+            out_labels.append(label)
+            rates.append(0.0 if label == 0 else float("nan"))
+            schemes.append("clean" if label == 0 else "unknown")
+    return out_labels, rates, schemes
+
+def list_image_folder(root):
+    """
+    (paths, labels, classes) in the same order torchvision's ImageFolder uses,
+    labels taken from labels.csv where a class folder has one.
+    """
+    root = Path(root)
+    classes = sorted(d.name for d in root.iterdir() if d.is_dir())
+    paths, labels = [], []
+    for label, name in enumerate(classes):
+        for p in sorted((root / name).rglob("*")):
+            if p.suffix.lower() in IMAGE_EXTS:
+                paths.append(str(p))
+                labels.append(label)
+    labels = label_metadata(paths, labels)[0]
+    return paths, labels, classes
+
+def load_fixed(path, size, mode="resize"):
+    """
+    RGB uint8 HxWx3 of the given size: resized the way transforms.Resize did, or
+    ("crop") centre-cropped at native resolution, reflect-padded when too small.
+    """
+    img = Image.open(path).convert("RGB")
+    if mode == "crop":
+        pixels = np.asarray(img, dtype=np.uint8)
+        pad_h, pad_w = max(0, size[0] - pixels.shape[0]), max(0, size[1] - pixels.shape[1])
+        if pad_h or pad_w:
+            pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode="reflect")
+        top, left = (pixels.shape[0] - size[0]) // 2, (pixels.shape[1] - size[1]) // 2
+        return np.ascontiguousarray(pixels[top:top + size[0], left:left + size[1]])
+    if img.size != (size[1], size[0]):
+        img = img.resize((size[1], size[0]), Image.BILINEAR)
+    return np.asarray(img, dtype=np.uint8)
+
+def _load_job(args):
+    return load_fixed(*args)
+
+def build_shards(src_root, dst_dir, size=None, shard_size=1024, workers=None, mode="resize"):
+    """
+    Decode every image under src_root (ImageFolder layout) once and write
+    shard_NNNNN.npy arrays of shape (n, H, W, 3) plus labels.npy and index.json
+    (which also records each image's scheme and embedding rate).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown shard mode {mode!r}; expected one of {MODES}")
+    if size is None:
+        size = CROP_SIZE if mode == "crop" else RESIZE_SIZE
+    size = (size, size) if isinstance(size, int) else tuple(size)
+    paths, labels, classes = list_image_folder(src_root)
+    _, rates, schemes = label_metadata(paths, labels)
+    dst = Path(dst_dir)
+    dst.mkdir(parents=True, exist_ok=True)
+
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard_no, start in enumerate(range(0, len(paths), shard_size)):
+            chunk = paths[start:start + shard_size]
+            name = f"shard_{shard_no:05d}.npy"
+            out = np.lib.format.open_memmap(dst / name, mode="w+", dtype=np.uint8,
+                                            shape=(len(chunk), size[0], size[1], 3))
+            for i, pixels in enumerate(pool.map(_load_job, [(p, size, mode) for p in chunk], chunksize=16)):
+                out[i] = pixels
+            out.flush()
+            del out
+            shards.append({"file": name, "count": len(chunk)})
+            print(f"  {name}: {len(chunk)} images")
+
+    np.save(dst / "labels.npy", np.asarray(labels, dtype=np.int64))
+    index = {"size": list(size), "mode": mode, "classes": classes, "count": len(paths), "shards": shards,
+             "sources": [os.path.relpath(p, src_root) for p in paths],
+             "embedding_rates": [None if np.isnan(r) else r for r in rates], "schemes": schemes}
+    with open(dst / INDEX_NAME, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    print(f"Wrote {len(paths)} images in {len(shards)} shards -> {dst}")
+    return index
+
+# -------------------------
+# Reading shards
+# -------------------------
+def shards_ready(shard_dir, mode: str) -> bool:
+    """
+    True when `shard_dir` holds shards built with `mode`. Crop shards smaller than
+    CROP_SIZE are refused: the trainers would reflect-pad them, and the network
+    would learn mirrored residual borders that serving never sees.
+    """
+    if not os.path.exists(os.path.join(shard_dir, INDEX_NAME)):
+        return False
+    with open(os.path.join(shard_dir, INDEX_NAME), encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("mode", "resize") != mode:
+        return False
+    if mode == "crop" and min(index["size"]) < CROP_SIZE:
+        print(f"Ignoring {shard_dir}: crop shards are {index['size']} px, smaller than CROP_SIZE={CROP_SIZE}; "
+              f"rebuild with shards.py --mode crop")
+        return False
+    return True
+
+class ShardDataset(torch.utils.data.Dataset):
+    """
+    Dataset over build_shards output. Items are (uint8 CxHxW tensor, label) views
+    into copy-on-write memmaps, so nothing is decoded or copied per epoch;
+    convert a whole batch with `batch.float().div_(255)`.
+    Memmaps are opened lazily so each DataLoader worker maps the files itself.
+    """
+    def __init__(self, shard_dir, transform=None):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / INDEX_NAME, encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.classes = self.index["classes"]
+        self.mode = self.index.get("mode", "resize")
+        self.labels = np.load(self.shard_dir / "labels.npy")
+        # shards built before labels.csv support carry neither column
+        rates = self.index.get("embedding_rates") or [None] * len(self)
+        self.embedding_rates = [float("nan") if r is None else r for r in rates]
+        self.schemes = self.index.get("schemes") or ["unknown"] * len(self)
+        self.transform = transform
+        counts = [s["count"] for s in self.index["shards"]]
+        self._starts = np.cumsum([0] + counts[:-1])
+        self._arrays = None
+
+    def __len__(self):
+        return int(self.index["count"])
+
+    def _shard_arrays(self):
+        if self._arrays is None:
+            self._arrays = [np.load(self.shard_dir / s["file"], mmap_mode="c")
+                            for s in self.index["shards"]]
+        return self._arrays
+
+    def __getitem__(self, idx):
+        shard = int(np.searchsorted(self._starts, idx, side="right")) - 1
+        pixels = self._shard_arrays()[shard][idx - self._starts[shard]]
+        image = torch.from_numpy(pixels).permute(2, 0, 1)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, int(self.labels[idx])
+
+    def __getstate__(self):
+        # never pickle open memmaps into DataLoader workers
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+class LabeledImageFolder(datasets.ImageFolder):
+    """
+    ImageFolder whose targets come from labels.csv where present, with the
+    per-image `embedding_rates` and `schemes` that ShardDataset also exposes.
+    """
+    def __init__(self, root, transform=None):
+        super().__init__(root, transform=transform)
+        paths = [path for path, _ in self.samples]
+        self.targets, self.embedding_rates, self.schemes = label_metadata(paths, self.targets)
+        self.samples = self.imgs = list(zip(paths, self.targets))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--src", type=str, default="dataset/train", help="ImageFolder root (class subfolders)")
+    parser.add_argument("--dst", type=str, default="shards/train", help="output shard directory")
+    parser.add_argument("--size", type=int, default=None,
+                        help=f"stored image edge in pixels (default: {RESIZE_SIZE}, or CROP_SIZE={CROP_SIZE} for --mode crop)")
+    parser.add_argument("--shard-size", type=int, default=1024, help="images per shard file")
+    parser.add_argument("--workers", type=int, default=None, help="decoder processes (default: all cores)")
+    parser.add_argument("--mode", choices=MODES, default="resize", help="resize (legacy) or native-resolution centre crop")
+    args = parser.parse_args()
+    build_shards(args.src, args.dst, args.size, args.shard_size, args.workers, args.mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# steganalysis.py
+# Tile-streaming chi-square (pairs of values) and RS steganalysis for LSB embedding.
+import math
+
+import numpy as np
+
+from image_bands import iter_bands, open_image
+
+TILE_SIZE = 256            # tile edge in pixels; one row band is TILE_SIZE rows high
+RS_MASK = np.array([0, 1, 1, 0], dtype=bool)
+CHI_MIN_EXPECTED = 4       # pairs with fewer expected samples are left out of the test
+CHI_SATURATED_P = 0.99     # tiles whose pairs of values are this equalised count as fully embedded
+MIN_TILE_GROUPS = 1024     # edge slivers smaller than this are too noisy to drive the verdict
+
+# -------------------------
+# Chi-square attack (Westfeld & Pfitzmann)
+# -------------------------
+def _chi_square_pvalue(hist: np.ndarray) -> float:
+    """
+    Probability that the pairs-of-values histogram was equalised by LSB embedding.
+    Uses the Wilson-Hilferty normal approximation of the chi-square CDF.
+    """
+    even = hist[0::2].astype(np.float64)
+    odd = hist[1::2].astype(np.float64)
+    expected = (even + odd) / 2
+    sel = expected > CHI_MIN_EXPECTED
+    dof = int(sel.sum()) - 1
+    if dof < 1:
+        return 0.0
+    chi2 = float((((even[sel] - expected[sel]) ** 2) / expected[sel]).sum())
+    k = 2.0 / (9.0 * dof)
+    z = ((chi2 / dof) ** (1.0 / 3.0) - (1.0 - k)) / math.sqrt(k)
+    return 0.5 * math.erfc(z / math.sqrt(2.0))
+
+# -------------------------
+# RS analysis (Fridrich, Goljan & Du)
+# -------------------------
+def _groups(tile: np.ndarray) -> np.ndarray:
+    """Split a tile into groups of 4 horizontally adjacent samples per channel."""
+    w4 = tile.shape[1] - (tile.shape[1] % len(RS_MASK))
+    if w4 == 0:
+        return np.empty((0, len(RS_MASK)), dtype=np.int16)
+    planes = tile[:, :w4, :].astype(np.int16).transpose(2, 0, 1)
+    return planes.reshape(-1, len(RS_MASK))
+
+def _smoothness(groups: np.ndarray) -> np.ndarray:
+    return np.abs(np.diff(groups, axis=1)).sum(axis=1)
+
+def _regular_singular(groups: np.ndarray) -> list:
+    """Counts of [R_M, S_M, R_-M, S_-M] for one set of groups."""
+    base = _smoothness(groups)
+    pos = groups.copy()
+    pos[:, RS_MASK] ^= 1
+    neg = groups.copy()
+    neg[:, RS_MASK] = ((neg[:, RS_MASK] + 1) ^ 1) - 1
+    f_pos = _smoothness(pos)
+    f_neg = _smoothness(neg)
+    return [int((f_pos > base).sum()), int((f_pos < base).sum()),
+            int((f_neg > base).sum()), int((f_neg < base).sum())]
+
+def rs_counts(tile: np.ndarray) -> np.ndarray:
+    """RS counts for a tile and its LSB-flipped twin, followed by the group count."""
+    groups = _groups(tile)
+    counts = _regular_singular(groups) + _regular_singular(groups ^ 1)
+    return np.array(counts + [len(groups)], dtype=np.int64)
+
+def rs_rate(counts: np.ndarray) -> float:
+    """Estimated embedding rate (fraction of LSB capacity used) from summed RS counts."""
+    n = counts[8]
+    if n == 0:
+        return 0.0
+    rm, sm, rnm, snm, rm1, sm1, rnm1, snm1 = counts[:8] / n
+    d0, d1 = rm - sm, rm1 - sm1
+    dn0, dn1 = rnm - snm, rnm1 - snm1
+    a = 2 * (d1 + d0)
+    b = dn0 - dn1 - d1 - 3 * d0
+    c = d0 - dn0
+    if abs(a) < 1e-12:
+        x = -c / b if abs(b) > 1e-12 else 0.0
+    else:
+        disc = math.sqrt(max(0.0, b * b - 4 * a * c))
+        x = min((-b + disc) / (2 * a), (-b - disc) / (2 * a), key=abs)
+    if abs(x - 0.5) < 1e-12:
+        return 1.0
+    return float(min(1.0, max(0.0, x / (x - 0.5))))
+
+# -------------------------
+# Per-band scoring
+# -------------------------
+def lsb_uniform(tile: np.ndarray) -> bool:
+    """True when every channel's LSB plane is constant: no embedded payload can be present."""
+    lsb = (tile.reshape(-1, tile.shape[-1]) & 1).astype(bool)
+    return bool(np.all(lsb.all(axis=0) | ~lsb.any(axis=0)))
+
+def score_band(band: np.ndarray, tile_size: int = TILE_SIZE, skip_clean: bool = False) -> dict:
+    """
+    Chi-square + RS on every tile of one row band. Returns per-tile rates, p-values,
+    group counts and skip flags, plus the band's summed histogram and RS counts.
+    With `skip_clean`, tiles whose LSB planes are constant are not analysed (rate 0).
+    """
+    hist = np.zeros(256, dtype=np.int64)
+    counts = np.zeros(9, dtype=np.int64)
+    rates, chis, groups, skipped = [], [], [], []
+    for x0 in range(0, band.shape[1], tile_size):
+        tile = band[:, x0:x0 + tile_size]
+        tile_hist = np.bincount(tile.reshape(-1), minlength=256)
+        hist += tile_hist
+        if skip_clean and lsb_uniform(tile):
+            rates.append(0.0)
+            chis.append(0.0)
+            groups.append(0)
+            skipped.append(True)
+            continue
+        tile_counts = rs_counts(tile)
+        counts += tile_counts
+        # RS is unstable close to full embedding; chi-square is sharpest there
+        chi_p = _chi_square_pvalue(tile_hist)
+        rate = rs_rate(tile_counts)
+        if chi_p >= CHI_SATURATED_P:
+            rate = max(rate, chi_p)
+        rates.append(rate)
+        chis.append(chi_p)
+        groups.append(int(tile_counts[8]))
+        skipped.append(False)
+    return {"rates": rates, "chi_square_p": chis, "groups": groups, "skipped": skipped,
+            "hist": hist, "counts": counts}
+
+# -------------------------
+# Whole-image report
+# -------------------------
+def analyze_image(source, tile_size: int = TILE_SIZE) -> dict:
+    """
+    Stream the image (bytes, path, file or mmap) in row bands and run chi-square
+    + RS on every tile; PNG and raw layouts are decoded one band at a time.
+    Returns the global embedding-rate estimate, the global chi-square p-value,
+    the highest tile rate and per-tile maps of both (row-major, `tile_size`
+    pixels per tile).
+    """
+    img = open_image(source)
+    hist = np.zeros(256, dtype=np.int64)
+    counts = np.zeros(9, dtype=np.int64)
+    rate_map, chi_map = [], []
+    max_tile_rate = 0.0
+
+    for _, band in iter_bands(img, tile_size):
+        scores = score_band(band, tile_size)
+        hist += scores["hist"]
+        counts += scores["counts"]
+        for rate, n in zip(scores["rates"], scores["groups"]):
+            if n >= MIN_TILE_GROUPS:
+                max_tile_rate = max(max_tile_rate, rate)
+        rate_map.append([round(r, 4) for r in scores["rates"]])
+        chi_map.append([round(p, 4) for p in scores["chi_square_p"]])
+
+    return {
+        "embedding_rate": rs_rate(counts),
+        "chi_square_p": _chi_square_pvalue(hist),
+        "max_tile_rate": max_tile_rate,
+        "tile_size": tile_size,
+        "tile_map": rate_map,
+        "chi_square_map": chi_map,
+    }
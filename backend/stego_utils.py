@@ -1,117 +1,242 @@
 import io
+import os
 from typing import Tuple, Optional
+import numpy as np
 from PIL import Image
+from bitplane import bytes_to_bits, bits_to_bytes, embed_bits, extract_bits
+from image_bands import open_image
+from metrics import stage
+from payload import (HEADER_BITS, HEADER_SIZE, PAYLOAD_COMPRESSION, PAYLOAD_PARITY, lsb_capacity, pack,
+                     parse_header, unpack)
+from steganalysis import analyze_image
+
+STEGO_RATE_THRESHOLD = 0.08  # estimated fraction of LSB capacity above which we flag an image
+LEGACY_HEADER_BITS = 32      # bare 4-byte big-endian length, written before the payload container
+# Decoders that emit rows top-down from a single tile, so they can stop early
+ROW_STREAMING_CODECS = ("zip", "raw")
+# Detector weights written by train_stego_detector.py / train_resnet18.py
+_HERE = os.path.dirname(os.path.abspath(__file__))
+MODEL_WEIGHT_PATHS = (
+    os.path.join(_HERE, "models", "best_stego_resnet18.pth"),
+    os.path.join(_HERE, "resnet18_stego.pth"),
+)
+# Serving artifacts detector_export.py writes next to each .pth, fastest first on CPU;
+# STEGO_DETECTOR_BACKEND pins one kind (e.g. "fp32" to compare against the others)
+ARTIFACT_SUFFIXES = (("torch_int8", ".int8.pt"), ("onnx_int8", ".int8.onnx"), ("onnx", ".onnx"), ("fp32", ".pth"))
+DETECTOR_BACKEND = os.environ.get("STEGO_DETECTOR_BACKEND", "auto")
+# zlib level for encoded PNGs (0-9): Pillow's default 6; 1 encodes large images ~3-4x faster, 9 ~10x slower
+PNG_COMPRESS_LEVEL = int(os.environ.get("STEGO_PNG_COMPRESS_LEVEL", "6"))
 
 # -------------------------
 # Helper functions
 # -------------------------
-def _to_bits(data: bytes) -> str:
-    return ''.join(f'{b:08b}' for b in data)
-
-def _from_bits(bitstr: str) -> bytes:
-    chopped = bitstr[:len(bitstr) - (len(bitstr) % 8)]
-    return bytes(int(chopped[i:i+8], 2) for i in range(0, len(chopped), 8))
-
 def _capacity_bits(image: Image.Image) -> int:
     w, h = image.size
     return w * h * 3  # 3 bits per pixel (RGB)
 
-def _set_lsb_bits(image: Image.Image, bits: str) -> Image.Image:
-    img = image.convert("RGB").copy()
-    pixels = img.load()
-    idx = 0
-    w, h = img.size
-    for y in range(h):
-        for x in range(w):
-            if idx >= len(bits):
-                break
-            r, g, b = pixels[x, y]
-            r = (r & ~1) | int(bits[idx]) if idx < len(bits) else r; idx += 1
-            g = (g & ~1) | int(bits[idx]) if idx < len(bits) else g; idx += 1
-            b = (b & ~1) | int(bits[idx]) if idx < len(bits) else b; idx += 1
-            pixels[x, y] = (r, g, b)
-        if idx >= len(bits):
-            break
-    if idx < len(bits):
+def _set_lsb_bits(image: Image.Image, bits: np.ndarray) -> Image.Image:
+    # Row-major RGB order of the flat view matches the old per-pixel R, G, B walk
+    arr = np.array(image.convert("RGB"), dtype=np.uint8)
+    flat = arr.reshape(-1)
+    if len(bits) > flat.size:
         raise ValueError("Image too small for this message")
-    return img
+    embed_bits(flat, bits)
+    out = Image.fromarray(arr)
+    out.info = dict(image.info)  # keeps icc_profile, which save_png writes back
+    return out
+
+def _rows_for_bits(width: int, nbits: int) -> int:
+    pixels = -(-nbits // 3)
+    return -(-pixels // width)
+
+def _can_stream_rows(img: Image.Image) -> bool:
+    if len(img.tile) != 1 or img.info.get("interlace"):
+        return False
+    codec, args = img.tile[0][0], img.tile[0][3]
+    if codec not in ROW_STREAMING_CODECS:
+        return False
+    if codec == "raw":
+        # raw tiles carry (rawmode, stride, orientation); BMP is stored bottom-up (-1)
+        return isinstance(args, tuple) and len(args) >= 3 and args[2] == 1
+    return True
 
-def _read_lsb_bits(image: Image.Image, nbits: int) -> str:
-    img = image.convert("RGB")
-    pixels = img.load()
-    bits = []
-    read = 0
+def _load_rows(source, rows: int) -> Image.Image:
+    """
+    Decode only the first `rows` rows of the image as RGB.
+    PNG and top-down raw files stop decoding once those rows are filled; other
+    formats are fully decoded by Pillow but only the cropped rows are converted.
+    JPEG draft() is not used: DCT-scaled decoding changes the pixel values.
+    """
+    img = open_image(source)
     w, h = img.size
-    for y in range(h):
-        for x in range(w):
-            if read >= nbits:
-                break
-            r, g, b = pixels[x, y]
-            if read < nbits: bits.append(str(r & 1)); read += 1
-            if read < nbits: bits.append(str(g & 1)); read += 1
-            if read < nbits: bits.append(str(b & 1)); read += 1
-        if read >= nbits:
-            break
-    return ''.join(bits)
+    rows = min(rows, h)
+    if rows < h and _can_stream_rows(img):
+        tile = img.tile[0]
+        img.tile = [(tile[0], (0, 0, w, rows)) + tuple(tile[2:])]
+        img._size = (w, rows)  # Pillow sizes the decode buffer from this
+    elif rows < h:
+        img = img.crop((0, 0, w, rows))
+    return img.convert("RGB")
+
+def _read_lsb_bits(image: Image.Image, nbits: int) -> np.ndarray:
+    arr = np.asarray(image.convert("RGB"))
+    return extract_bits(arr.reshape(-1), nbits)
 
 # -------------------------
 # Main functions
 # -------------------------
-def encode_message(image_bytes: bytes, message: str) -> bytes:
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    msg_bytes = message.encode("utf-8")
-    header = len(msg_bytes).to_bytes(4, 'big')  # 4 bytes header for length
-    payload = header + msg_bytes
-    bits = _to_bits(payload)
-    if len(bits) > _capacity_bits(img):
+def embed_message(source, message: str, compression: str = PAYLOAD_COMPRESSION,
+                  parity: int = PAYLOAD_PARITY) -> Image.Image:
+    """Stego image with `message` packed in a payload container in the LSBs, ready for save_png."""
+    with stage("image.decode"):
+        img = open_image(source)
+        img.load()
+    with stage("image.convert"):
+        img = img.convert("RGB")
+    payload = pack(message.encode("utf-8"), compression, parity)
+    if len(payload) * 8 > _capacity_bits(img):
         raise ValueError("Message too large for this image.")
-    out_img = _set_lsb_bits(img, bits)
+    with stage("image.embed"):
+        return _set_lsb_bits(img, bytes_to_bits(payload))
+
+def save_png(image: Image.Image, fp, compress_level: int = PNG_COMPRESS_LEVEL) -> None:
+    """
+    Write `image` as PNG to a file object. Pillow hands the compressed stream to
+    fp.write block by block, so a streaming writer sees output as it is produced.
+    """
+    if not 0 <= compress_level <= 9:
+        raise ValueError("compress_level must be between 0 and 9")
+    with stage("image.serialize"):
+        image.save(fp, format="PNG", compress_level=compress_level, icc_profile=image.info.get("icc_profile"))
+
+def image_capacity(source, parity: int = PAYLOAD_PARITY) -> dict:
+    """
+    Header only (Image.open does not decode pixels): size, mode and the largest
+    message embed_message accepts. Any mode is converted to 8-bit RGB first.
+    """
+    img = open_image(source)
+    w, h = img.size
+    return {"format": img.format, "width": w, "height": h, "mode": img.mode,
+            "capacity": [lsb_capacity(_capacity_bits(img), parity)]}
+
+def encode_message(source, message: str, compress_level: int = PNG_COMPRESS_LEVEL,
+                   compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY) -> bytes:
     buf = io.BytesIO()
-    out_img.save(buf, format="PNG")
+    save_png(embed_message(source, message, compression, parity), buf, compress_level)
     return buf.getvalue()
 
-def decode_message(image_bytes: bytes) -> str:
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    header_bits = _read_lsb_bits(img, 32)  # first 32 bits = length
-    if len(header_bits) < 32:
+def encode_message_file(source, out_path: str, message: str, compress_level: int = PNG_COMPRESS_LEVEL,
+                        compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY) -> None:
+    """encode_message straight to a PNG file; what the worker pool runs for /encode and jobs."""
+    with open(out_path, "wb") as fp:
+        save_png(embed_message(source, message, compression, parity), fp, compress_level)
+
+def _read_bits(source, width: int, nbits: int) -> np.ndarray:
+    """LSBs of the first `nbits` channel values, decoding only the rows that hold them."""
+    with stage("image.decode"):
+        img = _load_rows(source, _rows_for_bits(width, nbits))
+    with stage("image.extract"):
+        return _read_lsb_bits(img, nbits)
+
+def _decode_legacy(source, width: int, capacity: int) -> str:
+    """Images written before the payload container: 4-byte length, then raw UTF-8."""
+    header_bits = _read_bits(source, width, LEGACY_HEADER_BITS)
+    if len(header_bits) < LEGACY_HEADER_BITS:
         return "[No hidden message]"
-    length = int(header_bits, 2)
-    max_capacity_bytes = _capacity_bits(img) // 8
-    if length == 0 or length > max_capacity_bytes:
+    length = int.from_bytes(bits_to_bytes(header_bits), 'big')
+    if length == 0 or length > capacity // 8:
         return "[No hidden message]"
-    total_bits = 32 + length * 8
-    all_bits = _read_lsb_bits(img, total_bits)
-    payload_bits = all_bits[32:]
-    msg_bytes = _from_bits(payload_bits)
-    try:
-        return msg_bytes[:length].decode("utf-8", errors="replace")
-    except Exception:
-        return "[Corrupted message]"
-
-def detect_stego(image_bytes: bytes) -> Tuple[str, Optional[float], str]:
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    pixels = img.load()
-    ones = 0
-    total = 0
-    w, h = img.size
-    for y in range(h):
-        for x in range(w):
-            r, g, b = pixels[x, y]
-            ones += (r & 1) + (g & 1) + (b & 1)
-            total += 3
-    ratio = ones / max(1, total)
-    if 0.47 <= ratio <= 0.53:
-        return ("Possibly Stego", 0.5, "heuristic")
-    else:
-        return ("Likely Clean", 1.0 - abs(0.5 - ratio), "heuristic")
+    payload_bits = _read_bits(source, width, LEGACY_HEADER_BITS + length * 8)[LEGACY_HEADER_BITS:]
+    return bits_to_bytes(payload_bits)[:length].decode("utf-8", errors="replace")
+
+def decode_message(source) -> str:
+    # Image.open only parses the header; pixels are decoded per read below, and only
+    # as many rows as the payload header says the message occupies
+    img = open_image(source)
+    w, _ = img.size
+    capacity = _capacity_bits(img)
+    header = parse_header(bits_to_bytes(_read_bits(source, w, HEADER_BITS)))
+    if header is None:
+        return _decode_legacy(source, w, capacity)
+    if header.total_bits > capacity:
+        raise ValueError("Corrupted payload header: length exceeds the image capacity")
+    payload = bits_to_bytes(_read_bits(source, w, header.total_bits))
+    return unpack(header, payload[HEADER_SIZE:]).decode("utf-8", errors="replace")
+
+def detector_input(source, crop_size: Optional[int] = None, input_mode: str = "native"):
+    """
+    Model batch for one image. "native": grid crops at native resolution, the same
+    transform the trainers use (detector_model), so no resampling touches the LSBs.
+    "resize": the single 224x224 view that pre-crop weights were trained on.
+    torch is imported lazily so the LSB/heuristic paths never pay for it.
+    """
+    from detector_model import CROP_SIZE, inference_batch, to_input, to_uint8_tensor
+    img = open_image(source)
+    if input_mode == "resize":
+        img = img.convert("RGB").resize((224, 224), Image.BILINEAR)
+        return to_input(to_uint8_tensor(img)[None])
+    return inference_batch(img, crop_size or CROP_SIZE)
+
+def detector_artifacts(backend: str = DETECTOR_BACKEND) -> list:
+    """Candidate detector files in load order (existing or not)."""
+    paths = []
+    for weights in MODEL_WEIGHT_PATHS:
+        base = os.path.splitext(weights)[0]
+        paths += [base + suffix for kind, suffix in ARTIFACT_SUFFIXES if backend in ("auto", kind)]
+    return paths
+
+def artifact_kind(path: str) -> str:
+    for kind, suffix in ARTIFACT_SUFFIXES:
+        if path.endswith(suffix):
+            return kind
+    raise ValueError(f"Unknown detector artifact: {path}")
+
+def load_detector_backend(backend: str = DETECTOR_BACKEND):
+    """
+    Whichever detector artifact exists (ONNX Runtime, int8 or fp32 torch) as a
+    model_server.Detector, or None when there is nothing to load.
+    """
+    if not any(os.path.exists(p) for p in detector_artifacts(backend)):
+        return None
+    from model_server import load_detector
+    return load_detector(detector_artifacts(backend))
+
+def model_verdict(stego_prob: float, report: dict) -> Tuple[str, float, str, dict]:
+    """Label from the detector's stego probability; the heuristic report rides along."""
+    if stego_prob >= 0.5:
+        return ("Possibly Stego", stego_prob, "resnet18", report)
+    return ("Likely Clean", 1.0 - stego_prob, "resnet18", report)
+
+def detect_stego_report(source, detector=None) -> Tuple[str, float, str, dict]:
+    """
+    Verdict together with the full chi-square/RS per-tile report for an image given
+    as bytes, a path, a file or an mmap. With a loaded
+    detector (model_server.Detector) the label comes from the model, otherwise
+    from the chi-square + RS heuristic.
+    """
+    with stage("image.analyze"):
+        report = analyze_image(source)
+    if detector is not None:
+        with stage("detector.model"):
+            prob = detector.predict_image(source)
+        return model_verdict(prob, report)
+    suspicion = max(report["embedding_rate"], report["max_tile_rate"])
+    if suspicion >= STEGO_RATE_THRESHOLD:
+        return ("Possibly Stego", min(1.0, 0.5 + suspicion / 2), "chi2-rs", report)
+    return ("Likely Clean", 1.0 - suspicion / (2 * STEGO_RATE_THRESHOLD), "chi2-rs", report)
+
+def detect_stego(source, detector=None) -> Tuple[str, Optional[float], str]:
+    label, prob, mode, _ = detect_stego_report(source, detector)
+    return (label, prob, mode)
 
 # -------------------------
 # Wrappers for main.py
 # -------------------------
-def encode_message_image(image_bytes: bytes, message: str) -> bytes:
-    return encode_message(image_bytes, message)
+def encode_message_image(source, message: str, compress_level: int = PNG_COMPRESS_LEVEL,
+                         compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY) -> bytes:
+    return encode_message(source, message, compress_level, compression, parity)
 
-def decode_message_image(image_bytes: bytes) -> str:
-    return decode_message(image_bytes)
+def decode_message_image(source) -> str:
+    return decode_message(source)
 
 
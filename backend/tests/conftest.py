@@ -0,0 +1,6 @@
+# conftest.py
+# Engine modules are flat in backend/; make them importable however pytest is invoked.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,108 @@
+# test_audio_stego.py
+# Audio LSB engine: encode_message_audio -> WAV -> decode_message_audio must return
+# the message for every PCM width and channel layout, leave the audio otherwise
+# untouched, and still read files from before the payload container.
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from audio_stego_utils import decode_message_audio, encode_audio_stream, encode_message_audio
+
+FRAMES = 20_000
+
+def make_wav(channels=2, sampwidth=2, frames=FRAMES) -> bytes:
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(44100)
+        wav.writeframes(rng.integers(0, 256, size=frames * channels * sampwidth, dtype=np.uint8).tobytes())
+    return buf.getvalue()
+
+def read_frames(data: bytes) -> tuple:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.getparams(), wav.readframes(wav.getnframes())
+
+def with_lsbs(source: bytes, payload: bytes) -> bytes:
+    params, raw = read_frames(source)
+    samples = np.frombuffer(raw, dtype=np.uint8).copy()
+    lsb = samples[::params.sampwidth]
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    lsb[:len(bits)] = (lsb[:len(bits)] & 0xfe) | bits
+    samples[::params.sampwidth] = lsb
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setparams(params)
+        wav.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("sampwidth", [1, 2, 3, 4])
+def test_roundtrip_pcm_layouts(channels, sampwidth):
+    source = make_wav(channels, sampwidth)
+    text = "hidden in the noise ✓ " * 20
+    encoded = encode_message_audio(source, text, compression="none")
+    assert decode_message_audio(encoded) == text
+    (params, raw), (params_in, raw_in) = read_frames(encoded), read_frames(source)
+    assert params == params_in
+    diff = np.frombuffer(raw, dtype=np.uint8) ^ np.frombuffer(raw_in, dtype=np.uint8)
+    assert not (diff & 0xfe).any()                              # only LSBs change
+    assert not diff.reshape(-1, sampwidth)[:, 1:].any()         # and only in the low byte
+
+@pytest.mark.parametrize("parity", [0, 8])
+@pytest.mark.parametrize("compression", ["auto", "none", "zlib", "lzma"])
+def test_roundtrip_payload_options(compression, parity):
+    text = "lorem ipsum " * 100
+    assert decode_message_audio(encode_message_audio(make_wav(), text, compression, parity)) == text
+
+@pytest.mark.parametrize("chunk_frames", [1, 7, 1000, FRAMES * 2])
+def test_stream_matches_in_memory(tmp_path, chunk_frames):
+    # payload bits straddle chunk boundaries; frames past the payload pass through
+    source = make_wav(channels=2, sampwidth=3)
+    text = "streamed " * 300
+    src, dst = tmp_path / "in.wav", tmp_path / "out.wav"
+    src.write_bytes(source)
+    encode_audio_stream(str(src), str(dst), text, "none", 0, chunk_frames=chunk_frames)
+    assert dst.read_bytes() == encode_message_audio(source, text, "none", 0)
+    assert decode_message_audio(str(dst)) == text
+
+def test_path_source(tmp_path):
+    path = tmp_path / "in.wav"
+    path.write_bytes(encode_message_audio(make_wav(), "from a path", compression="none"))
+    assert decode_message_audio(str(path)) == "from a path"
+
+def test_message_too_long():
+    with pytest.raises(ValueError, match="too long"):
+        encode_message_audio(make_wav(channels=1, frames=100), "a" * 100, compression="none")
+
+def test_not_a_wav():
+    with pytest.raises(ValueError, match="Invalid WAV"):
+        encode_message_audio(b"RIFF....not audio", "x")
+
+def test_parity_repairs_flipped_lsbs():
+    text = "survives a few flipped bits"
+    encoded = encode_message_audio(make_wav(sampwidth=1), text, compression="none", parity=16)
+    params, raw = read_frames(encoded)
+    samples = bytearray(raw)
+    for i in range(200, 210):  # body bits, past the 16-byte header
+        samples[i] ^= 1
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setparams(params)
+        wav.writeframes(bytes(samples))
+    assert decode_message_audio(buf.getvalue()) == text
+
+def test_clean_audio_has_no_message():
+    assert decode_message_audio(make_wav()) == "[No hidden message]"
+
+def test_legacy_length_prefix():
+    raw = "legacy ✓".encode("utf-8")
+    assert decode_message_audio(with_lsbs(make_wav(), len(raw).to_bytes(4, "big") + raw)) == "legacy ✓"
+
+def test_headerless_with_msg_length():
+    # files from before any header: the caller supplies the length in characters
+    legacy = with_lsbs(make_wav(), b"\x00\x00\x00\x00old")  # zero length: no legacy prefix either
+    assert decode_message_audio(legacy, msg_length=7)[4:] == "old"
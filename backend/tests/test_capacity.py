@@ -0,0 +1,75 @@
+# test_capacity.py
+# /capacity figures come from the carrier header alone; each must be exactly the
+# longest message the matching encoder accepts, with and without parity.
+import io
+import wave
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import vid
+import workers
+from audio_stego_utils import audio_capacity, encode_message_audio
+from stego_utils import encode_message, image_capacity
+
+PARITIES = [0, 16]
+
+@pytest.fixture(scope="module", autouse=True)
+def shared_pool():
+    yield
+    workers.shutdown_pool()
+
+def make_png(size=(40, 30), mode="RGB") -> bytes:
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)).convert(mode).save(buf, "PNG")
+    return buf.getvalue()
+
+def make_wav(frames=4000, channels=2, sampwidth=2) -> bytes:
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(8000)
+        wav.writeframes(rng.integers(0, 256, size=frames * channels * sampwidth, dtype=np.uint8).tobytes())
+    return buf.getvalue()
+
+def make_clip(path: str, size=(64, 48), frames=6) -> str:
+    rng = np.random.default_rng(0)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"FFV1"), 10, size)
+    for _ in range(frames):
+        out.write(rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8))
+    out.release()
+    return path
+
+@pytest.mark.parametrize("parity", PARITIES)
+@pytest.mark.parametrize("mode", ["RGB", "L", "RGBA"])
+def test_image_capacity_matches_encoder(parity, mode):
+    source = make_png(mode=mode)
+    limit = image_capacity(source, parity)["capacity"][0]["max_message_bytes"]
+    encode_message(source, "a" * limit, compression="none", parity=parity)
+    with pytest.raises(ValueError):
+        encode_message(source, "a" * (limit + 1), compression="none", parity=parity)
+
+@pytest.mark.parametrize("parity", PARITIES)
+@pytest.mark.parametrize("channels,sampwidth", [(1, 1), (2, 2), (2, 3)])
+def test_audio_capacity_matches_encoder(parity, channels, sampwidth):
+    source = make_wav(channels=channels, sampwidth=sampwidth)
+    info = audio_capacity(source, parity)
+    assert info["bit_depth"] == sampwidth * 8
+    limit = info["capacity"][0]["max_message_bytes"]
+    encode_message_audio(source, "a" * limit, compression="none", parity=parity)
+    with pytest.raises(ValueError):
+        encode_message_audio(source, "a" * (limit + 1), compression="none", parity=parity)
+
+@pytest.mark.parametrize("parity", PARITIES)
+def test_video_capacity_matches_encoder(tmp_path, parity):
+    source = make_clip(str(tmp_path / "source.mkv"))
+    limit = vid.video_capacity(source, parity=parity)["capacity"][0]["max_message_bytes"]
+    encoded = str(tmp_path / "encoded.mkv")
+    vid.encode_video(source, "a" * limit, encoded, "ffv1", compression="none", parity=parity)
+    with pytest.raises(ValueError):
+        vid.encode_video(source, "a" * (limit + 1), encoded, "ffv1", compression="none", parity=parity)
@@ -0,0 +1,91 @@
+# test_image_stego.py
+# Image LSB engine: encode_message -> PNG -> decode_message must return the message
+# for every source format and payload option, keep the source ICC profile, and
+# still read images written before the payload container existed.
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageCms
+
+from bitplane import bytes_to_bits
+from stego_utils import _set_lsb_bits, decode_message, encode_message, encode_message_file
+
+SIZE = (96, 64)
+
+def make_image(fmt="PNG", mode="RGB", **save) -> bytes:
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, size=(SIZE[1], SIZE[0], 3), dtype=np.uint8)).convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, fmt, **save)
+    return buf.getvalue()
+
+def message(n: int) -> str:
+    rng = np.random.default_rng(n)
+    return "".join(chr(c) for c in rng.integers(0x21, 0x7e, n)) + " ünïcode"
+
+@pytest.mark.parametrize("fmt,mode", [("PNG", "RGB"), ("PNG", "RGBA"), ("PNG", "L"), ("PNG", "P"),
+                                      ("JPEG", "RGB"), ("BMP", "RGB"), ("TIFF", "RGB")])
+def test_roundtrip_formats(fmt, mode):
+    text = message(300)
+    encoded = encode_message(make_image(fmt, mode), text, compression="none")
+    assert Image.open(io.BytesIO(encoded)).format == "PNG"
+    assert decode_message(encoded) == text
+
+@pytest.mark.parametrize("parity", [0, 8])
+@pytest.mark.parametrize("compression", ["auto", "none", "zlib", "lzma"])
+def test_roundtrip_payload_options(compression, parity):
+    text = "lorem ipsum " * 40
+    assert decode_message(encode_message(make_image(), text, compression=compression, parity=parity)) == text
+
+def test_roundtrip_interlaced_png():
+    # Adam7 PNGs cannot be cut short; the decoder falls back to a full decode
+    text = message(50)
+    interlaced = encode_message(make_image(), text, compression="none")
+    img = Image.open(io.BytesIO(interlaced))
+    buf = io.BytesIO()
+    img.save(buf, "PNG", interlace=1)
+    assert decode_message(buf.getvalue()) == text
+
+def test_encode_message_file(tmp_path):
+    out = str(tmp_path / "out.png")
+    encode_message_file(make_image(), out, "to disk", compression="none")
+    assert decode_message(out) == "to disk"
+
+def test_parity_repairs_flipped_lsbs():
+    text = "survives a few flipped bits"
+    arr = np.array(Image.open(io.BytesIO(encode_message(make_image(), text, compression="none", parity=16))))
+    arr.reshape(-1)[200:210] ^= 1  # body bytes, past the 16-byte header
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "PNG")
+    assert decode_message(buf.getvalue()) == text
+
+def test_corruption_without_parity_raises():
+    arr = np.array(Image.open(io.BytesIO(encode_message(make_image(), "fragile", compression="none", parity=0))))
+    arr.reshape(-1)[140] ^= 1
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "PNG")
+    with pytest.raises(ValueError, match="CRC"):
+        decode_message(buf.getvalue())
+
+def test_message_too_large():
+    with pytest.raises(ValueError, match="too large"):
+        encode_message(make_image(), "a" * (SIZE[0] * SIZE[1]), compression="none")
+
+def test_clean_image_has_no_message():
+    assert decode_message(make_image()) == "[No hidden message]"
+
+def test_legacy_length_prefix():
+    # images written before the payload container: 4-byte big-endian length, then UTF-8
+    raw = "legacy ✓".encode("utf-8")
+    img = _set_lsb_bits(Image.open(io.BytesIO(make_image())), bytes_to_bits(len(raw).to_bytes(4, "big") + raw))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    assert decode_message(buf.getvalue()) == "legacy ✓"
+
+def test_icc_profile_kept():
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    encoded = encode_message(make_image("JPEG", icc_profile=icc), "colour managed", compression="none")
+    img = Image.open(io.BytesIO(encoded))
+    assert img.info.get("icc_profile") == icc
+    assert decode_message(encoded) == "colour managed"
@@ -0,0 +1,194 @@
+# test_jobs.py
+# JobQueue: jobs run by priority and record results, failures and progress; cancel
+# works for queued, running and finished jobs, also across two queues sharing one
+# database; a job is claimed once, and a dead owner's jobs are requeued.
+import asyncio
+import os
+import pickle
+import time
+
+import pytest
+
+import jobs
+from jobs import JobCancelled, JobQueue
+
+@pytest.fixture(autouse=True)
+def fast_progress(monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 0.0)
+
+def make_queue(tmp_path, handlers, **kwargs) -> JobQueue:
+    return JobQueue(handlers, db_path=str(tmp_path / "jobs.db"), jobs_dir=str(tmp_path / "jobs"), **kwargs)
+
+def submit(queue: JobQueue, kind: str = "echo", priority: int = 0, **params) -> str:
+    job_id, path = queue.new_job_dir()
+    input_path = os.path.join(path, "input.bin")
+    with open(input_path, "wb") as f:
+        f.write(b"data")
+    queue.submit(job_id, kind, input_path, params, priority)
+    return job_id
+
+async def wait_for_status(queue: JobQueue, job_id: str, *statuses: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        row = queue.get(job_id)
+        if row is not None and row["status"] in statuses:
+            return row
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {statuses}: {queue.get(job_id)}")
+
+async def echo(job):
+    job.progress(1, 2)
+    out = job.output_path(".txt")
+    with open(out, "w") as f:
+        f.write(job.params.get("text", ""))
+    job.set_output(out, "text/plain", "echo.txt")
+    job.progress(2, 2)
+    return {"text": job.params.get("text", "")}
+
+async def fail(job):
+    raise ValueError("bad input")
+
+def test_job_runs_to_completion(tmp_path):
+    async def main():
+        queue = make_queue(tmp_path, {"echo": echo})
+        job_id = submit(queue, text="hello")
+        assert queue.describe(job_id)["status"] == "queued"
+        queue.start()
+        row = await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+        return queue, job_id, row
+    queue, job_id, row = asyncio.run(main())
+    info = queue.describe(job_id)
+    assert info["result"] == {"text": "hello"}
+    assert info["progress"] == {"done": 2, "total": 2, "fraction": 1.0}
+    assert info["expires"] == row["finished"] + queue.ttl
+    with open(row["output_path"]) as f:
+        assert f.read() == "hello"
+    assert not os.path.exists(row["input_path"])  # inputs go once the job is done
+
+def test_failure_recorded(tmp_path):
+    async def main():
+        queue = make_queue(tmp_path, {"fail": fail})
+        job_id = submit(queue, "fail")
+        queue.start()
+        await wait_for_status(queue, job_id, "failed")
+        await queue.stop()
+        return queue.describe(job_id)
+    info = asyncio.run(main())
+    assert info["error"] == "bad input" and "result" not in info
+
+def test_unknown_kind(tmp_path):
+    queue = make_queue(tmp_path, {"echo": echo})
+    with pytest.raises(ValueError, match="Unknown job kind"):
+        submit(queue, "transcode")
+
+def test_priority_order(tmp_path):
+    order = []
+
+    async def record(job):
+        order.append(job.params["name"])
+        return {}
+
+    async def main():
+        queue = make_queue(tmp_path, {"record": record}, workers=1)
+        ids = [submit(queue, "record", 0, name="low"), submit(queue, "record", 5, name="high"),
+               submit(queue, "record", 0, name="low-later")]
+        queue.start()
+        for job_id in ids:
+            await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+    asyncio.run(main())
+    assert order == ["high", "low", "low-later"]
+
+def test_cancel_queued_and_delete_finished(tmp_path):
+    queue = make_queue(tmp_path, {"echo": echo})
+    job_id = submit(queue)
+    assert queue.cancel(job_id)["status"] == "cancelled"
+    assert queue._claim() is None  # never runs
+    assert queue.cancel(job_id) == {"id": job_id, "status": "deleted"}
+    assert queue.get(job_id) is None
+    assert not os.path.exists(os.path.join(queue.jobs_dir, job_id))
+    assert queue.cancel(job_id) is None
+
+def test_cancel_running_from_another_queue(tmp_path):
+    # two server processes sharing one database: the cancel lands in whichever runs the job
+    reached = []
+
+    async def slow(job):
+        for i in range(1000):
+            job.progress(i, 1000)
+            reached.append(i)
+            await asyncio.sleep(0.01)
+        return {}
+
+    async def main():
+        runner = make_queue(tmp_path, {"slow": slow})
+        other = make_queue(tmp_path, {"slow": slow})
+        job_id = submit(other, "slow")
+        runner.start()
+        await wait_for_status(runner, job_id, "running")
+        await asyncio.sleep(0.1)
+        assert other.cancel(job_id)["status"] == "cancelled"
+        stopped_at = len(reached)
+        await asyncio.sleep(0.2)
+        await runner.stop()
+        return runner.get(job_id), stopped_at
+    row, stopped_at = asyncio.run(main())
+    assert row["status"] == "cancelled" and row["result"] is None
+    assert len(reached) <= stopped_at + 1
+
+def test_progress_writer_picklable(tmp_path):
+    queue = make_queue(tmp_path, {"echo": echo})
+    job_id = submit(queue)
+    assert queue._claim()["id"] == job_id
+    writer = pickle.loads(pickle.dumps(jobs.ProgressWriter(queue.db_path, job_id, queue.owner)))
+    writer(3, 10)
+    assert (queue.get(job_id)["progress_done"], queue.get(job_id)["progress_total"]) == (3, 10)
+    queue.cancel(job_id)
+    with pytest.raises(JobCancelled):
+        writer(4, 10)
+
+def test_claimed_once(tmp_path):
+    first = make_queue(tmp_path, {"echo": echo})
+    second = make_queue(tmp_path, {"echo": echo})
+    job_id = submit(first)
+    claims = [first._claim(), second._claim()]
+    assert [c["id"] for c in claims if c] == [job_id]
+    assert first.get(job_id)["owner"] == first.owner
+
+def test_stale_owner_requeued(tmp_path):
+    dead = make_queue(tmp_path, {"echo": echo})
+    alive = make_queue(tmp_path, {"echo": echo})
+    job_id = submit(dead)
+    dead._claim()
+    alive._beat()  # the dead owner's heartbeat is fresh: left alone
+    assert alive.get(job_id)["status"] == "running"
+    with alive._db() as db:
+        db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - jobs.HEARTBEAT_TIMEOUT - 1, job_id))
+    alive._beat()
+    row = alive.get(job_id)
+    assert row["status"] == "queued" and row["owner"] is None
+    assert alive._claim()["id"] == job_id
+
+def test_stop_requeues_own_jobs(tmp_path):
+    async def main():
+        queue = make_queue(tmp_path, {"echo": echo})
+        job_id = submit(queue)
+        queue._claim()
+        queue.start()
+        await queue.stop()
+        return queue.get(job_id)
+    assert asyncio.run(main())["status"] == "queued"
+
+def test_cleanup_after_ttl(tmp_path):
+    async def main():
+        queue = make_queue(tmp_path, {"echo": echo}, ttl=60)
+        job_id = submit(queue)
+        queue.start()
+        await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+        return queue, job_id
+    queue, job_id = asyncio.run(main())
+    assert queue.cleanup() == 0
+    assert queue.cleanup(now=time.time() + 61) == 1
+    assert queue.get(job_id) is None and not os.path.exists(os.path.join(queue.jobs_dir, job_id))
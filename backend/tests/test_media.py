@@ -0,0 +1,50 @@
+# test_media.py
+# sniff_media picks the engine from magic bytes; ISO-BMFF files are split on the
+# major brand, so HEIF/AVIF stills go to the image engine and MP4/MOV to video.
+import io
+import wave
+
+import pytest
+from PIL import Image
+
+from media import SNIFF_BYTES, sniff_media
+
+def ftyp(brand: bytes) -> bytes:
+    return b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00"
+
+def saved(fmt: str) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, fmt)
+    return buf.getvalue()
+
+@pytest.mark.parametrize("fmt", ["PNG", "JPEG", "GIF", "BMP", "TIFF", "WEBP", "PPM"])
+def test_images(fmt):
+    assert sniff_media(saved(fmt)[:SNIFF_BYTES]) == "image"
+
+def test_avif_from_pillow():
+    assert sniff_media(saved("AVIF")[:SNIFF_BYTES]) == "image"
+
+@pytest.mark.parametrize("brand", [b"heic", b"heix", b"mif1", b"msf1", b"avif", b"avis"])
+def test_heif_brands_are_images(brand):
+    assert sniff_media(ftyp(brand)) == "image"
+
+@pytest.mark.parametrize("brand", [b"isom", b"mp42", b"qt  ", b"M4V ", b"3gp5"])
+def test_other_brands_are_video(brand):
+    assert sniff_media(ftyp(brand)) == "video"
+
+def test_wav():
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * 10)
+    assert sniff_media(buf.getvalue()[:SNIFF_BYTES]) == "audio"
+
+@pytest.mark.parametrize("head", [b"RIFF\x00\x00\x00\x00AVI LIST", b"\x1aE\xdf\xa3\x01\x00\x00\x00"])
+def test_video_containers(head):
+    assert sniff_media(head) == "video"
+
+def test_unknown():
+    assert sniff_media(b"%PDF-1.7\n") is None
+    assert sniff_media(b"") is None
@@ -0,0 +1,134 @@
+# test_payload.py
+# Payload container and Reed-Solomon layer: pack -> parse_header/unpack round-trips
+# for every codec and parity, repairs within the parity budget, and corruption
+# beyond it (or in the header) surfaces as ValueError rather than wrong text.
+import numpy as np
+import pytest
+
+import reed_solomon
+from payload import CODECS, HEADER_SIZE, MAX_PARITY, max_message_bytes, pack, parse_header, unpack
+
+MESSAGES = [b"", b"hi", "ünïcode ✓".encode("utf-8"), b"lorem ipsum " * 200,
+            np.random.default_rng(0).bytes(3000)]
+
+def roundtrip(payload: bytes) -> bytes:
+    header = parse_header(payload[:HEADER_SIZE])
+    assert header is not None
+    assert header.total_bits == len(payload) * 8
+    return unpack(header, payload[HEADER_SIZE:])
+
+def corrupt(data: bytes, positions) -> bytes:
+    out = bytearray(data)
+    for i in positions:
+        out[i] ^= 0xa5
+    return bytes(out)
+
+# -------------------------
+# Container
+# -------------------------
+@pytest.mark.parametrize("parity", [0, 2, 32])
+@pytest.mark.parametrize("compression", ("auto",) + CODECS)
+@pytest.mark.parametrize("message", MESSAGES, ids=range(len(MESSAGES)))
+def test_pack_roundtrip(message, compression, parity):
+    assert roundtrip(pack(message, compression, parity)) == message
+
+def test_auto_keeps_incompressible_raw():
+    message = MESSAGES[-1]
+    assert len(pack(message, "auto", 0)) == HEADER_SIZE + len(message)
+
+def test_not_a_container():
+    assert parse_header(b"\x00\x00\x00\x05hello....") is None
+    assert parse_header(b"SG") is None
+
+@pytest.mark.parametrize("offset", range(HEADER_SIZE))
+def test_header_corruption_rejected(offset):
+    payload = pack(b"secret message", "none", 0)
+    damaged = corrupt(payload, [offset])
+    if damaged[:2] != b"SG":
+        assert parse_header(damaged) is None
+    else:
+        with pytest.raises(ValueError):
+            parse_header(damaged)
+
+def test_body_corruption_without_parity():
+    payload = pack(b"secret message", "none", 0)
+    with pytest.raises(ValueError, match="CRC mismatch"):
+        roundtrip(corrupt(payload, [HEADER_SIZE + 3]))
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_body_corruption_within_parity_repaired(compression):
+    message = b"lorem ipsum " * 100
+    payload = pack(message, compression, 16)
+    body = range(HEADER_SIZE, len(payload))
+    rng = np.random.default_rng(1)
+    # up to parity // 2 bad bytes in each 255-byte block
+    hits = [b for start in range(HEADER_SIZE, len(payload), reed_solomon.BLOCK)
+            for b in rng.choice(body[start - HEADER_SIZE:start - HEADER_SIZE + reed_solomon.BLOCK], 8, replace=False)]
+    assert roundtrip(corrupt(payload, hits)) == message
+
+def test_body_corruption_beyond_parity_rejected():
+    payload = pack(b"lorem ipsum " * 20, "none", 4)
+    with pytest.raises(ValueError):
+        roundtrip(corrupt(payload, range(HEADER_SIZE, HEADER_SIZE + 40)))
+
+def test_truncated_body():
+    payload = pack(b"secret message", "none", 0)
+    with pytest.raises(ValueError, match="truncated"):
+        unpack(parse_header(payload), payload[HEADER_SIZE:-1])
+
+@pytest.mark.parametrize("bad", [-1, MAX_PARITY + 1])
+def test_parity_range(bad):
+    with pytest.raises(ValueError):
+        pack(b"x", "none", bad)
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match="Unsupported compression"):
+        pack(b"x", "brotli", 0)
+
+@pytest.mark.parametrize("parity", [0, 2, 32])
+@pytest.mark.parametrize("carrier_bytes", [HEADER_SIZE + 40, 100, 255 + HEADER_SIZE, 4096])
+def test_max_message_bytes_is_tight(carrier_bytes, parity):
+    limit = max_message_bytes(carrier_bytes * 8, parity)
+    assert len(pack(b"a" * limit, "none", parity)) <= carrier_bytes
+    assert len(pack(b"a" * (limit + 1), "none", parity)) > carrier_bytes
+
+# -------------------------
+# Reed-Solomon
+# -------------------------
+@pytest.mark.parametrize("nsym", [1, 2, 10, 64, 254])
+@pytest.mark.parametrize("length", [0, 1, 200, 255, 1000])
+def test_rs_roundtrip(length, nsym):
+    data = np.random.default_rng(length).bytes(length)
+    encoded = reed_solomon.encode(data, nsym)
+    assert len(encoded) == reed_solomon.encoded_size(length, nsym)
+    assert reed_solomon.decode(encoded, nsym) == data
+
+@pytest.mark.parametrize("nsym", [2, 10, 64])
+def test_rs_corrects_up_to_half_parity(nsym):
+    data = np.random.default_rng(nsym).bytes(1000)
+    encoded = reed_solomon.encode(data, nsym)
+    rng = np.random.default_rng(0)
+    hits = [start + int(i) for start in range(0, len(encoded), reed_solomon.BLOCK)
+            for i in rng.choice(min(reed_solomon.BLOCK, len(encoded) - start), nsym // 2, replace=False)]
+    assert reed_solomon.decode(corrupt(encoded, hits), nsym) == data
+
+def test_rs_parity_bytes_can_be_hit():
+    data = b"payload body"
+    encoded = reed_solomon.encode(data, 8)
+    assert reed_solomon.decode(corrupt(encoded, [len(encoded) - 1, len(encoded) - 8]), 8) == data
+
+def test_rs_too_many_errors():
+    data = np.random.default_rng(2).bytes(200)
+    encoded = reed_solomon.encode(data, 8)
+    with pytest.raises(ValueError, match="Too many corrupted bytes"):
+        reed_solomon.decode(corrupt(encoded, range(0, 40, 2)), 8)
+
+def test_rs_truncated():
+    encoded = reed_solomon.encode(b"abc", 8)
+    with pytest.raises(ValueError, match="Truncated"):
+        reed_solomon.decode(encoded[:5], 8)
+
+@pytest.mark.parametrize("nsym", [0, reed_solomon.BLOCK])
+def test_rs_parity_range(nsym):
+    with pytest.raises(ValueError):
+        reed_solomon.encode(b"abc", nsym)
@@ -0,0 +1,76 @@
+# test_result_cache.py
+# ResultCache: LRU eviction in memory, the SQLite tier surviving a restart, and the
+# disk tier staying bounded by row count and age.
+import sqlite3
+import time
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, content_hash, source_fingerprint, weights_fingerprint
+
+def test_memory_lru():
+    cache = ResultCache(max_entries=2, db_path=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1       # a is now most recent
+    cache.put("c", 3)                # evicts b
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["entries_memory"] == 2 and not stats["disk_enabled"]
+    assert (stats["hits_memory"], stats["misses"]) == (3, 1)
+
+def test_disk_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.db")
+    ResultCache(max_entries=4, db_path=db).put("k", {"verdict": "clean", "score": 0.25})
+    cache = ResultCache(max_entries=4, db_path=db)
+    assert cache.get("k") == {"verdict": "clean", "score": 0.25}
+    assert cache.get("k") == {"verdict": "clean", "score": 0.25}  # promoted to memory
+    stats = cache.stats()
+    assert (stats["hits_disk"], stats["hits_memory"], stats["entries_disk"]) == (1, 1, 1)
+
+def test_disk_row_bound(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "PRUNE_EVERY", 4)
+    cache = ResultCache(max_entries=1, db_path=str(tmp_path / "cache.db"), max_disk_entries=5)
+    for i in range(12):
+        cache.put(f"k{i}", i)
+        time.sleep(0.002)  # distinct created stamps, so "oldest" is well defined
+    assert cache.stats()["entries_disk"] <= 5 + 4
+    assert cache.prune() == 0 and cache.stats()["entries_disk"] == 5
+    assert cache.get("k11") == 11
+    assert cache.get("k0") is None
+    assert cache.stats()["evicted_disk"] == 7
+
+def test_disk_ttl(tmp_path):
+    db = str(tmp_path / "cache.db")
+    cache = ResultCache(max_entries=1, db_path=db, disk_ttl=60)
+    cache.put("fresh", 1)
+    with sqlite3.connect(db) as conn:
+        conn.execute("INSERT INTO results (key, value, created) VALUES ('stale', '2', ?)", (time.time() - 120,))
+    cache.put("other", 3)  # pushes "fresh" out of memory
+    assert cache.get("stale") is None  # expired rows are ignored before any prune
+    assert cache.get("fresh") == 1
+    assert cache.prune() == 1
+    assert ResultCache(max_entries=1, db_path=db, disk_ttl=0).stats()["entries_disk"] == 2
+
+def test_keys():
+    assert content_hash(b"abc") == content_hash(b"abc") != content_hash(b"abd")
+    assert source_fingerprint(["result_cache"]) == source_fingerprint(["result_cache"])
+    assert source_fingerprint(["result_cache"]) != source_fingerprint(["payload"])
+    assert weights_fingerprint(["/nonexistent"]) == weights_fingerprint([])
+
+def test_weights_fingerprint_tracks_files(tmp_path):
+    weights = tmp_path / "w.pth"
+    weights.write_bytes(b"v1")
+    before = weights_fingerprint([str(weights)])
+    weights.write_bytes(b"version 2")
+    assert weights_fingerprint([str(weights)]) != before
+
+@pytest.mark.parametrize("ttl", [0, 3600])
+def test_prune_on_open(tmp_path, ttl):
+    db = str(tmp_path / "cache.db")
+    cache = ResultCache(max_entries=1, db_path=db)
+    for i in range(6):
+        cache.put(f"k{i}", i)
+    assert ResultCache(max_entries=1, db_path=db, max_disk_entries=2, disk_ttl=ttl).stats()["entries_disk"] == 2
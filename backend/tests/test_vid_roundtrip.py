@@ -0,0 +1,52 @@
+# test_vid_roundtrip.py
+# encode_video -> lossless clip -> decode_video must return the message unchanged,
+# for each lossless codec and for the PNG packet-copy path.
+import cv2
+import numpy as np
+import pytest
+
+import vid
+import workers
+
+SIZE = (64, 48)  # 9216 LSBs per frame
+FRAMES = 40
+
+@pytest.fixture(scope="module", autouse=True)
+def shared_pool():
+    yield
+    workers.shutdown_pool()
+
+def make_clip(path: str, fourcc: str) -> str:
+    rng = np.random.default_rng(0)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), 10, SIZE)
+    for _ in range(FRAMES):
+        out.write(rng.integers(0, 256, size=(SIZE[1], SIZE[0], 3), dtype=np.uint8))
+    out.release()
+    return path
+
+def message(n: int) -> str:
+    # incompressible, so long messages really span many frames
+    rng = np.random.default_rng(n)
+    return "".join(chr(c) for c in rng.integers(0x21, 0x7e, n)) + " ünïcode"
+
+@pytest.mark.parametrize("codec", sorted(vid.LOSSLESS_CODECS))
+@pytest.mark.parametrize("length", [5, 20_000])  # one frame; several FRAMES_PER_TASK ranges on the pool
+def test_roundtrip(tmp_path, codec, length):
+    source = make_clip(str(tmp_path / "source.mkv"), "FFV1")
+    encoded = str(tmp_path / ("encoded" + vid.LOSSLESS_CODECS[codec][1]))
+    text = message(length)
+    vid.encode_video(source, text, encoded, codec, compression="none")
+    assert vid.decode_video(encoded) == text
+
+@pytest.mark.skipif(vid.av is None, reason="PyAV not installed")
+def test_png_passthrough_roundtrip(tmp_path):
+    # a PNG-AVI source takes the packet-copy path: only payload frames are re-encoded
+    source = make_clip(str(tmp_path / "source.avi"), "png ")
+    assert vid._can_passthrough(source)
+    encoded = str(tmp_path / "encoded.avi")
+    text = message(20_000)
+    vid.encode_video(source, text, encoded, "png", compression="none")
+    assert vid.decode_video(encoded) == text
+    cap = cv2.VideoCapture(encoded)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == FRAMES
+    cap.release()
@@ -0,0 +1,140 @@
+# tiled_detection.py
+# Sliding-window detection for very large images: row bands are decoded one at a
+# time (image_bands), tiles are scored in parallel in the worker pool, and the
+# result carries a downsampled suspicion heatmap next to the verdict.
+import io
+import math
+import os
+from collections import deque
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from image_bands import iter_bands, is_streamable, open_image
+from steganalysis import MIN_TILE_GROUPS, TILE_SIZE, _chi_square_pvalue, rs_rate, score_band
+from stego_utils import STEGO_RATE_THRESHOLD
+
+TILED_MAX_PIXELS = 1_000_000_000   # decompression-bomb limit here: frames are never held whole
+MAX_HEATMAP_CELLS = 64             # heatmap edge in cells; larger tile grids are max-pooled down
+MODEL_GATE_RATE = 0.02             # tiles the heuristic rates below this skip the model
+HEATMAP_PNG_EDGE = 512             # longest edge of the rendered heatmap PNG
+
+# -------------------------
+# Heatmap
+# -------------------------
+def downsample_grid(grid: np.ndarray, max_cells: int = MAX_HEATMAP_CELLS):
+    """Max-pool the tile grid so neither side exceeds `max_cells`; returns (grid, tiles per cell)."""
+    factor = max(1, math.ceil(max(grid.shape) / max_cells))
+    if factor == 1:
+        return grid, 1
+    rows, cols = -(-grid.shape[0] // factor), -(-grid.shape[1] // factor)
+    padded = np.zeros((rows * factor, cols * factor), dtype=grid.dtype)
+    padded[:grid.shape[0], :grid.shape[1]] = grid
+    return padded.reshape(rows, factor, cols, factor).max(axis=(1, 3)), factor
+
+def heatmap_png(heatmap, edge: int = HEATMAP_PNG_EDGE) -> bytes:
+    """Render a [0, 1] suspicion grid black -> red -> yellow, upscaled with nearest neighbour."""
+    grid = np.clip(np.asarray(heatmap, dtype=np.float32), 0.0, 1.0)
+    rgb = np.stack([np.minimum(1.0, grid * 2), np.maximum(0.0, grid * 2 - 1), np.zeros_like(grid)], axis=-1)
+    img = Image.fromarray((rgb * 255).astype(np.uint8))
+    scale = max(1, edge // max(grid.shape))
+    img = img.resize((grid.shape[1] * scale, grid.shape[0] * scale), Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+# -------------------------
+# Model scoring
+# -------------------------
+def _model_scores(detector, band: np.ndarray, tile_size: int, columns) -> list:
+    """Stego probability of the given tile columns of one band, in a single batch."""
+    import torch
+    from detector_model import center_crop, to_input
+    tiles = [center_crop(torch.from_numpy(np.ascontiguousarray(band[:, c * tile_size:(c + 1) * tile_size]))
+                         .permute(2, 0, 1), detector.crop_size) for c in columns]
+    return [float(p) for p in detector.predict(to_input(torch.stack(tiles)))]
+
+# -------------------------
+# Detection
+# -------------------------
+def detect_tiled(source, tile_size: Optional[int] = None, detector=None, executor=None,
+                 max_inflight: Optional[int] = None, max_cells: int = MAX_HEATMAP_CELLS,
+                 gate: float = MODEL_GATE_RATE) -> dict:
+    """
+    Verdict plus suspicion heatmap for an image of any size (bytes, path or file).
+    Bands are scored by steganalysis.score_band, in `executor` when given, with at
+    most `max_inflight` bands decoded at once, so memory stays at a few bands.
+    Tiles whose LSB planes are constant are skipped. With a detector, tiles the
+    heuristic rates at or above `gate` are re-scored by the model in one batch per band.
+    """
+    img = open_image(source, TILED_MAX_PIXELS)
+    w, h = img.size
+    tile_size = tile_size or (detector.crop_size if detector is not None else TILE_SIZE)
+    streamed = is_streamable(img, tile_size)
+    max_inflight = max_inflight or 2 * (getattr(executor, "_max_workers", None) or os.cpu_count() or 1)
+
+    hist = np.zeros(256, dtype=np.int64)
+    counts = np.zeros(9, dtype=np.int64)
+    grid_rows, model_tiles = [], 0
+    pending = deque()
+
+    def collect():
+        nonlocal model_tiles
+        band, future = pending.popleft()
+        scores = future.result() if executor is not None else future
+        hist[:] += scores["hist"]
+        counts[:] += scores["counts"]
+        # edge slivers are too noisy to rate on their own (same rule as analyze_image)
+        row = [0.0 if skip or n < MIN_TILE_GROUPS else rate
+               for rate, n, skip in zip(scores["rates"], scores["groups"], scores["skipped"])]
+        if detector is not None:
+            columns = [c for c, (rate, skip) in enumerate(zip(scores["rates"], scores["skipped"]))
+                       if not skip and rate >= gate]
+            if columns:
+                for c, prob in zip(columns, _model_scores(detector, band, tile_size, columns)):
+                    row[c] = prob
+                model_tiles += len(columns)
+        grid_rows.append((row, scores["skipped"]))
+
+    for _, band in iter_bands(img, tile_size):
+        if executor is not None:
+            pending.append((band, executor.submit(score_band, band, tile_size, True)))
+        else:
+            pending.append((band, score_band(band, tile_size, True)))
+        if len(pending) >= max_inflight:
+            collect()
+    while pending:
+        collect()
+
+    grid = np.asarray([row for row, _ in grid_rows], dtype=np.float32)
+    skipped = int(sum(sum(flags) for _, flags in grid_rows))
+    peak = np.unravel_index(int(np.argmax(grid)), grid.shape)
+    top = float(grid[peak])
+    heatmap, factor = downsample_grid(grid, max_cells)
+
+    if detector is not None:
+        mode = "tiled-resnet18"
+        stego = top >= 0.5
+        prob = top if stego else 1.0 - top
+    else:
+        mode = "tiled-chi2-rs"
+        suspicion = max(rs_rate(counts), top)
+        stego = suspicion >= STEGO_RATE_THRESHOLD
+        prob = min(1.0, 0.5 + suspicion / 2) if stego else 1.0 - suspicion / (2 * STEGO_RATE_THRESHOLD)
+    return {
+        "result": "Possibly Stego" if stego else "Likely Clean",
+        "probability": round(float(prob), 4),
+        "mode": mode,
+        "embedding_rate": round(rs_rate(counts), 4),
+        "chi_square_p": round(_chi_square_pvalue(hist), 4),
+        "image_size": [w, h],
+        "streamed": streamed,
+        "tile_size": tile_size,
+        "tiles": int(grid.size),
+        "tiles_skipped": skipped,
+        "tiles_model": model_tiles,
+        "max_tile": {"x": int(peak[1]) * tile_size, "y": int(peak[0]) * tile_size, "score": round(top, 4)},
+        "heatmap_cell": tile_size * factor,
+        "heatmap": np.round(heatmap, 3).tolist(),
+    }
@@ -0,0 +1,199 @@
+# train_driver.py
+# Training loop shared by train_resnet18.py and train_stego_detector.py:
+# checkpoint/resume, bf16 autocast on CPU, early stopping, best-model tracking
+# and per-epoch data-loading vs compute timing. With labels.csv metadata the final
+# validation accuracy is also broken down by embedding scheme and rate.
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from detector_model import to_input
+
+# -------------------------
+# Checkpoints
+# -------------------------
+def _rng_state() -> dict:
+    state = {"torch": torch.get_rng_state(), "numpy": np.random.get_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+def _set_rng_state(state: dict) -> None:
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+def _atomic_save(obj, path: str) -> None:
+    """Write to a temp file then rename, so a kill mid-save never corrupts the last checkpoint."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+def save_checkpoint(path: str, model: nn.Module, optimizer, epoch: int, best: dict) -> None:
+    _atomic_save({"model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                  "epoch": epoch, "best": best, "rng": _rng_state()}, path)
+
+def load_checkpoint(path: str, model: nn.Module, optimizer) -> tuple:
+    """Restore everything save_checkpoint wrote; returns (next epoch, best-tracking state)."""
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    _set_rng_state(state["rng"])
+    return state["epoch"] + 1, state["best"]
+
+RATE_BUCKETS = (0.05, 0.2, 0.5)  # embedding-rate edges for the per-rate breakdown
+
+# -------------------------
+# Epochs
+# -------------------------
+def bf16_supported(device: torch.device) -> bool:
+    """bf16 autocast only pays off with native bf16 units (AVX512-BF16 / AMX on CPU)."""
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    cpu = torch.cpu
+    return bool(getattr(cpu, "_is_avx512_bf16_supported", lambda: False)()
+                or getattr(cpu, "_is_amx_tile_supported", lambda: False)())
+
+def _sync(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def run_epoch(model, loader, device, criterion=None, optimizer=None, bf16: bool = False) -> dict:
+    """
+    One pass over `loader`; trains when an optimizer is given, otherwise evaluates.
+    Time spent waiting on the loader is reported separately from compute.
+    """
+    training = optimizer is not None
+    model.train(training)
+    loss_sum, correct, total = 0.0, 0, 0
+    data_time = compute_time = 0.0
+    mark = time.perf_counter()
+    with torch.set_grad_enabled(training):
+        for images, labels in loader:
+            images, labels = to_input(images).to(device), labels.to(device)
+            started = time.perf_counter()
+            data_time += started - mark
+
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+                outputs = model(images)
+                loss = criterion(outputs, labels) if criterion is not None else None
+            if training:
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+            if loss is not None:
+                loss_sum += loss.item()
+            correct += (outputs.argmax(1) == labels).sum().item()
+            total += labels.size(0)
+
+            _sync(device)
+            mark = time.perf_counter()
+            compute_time += mark - started
+    return {"loss": loss_sum / max(1, len(loader)), "acc": 100 * correct / max(1, total),
+            "data_s": data_time, "compute_s": compute_time}
+
+def fit(model: nn.Module, train_loader, val_loader, *, epochs: int, lr: float = 1e-3,
+        device: Optional[torch.device] = None, checkpoint_path: Optional[str] = None,
+        resume: bool = True, checkpoint_every: int = 1, patience: Optional[int] = 3,
+        min_delta: float = 0.0, bf16: bool = False,
+        save_best: Optional[Callable[[nn.Module], None]] = None) -> list:
+    """
+    Train with Adam + cross-entropy and return per-epoch stats.
+    - checkpoint_path: model, optimizer, epoch, best-so-far and RNG state written every
+      `checkpoint_every` epochs; with `resume` an existing checkpoint picks up where it stopped.
+    - bf16: bfloat16 autocast (CPU or CUDA); weights and optimizer stay fp32.
+    - patience: stop after this many epochs without a val-accuracy gain > min_delta.
+    - save_best(model) runs whenever val accuracy improves; on return the model holds
+      the best weights seen.
+    """
+    device = device or next(model.parameters()).device
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    start, best = 0, {"acc": -1.0, "epoch": -1, "state": None, "stale": 0}
+
+    if checkpoint_path and resume and os.path.exists(checkpoint_path):
+        start, best = load_checkpoint(checkpoint_path, model, optimizer)
+        print(f"Resumed from {checkpoint_path} at epoch {start + 1} (best val acc {best['acc']:.2f}%)")
+
+    history = []
+    for epoch in range(start, epochs):
+        if patience is not None and best["stale"] >= patience:
+            break
+        train = run_epoch(model, train_loader, device, criterion, optimizer, bf16)
+        val = run_epoch(model, val_loader, device, criterion, bf16=bf16)
+        improved = val["acc"] > best["acc"] + min_delta
+        if improved:
+            best = {"acc": val["acc"], "epoch": epoch, "stale": 0,
+                    "state": {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}}
+            if save_best is not None:
+                save_best(model)
+        else:
+            best["stale"] += 1
+
+        history.append({"epoch": epoch + 1, "train": train, "val": val, "best": improved})
+        print(f"Epoch [{epoch + 1}/{epochs}] Loss: {train['loss']:.4f}, Train Acc: {train['acc']:.2f}%, "
+              f"Val Acc: {val['acc']:.2f}%{' *' if improved else ''} | "
+              f"data {train['data_s']:.1f}s, compute {train['compute_s']:.1f}s, "
+              f"val {val['data_s'] + val['compute_s']:.1f}s")
+
+        stopping = patience is not None and best["stale"] >= patience
+        if checkpoint_path and ((epoch + 1) % checkpoint_every == 0 or epoch + 1 == epochs or stopping):
+            save_checkpoint(checkpoint_path, model, optimizer, epoch, best)
+        if stopping:
+            print(f"Early stopping: no val improvement for {patience} epochs "
+                  f"(best {best['acc']:.2f}% at epoch {best['epoch'] + 1})")
+
+    if best["state"] is not None:
+        model.load_state_dict(best["state"])
+    return history
+
+# -------------------------
+# Breakdown by labels.csv metadata
+# -------------------------
+def _rate_bucket(rate: float) -> str:
+    if rate != rate:  # nan: no labels.csv row
+        return "rate ?"
+    if rate == 0:
+        return "rate 0"
+    lo = 0.0
+    for hi in RATE_BUCKETS:
+        if rate <= hi:
+            return f"rate {lo:g}-{hi:g}"
+        lo = hi
+    return f"rate >{lo:g}"
+
+def accuracy_by_group(model: nn.Module, loader, dataset, device: Optional[torch.device] = None,
+                      bf16: bool = False) -> dict:
+    """
+    Accuracy per embedding scheme and per rate bucket over an unshuffled loader of
+    `dataset` (LabeledImageFolder or ShardDataset, which carry `schemes` and
+    `embedding_rates`); {} for datasets without them.
+    """
+    schemes, rates = getattr(dataset, "schemes", None), getattr(dataset, "embedding_rates", None)
+    if schemes is None or rates is None:
+        return {}
+    device = device or next(model.parameters()).device
+    model.eval()
+    hits = []
+    with torch.no_grad():
+        for images, labels in loader:
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+                outputs = model(to_input(images).to(device))
+            hits.extend((outputs.argmax(1).cpu() == labels).tolist())
+    groups = defaultdict(list)
+    for hit, scheme, rate in zip(hits, schemes, rates):
+        groups[f"scheme {scheme}"].append(hit)
+        groups[_rate_bucket(rate)].append(hit)
+    report = {name: {"acc": 100 * sum(v) / len(v), "n": len(v)} for name, v in sorted(groups.items())}
+    for name, stats in report.items():
+        print(f"  {name:<20} {stats['acc']:6.2f}%  ({stats['n']} images)")
+    return report
@@ -1,10 +1,15 @@
 import torch
 import torch.nn as nn
-import torch.optim as optim
 import torchvision
 import torchvision.transforms as transforms
-from torchvision import datasets, models
+from torchvision import models
 import os
+import multiprocessing
+from shards import LabeledImageFolder, ShardDataset, shards_ready
+from detector_model import (CROP_SIZE, RandomNativeCrop, CenterNativeCrop,
+                            build_detector, checkpoint)
+from detector_export import calibration_batches, export_all
+from train_driver import accuracy_by_group, bf16_supported, fit
 
 # --------------------------
 # CONFIG
@@ -12,75 +17,77 @@ import os
 train_dir = "dataset/train"   # should have subfolders: cover/, stego/
 val_dir   = "dataset/val"     # should have subfolders: cover/, stego/
 batch_size = 16
-num_epochs = 5
+num_epochs = 30                  # upper bound; early stopping usually ends sooner
+patience = 3                     # epochs without val-accuracy gain before stopping
 lr = 0.001
-save_path = "resnet18_stego.pth"
+save_path = "resnet18_stego.pth"  # best model by val accuracy
+checkpoint_path = "checkpoints/resnet18_stego.ckpt"   # resumes automatically when present
+train_shards = "shards/train"   # from shards.py; used instead of ImageFolder when present
+val_shards   = "shards/val"
+# "native": random/centre crops at native resolution + SRM residual front-end (keeps LSB noise);
+# "resize": the old Resize((224, 224)) pipeline, kept for comparison with earlier weights
+input_mode = "native"
+export_artifacts = True   # also write ONNX / int8 serving artifacts next to save_path (detector_export.py)
+# worker processes need fork: under spawn they would re-run this top-level script
+num_workers = min(4, os.cpu_count() or 1) if multiprocessing.get_start_method() == "fork" else 0
 
 # --------------------------
 # DATASET
 # --------------------------
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-])
+if input_mode == "native":
+    train_transform = RandomNativeCrop(CROP_SIZE)
+    val_transform   = CenterNativeCrop(CROP_SIZE)
+    shard_mode = "crop"
+else:
+    train_transform = val_transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+    ])
+    shard_mode = "resize"
 
-train_data = datasets.ImageFolder(train_dir, transform=transform)
-val_data   = datasets.ImageFolder(val_dir,   transform=transform)
+if shards_ready(train_shards, shard_mode) and shards_ready(val_shards, shard_mode):
+    # pre-decoded uint8 shards: no JPEG decode per epoch; native crops are re-cropped on the fly
+    shard_transform = (train_transform, val_transform) if input_mode == "native" else (None, None)
+    train_data = ShardDataset(train_shards, transform=shard_transform[0])
+    val_data   = ShardDataset(val_shards, transform=shard_transform[1])
+else:
+    # labels (and scheme / rate metadata) from labels.csv where generate_stego_dataset.py wrote one
+    train_data = LabeledImageFolder(train_dir, transform=train_transform)
+    val_data   = LabeledImageFolder(val_dir,   transform=val_transform)
 
-train_loader = torch.utils.data.DataLoader(train_data, batch_size=batch_size, shuffle=True)
-val_loader   = torch.utils.data.DataLoader(val_data, batch_size=batch_size, shuffle=False)
+loader_kwargs = dict(batch_size=batch_size, num_workers=num_workers, persistent_workers=num_workers > 0)
+train_loader = torch.utils.data.DataLoader(train_data, shuffle=True, **loader_kwargs)
+val_loader   = torch.utils.data.DataLoader(val_data, shuffle=False, **loader_kwargs)
 
 # --------------------------
 # MODEL
 # --------------------------
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = models.resnet18(pretrained=True)
-num_ftrs = model.fc.in_features
-model.fc = nn.Linear(num_ftrs, 2)   # binary classifier
+if input_mode == "native":
+    model = build_detector(pretrained=True)   # SRM residuals -> ResNet18, binary head
+else:
+    model = models.resnet18(pretrained=True)
+    num_ftrs = model.fc.in_features
+    model.fc = nn.Linear(num_ftrs, 2)   # binary classifier
 model = model.to(device)
 
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=lr)
+bf16 = bf16_supported(device)   # autocast only where the CPU/GPU has native bf16
+
+def save_best(model):
+    torch.save(checkpoint(model) if input_mode == "native" else model.state_dict(), save_path)
 
 # --------------------------
-# TRAINING LOOP
+# TRAINING (train_driver.fit: checkpoints, resume, early stopping)
 # --------------------------
-for epoch in range(num_epochs):
-    model.train()
-    running_loss = 0.0
-    correct, total = 0, 0
-    for imgs, labels in train_loader:
-        imgs, labels = imgs.to(device), labels.to(device)
-
-        optimizer.zero_grad()
-        outputs = model(imgs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-        running_loss += loss.item()
-        _, predicted = torch.max(outputs, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
-
-    train_acc = 100 * correct / total
-    print(f"Epoch [{epoch+1}/{num_epochs}] Loss: {running_loss/len(train_loader):.4f}, Train Acc: {train_acc:.2f}%")
-
-    # validation
-    model.eval()
-    correct, total = 0, 0
-    with torch.no_grad():
-        for imgs, labels in val_loader:
-            imgs, labels = imgs.to(device), labels.to(device)
-            outputs = model(imgs)
-            _, predicted = torch.max(outputs, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-    val_acc = 100 * correct / total
-    print(f"Validation Acc: {val_acc:.2f}%")
+fit(model, train_loader, val_loader, epochs=num_epochs, lr=lr, device=device,
+    checkpoint_path=checkpoint_path, patience=patience, bf16=bf16, save_best=save_best)
+print(f"✅ Best model saved to {save_path}")
+print("Validation accuracy by scheme / embedding rate:")
+accuracy_by_group(model, val_loader, val_data, device, bf16)
 
 # --------------------------
-# SAVE MODEL
+# SERVING ARTIFACTS
 # --------------------------
-torch.save(model.state_dict(), save_path)
-print(f"✅ Model saved to {save_path}")
+if export_artifacts:
+    export_all(model, save_path, calibration_batches(val_loader),
+               CROP_SIZE if input_mode == "native" else 224, input_mode)
@@ -1,46 +1,69 @@
+import os
+import multiprocessing
 import torch
 import torch.nn as nn
-import torch.optim as optim
-from torchvision import datasets, transforms, models
+from torchvision import transforms, models
+from shards import LabeledImageFolder, ShardDataset, shards_ready
+from detector_model import (CROP_SIZE, RandomNativeCrop, CenterNativeCrop,
+                            build_detector, checkpoint)
+from detector_export import calibration_batches, export_all
+from train_driver import accuracy_by_group, bf16_supported, fit
 
 # 1. Device setup (CPU only)
 device = torch.device("cpu")
 print(f"Using device: {device}")
 
 # 2. Data preprocessing
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-])
+# "native" crops at full resolution so the LSB noise survives; "resize" is the old 224x224 path
+input_mode = "native"
+if input_mode == "native":
+    train_transform, val_transform = RandomNativeCrop(CROP_SIZE), CenterNativeCrop(CROP_SIZE)
+else:
+    train_transform = val_transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+    ])
+shard_mode = "crop" if input_mode == "native" else "resize"
 
-train_data = datasets.ImageFolder("dataset/train", transform=transform)
-val_data = datasets.ImageFolder("dataset/val", transform=transform)
+# Pre-decoded shards from shards.py skip JPEG decode on every epoch (built with the matching --mode)
+if shards_ready("shards/train", shard_mode) and shards_ready("shards/val", shard_mode):
+    native = input_mode == "native"
+    train_data = ShardDataset("shards/train", transform=train_transform if native else None)
+    val_data = ShardDataset("shards/val", transform=val_transform if native else None)
+else:
+    # labels (and scheme / rate metadata) from labels.csv where generate_stego_dataset.py wrote one
+    train_data = LabeledImageFolder("dataset/train", transform=train_transform)
+    val_data = LabeledImageFolder("dataset/val", transform=val_transform)
 
-train_loader = torch.utils.data.DataLoader(train_data, batch_size=16, shuffle=True)
-val_loader = torch.utils.data.DataLoader(val_data, batch_size=16, shuffle=False)
+# worker processes need fork: under spawn they would re-run this top-level script
+num_workers = min(4, os.cpu_count() or 1) if multiprocessing.get_start_method() == "fork" else 0
+train_loader = torch.utils.data.DataLoader(train_data, batch_size=16, shuffle=True,
+                                           num_workers=num_workers, persistent_workers=num_workers > 0)
+val_loader = torch.utils.data.DataLoader(val_data, batch_size=16, shuffle=False,
+                                         num_workers=num_workers, persistent_workers=num_workers > 0)
 
 # 3. Load ResNet18
-model = models.resnet18(pretrained=True)
-model.fc = nn.Linear(model.fc.in_features, 2)  # 2 classes: Clean, Stego
+if input_mode == "native":
+    model = build_detector(pretrained=True)  # SRM residual front-end + ResNet18, 2 classes
+else:
+    model = models.resnet18(pretrained=True)
+    model.fc = nn.Linear(model.fc.in_features, 2)  # 2 classes: Clean, Stego
 model = model.to(device)  # move model to CPU
 
-# 4. Training setup
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-# 5. Training loop
-for epoch in range(5):  # small demo
-    model.train()
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)  # move data to CPU
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-    print(f"Epoch {epoch+1}, Loss: {loss.item()}")
-
-# 6. Save model
-torch.save(model.state_dict(), "models/best_stego_resnet18.pth")
-print("✅ Model saved as models/best_stego_resnet18.pth")
+# 4. Training: shared driver (checkpoint/resume, early stopping, data vs compute timing)
+save_path = "models/best_stego_resnet18.pth"
+os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+def save_best(model):
+    torch.save(checkpoint(model) if input_mode == "native" else model.state_dict(), save_path)
+
+fit(model, train_loader, val_loader, epochs=20, lr=0.001, device=device,
+    checkpoint_path="checkpoints/best_stego_resnet18.ckpt", patience=3,
+    bf16=bf16_supported(device), save_best=save_best)
+print(f"✅ Best model saved as {save_path}")
+print("Validation accuracy by scheme / embedding rate:")
+accuracy_by_group(model, val_loader, val_data, device, bf16_supported(device))
+
+# 5. Serving artifacts (ONNX, int8 ONNX, int8 TorchScript) next to the weights
+export_all(model, save_path, calibration_batches(val_loader),
+           CROP_SIZE if input_mode == "native" else 224, input_mode)
@@ -0,0 +1,101 @@
+# uploads.py
+# Upload handling shared by main.py and vid.py: stream each upload to a temp file in
+# chunks and hand the engines a path (or a read-only mmap), never a full bytes copy.
+import mmap
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Tuple
+
+from metrics import UPLOAD_BYTES, stage
+from result_cache import content_hash
+
+UPLOAD_CHUNK = 1 << 20  # bytes per read when spooling uploads to disk
+# zip uploads to /batch/*: checked against the central directory before anything is extracted
+ARCHIVE_MAX_MEMBERS = int(os.environ.get("STEGO_ARCHIVE_MAX_MEMBERS", "1000"))
+ARCHIVE_MAX_BYTES = int(os.environ.get("STEGO_ARCHIVE_MAX_BYTES", str(2 << 30)))  # uncompressed, per request
+
+async def spool_upload(file, suffix: str = "") -> str:
+    """Copy an upload to a named temp file chunk by chunk and return its path."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    size = 0
+    try:
+        with stage("upload.read"), os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK):
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    UPLOAD_BYTES.observe(size)
+    return path
+
+def upload_suffix(file, default: str = "") -> str:
+    return os.path.splitext(file.filename or "")[1] or default
+
+@asynccontextmanager
+async def spooled(file, suffix: str = ""):
+    """`async with spooled(file) as path:` - the temp file is removed on exit."""
+    path = await spool_upload(file, suffix)
+    try:
+        yield path
+    finally:
+        remove_quietly(path)
+
+def remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@contextmanager
+def mapped(path: str):
+    """Read-only mmap of a file (b"" for an empty one); pages load on demand."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+def hash_file(path: str) -> str:
+    """content_hash of a file's bytes, fed straight from the mapping."""
+    with mapped(path) as view:
+        return content_hash(view)
+
+def expand_archives(items: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Replace every spooled zip in (name, path) pairs with its members, each
+    extracted to its own temp file by streaming copy. Archive files are removed.
+    Raises ValueError, before extracting, when the archives hold more than
+    ARCHIVE_MAX_MEMBERS files or ARCHIVE_MAX_BYTES uncompressed bytes in total
+    (zipfile never reads a member past its declared size).
+    """
+    expanded = []
+    members = total = 0
+    try:
+        for name, path in items:
+            if not zipfile.is_zipfile(path):
+                expanded.append((name, path))
+                continue
+            with zipfile.ZipFile(path) as zf:
+                infos = [info for info in zf.infolist() if not info.is_dir()]
+                members += len(infos)
+                total += sum(info.file_size for info in infos)
+                if members > ARCHIVE_MAX_MEMBERS:
+                    raise ValueError(f"Archives may hold at most {ARCHIVE_MAX_MEMBERS} files")
+                if total > ARCHIVE_MAX_BYTES:
+                    raise ValueError(f"Archives may expand to at most {ARCHIVE_MAX_BYTES} bytes")
+                for info in infos:
+                    fd, member_path = tempfile.mkstemp(suffix=os.path.splitext(info.filename)[1])
+                    expanded.append((info.filename, member_path))
+                    with os.fdopen(fd, "wb") as out, zf.open(info) as src:
+                        shutil.copyfileobj(src, out, UPLOAD_CHUNK)
+            remove_quietly(path)
+    except BaseException:
+        for _, p in expanded + items:
+            remove_quietly(p)
+        raise
+    return expanded
@@ -1,124 +1,294 @@
-# backend/main.py
+# vid.py
+# Video LSB engine, served through main.py (which imports it on the first video request).
 import cv2
 import numpy as np
-from fastapi import FastAPI, File, Form, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
-import tempfile
+from collections import deque
+from typing import Callable, Optional
+from bitplane import bytes_to_bits, bits_to_bytes, embed_bits, extract_bits
+from workers import STEGO_WORKERS, get_pool
+from payload import (HEADER_BITS, HEADER_SIZE, PAYLOAD_COMPRESSION, PAYLOAD_PARITY, lsb_capacity, pack,
+                     parse_header, unpack)
 import os
 
-app = FastAPI()
+try:
+    import av  # optional (PyAV): lets untouched frames be copied without re-encoding
+except ImportError:
+    av = None
 
 # =====================
 # Utility functions
 # =====================
-def message_to_binary(message: str) -> str:
-    return ''.join([format(ord(char), "08b") for char in message])
+# End marker of clips written before the payload container; only the decoder still looks for it
+EOF_MARKER = np.array([1] * 15 + [0], dtype=np.uint8)  # "1111111111111110"
+LEGACY_SCAN_FRAMES = 4  # leading frames searched for that marker; clean clips are never read in full
+# Frame ranges one decode keeps in flight on the shared worker pool; defaults to its size
+VIDEO_WORKERS = int(os.environ.get("STEGO_VIDEO_WORKERS", "0")) or STEGO_WORKERS
+FRAMES_PER_TASK = 8     # frames per worker task; bounds per-task memory at 1080p
+# Lossless output codecs: name -> (OpenCV fourcc, container suffix, media type).
+# Lossy codecs such as mp4v wipe the LSBs, so they are not offered.
+LOSSLESS_CODECS = {
+    "png": ("png ", ".avi", "video/x-msvideo"),
+    "ffv1": ("FFV1", ".mkv", "video/x-matroska"),
+}
+# PNG frames are intra-only with no global header, so copied packets stay valid
+DEFAULT_CODEC = "png"
+# progress(frames_done, total_frames); may raise to abort (the job queue cancels this way)
+Progress = Optional[Callable[[int, int], None]]
 
-def binary_to_message(binary: str) -> str:
-    chars = [binary[i:i + 8] for i in range(0, len(binary), 8)]
-    return ''.join([chr(int(char, 2)) for char in chars])
+def binary_to_message(binary: np.ndarray) -> str:
+    return bits_to_bytes(binary).decode("utf-8", errors="replace")
+
+def _find_marker(bits: np.ndarray) -> int:
+    """Index of the first EOF marker in `bits` (at any bit offset), or -1."""
+    n = len(EOF_MARKER) - 1
+    if len(bits) <= n:
+        return -1
+    ones = np.concatenate(([0], np.cumsum(bits, dtype=np.int32)))
+    # a marker starting at k has 15 ones in bits[k:k+15] followed by a 0
+    hit = (ones[n:len(bits)] - ones[:len(bits) - n] == n) & (bits[n:] == 0)
+    idx = np.flatnonzero(hit)
+    return int(idx[0]) if idx.size else -1
+
+def _frame_bits(frame: np.ndarray) -> np.ndarray:
+    return extract_bits(frame.reshape(-1), frame.size)
+
+def _decode_range(video_path: str, start: int, stop: int):
+    """Worker: LSBs of frames [start, stop), packed as (bytes, nbits) to keep pickling cheap."""
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    parts = []
+    for _ in range(start, stop):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        parts.append(_frame_bits(frame))
+    cap.release()
+    bits = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+    return np.packbits(bits).tobytes(), len(bits)
+
+def _pool_bits(video_path: str, start: int, stop: int) -> np.ndarray:
+    """LSBs of frames [start, stop) decoded in one pool task."""
+    packed, nbits = get_pool().submit(_decode_range, video_path, start, stop).result()
+    return np.unpackbits(np.frombuffer(packed, dtype=np.uint8))[:nbits]
+
+def _ranged_bits(video_path: str, start: int, stop: int, workers: int):
+    """
+    Yield (bits, end_frame) for frames [start, stop) in frame order, decoded on
+    the shared worker pool (workers.get_pool, forked before cv2 or torch start
+    threads) FRAMES_PER_TASK frames at a time. Closing the generator early
+    cancels the ranges still queued.
+    """
+    pool = get_pool()
+    ranges = iter([(first, min(first + FRAMES_PER_TASK, stop))
+                   for first in range(start, stop, FRAMES_PER_TASK)])
+    pending = deque()
+
+    def submit_next():
+        frame_range = next(ranges, None)
+        if frame_range is not None:
+            pending.append((pool.submit(_decode_range, video_path, *frame_range),
+                            frame_range[1]))
+
+    # keep `workers` ranges in flight and consume them in frame order
+    for _ in range(workers):
+        submit_next()
+    try:
+        while pending:
+            future, end = pending.popleft()
+            packed, nbits = future.result()
+            submit_next()
+            yield np.unpackbits(np.frombuffer(packed, dtype=np.uint8))[:nbits], end
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+# =====================
+# Capacity
+# =====================
+def _probe_av(source):
+    try:
+        with av.open(source, "r") as container:
+            stream = container.streams.video[0]
+            frames = stream.frames
+            if not frames and container.duration and stream.average_rate:
+                # no frame count in the header: estimate from the duration, as OpenCV does
+                frames = round(container.duration / av.time_base * stream.average_rate)
+            return stream.codec_context.name, stream.width, stream.height, float(stream.average_rate or 0), frames
+    except (av.FFmpegError, IndexError):
+        raise ValueError("Invalid video file") from None
+
+def _probe_cv2(video_path: str):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Invalid video file")
+    try:
+        return (None, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+def video_capacity(source, parity: int = PAYLOAD_PARITY) -> dict:
+    """
+    Frame size, count and the largest message encode_video accepts, from the
+    container header. `source` may be a binary file object when PyAV is installed;
+    OpenCV needs a path.
+    """
+    codec, width, height, fps, frames = _probe_av(source) if av is not None else _probe_cv2(source)
+    return {"codec": codec, "width": width, "height": height, "fps": round(fps, 3), "frames": frames,
+            "capacity": [lsb_capacity(frames * width * height * 3, parity)]}
 
 # =====================
 # Encode for Video
 # =====================
-def encode_video(video_path: str, message: str, output_path: str):
+def _can_passthrough(video_path: str) -> bool:
+    """True when the source is already 8-bit RGB PNG video and PyAV can copy its packets."""
+    if av is None:
+        return False
+    try:
+        with av.open(video_path) as src:
+            ctx = src.streams.video[0].codec_context
+            return ctx.name == "png" and ctx.pix_fmt == "rgb24"
+    except (av.FFmpegError, IndexError):
+        return False
+
+def _encode_passthrough(video_path: str, binary: np.ndarray, output_path: str,
+                        total_frames: int = 0, progress: Progress = None):
+    """Re-encode only the payload-carrying frames; every later packet is copied untouched."""
+    with av.open(video_path) as src, av.open(output_path, "w") as dst:
+        in_stream = src.streams.video[0]
+        out_stream = dst.add_stream_from_template(in_stream)
+        encoder = av.CodecContext.create("png", "w")
+        encoder.width, encoder.height = in_stream.width, in_stream.height
+        encoder.pix_fmt = "rgb24"
+        encoder.time_base = in_stream.time_base
+
+        data_index = frames = 0
+        for packet in src.demux(in_stream):
+            if packet.dts is None:  # demuxer flush packet
+                continue
+            frames += 1
+            if progress is not None:
+                progress(frames, total_frames)
+            if data_index >= len(binary):
+                packet.stream = out_stream
+                dst.mux(packet)
+                continue
+            for frame in packet.decode():
+                pixels = frame.to_ndarray(format="bgr24")  # same sample order as OpenCV frames
+                flat = pixels.reshape(-1)
+                take = min(flat.size, len(binary) - data_index)
+                embed_bits(flat, binary[data_index:data_index + take])
+                data_index += take
+                new_frame = av.VideoFrame.from_ndarray(pixels, format="bgr24").reformat(format="rgb24")
+                for out_packet in encoder.encode(new_frame):
+                    out_packet.stream = out_stream
+                    out_packet.pts = out_packet.dts = frame.pts
+                    out_packet.time_base = in_stream.time_base
+                    dst.mux(out_packet)
+
+def encode_video(video_path: str, message: str, output_path: str, codec: str = DEFAULT_CODEC,
+                 progress: Progress = None, compression: str = PAYLOAD_COMPRESSION, parity: int = PAYLOAD_PARITY):
+    """
+    Hide `message`, packed in a payload container, in the leading frames and
+    write the clip with a lossless codec
+    (see LOSSLESS_CODECS; `output_path` should use the matching suffix).
+    PNG sources are handled packet by packet when PyAV is installed, so encode
+    time scales with the payload; otherwise every frame is decoded and
+    re-encoded losslessly, with LSB work only on the payload frames.
+    """
+    if codec not in LOSSLESS_CODECS:
+        raise ValueError(f"Unsupported codec '{codec}'. Choose one of: {', '.join(LOSSLESS_CODECS)}")
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError("Invalid video file")
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    fourcc = cv2.VideoWriter_fourcc(*LOSSLESS_CODECS[codec][0])
+    fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
     # Prepare binary message
-    binary = message_to_binary(message) + "1111111111111110"  # EOF marker
+    binary = bytes_to_bits(pack(message.encode("utf-8"), compression, parity))
     data_index = 0
     data_len = len(binary)
 
-    total_capacity = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) * width * height * 3
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    total_capacity = total_frames * width * height * 3
     if data_len > total_capacity:
         cap.release()
-        out.release()
         raise ValueError("Message too large to hide in this video.")
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    if codec == "png" and _can_passthrough(video_path):
+        cap.release()
+        _encode_passthrough(video_path, binary, output_path, total_frames, progress)
+        return
 
-        if data_index < data_len:
-            flat = frame.flatten()
-            for i in range(len(flat)):
-                if data_index < data_len:
-                    flat[i] = (flat[i] & np.uint8(254)) | np.uint8(int(binary[data_index]))
-                    data_index += 1
-            frame = flat.reshape(frame.shape)
+    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    if not out.isOpened():
+        cap.release()
+        raise ValueError(f"OpenCV cannot write {codec} video")
+    frames = 0
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
 
-        out.write(frame)
+            if data_index < data_len:
+                flat = frame.reshape(-1)  # view: writes land in `frame`
+                take = min(flat.size, data_len - data_index)
+                embed_bits(flat, binary[data_index:data_index + take])
+                data_index += take
 
-    cap.release()
-    out.release()
+            out.write(frame)
+            frames += 1
+            if progress is not None:
+                progress(frames, total_frames)
+    finally:
+        cap.release()
+        out.release()
 
 # =====================
 # Decode for Video
 # =====================
-def decode_video(video_path: str) -> str:
+def _decode_marker(video_path: str) -> str:
+    """
+    Clips written before the payload container: the LSBs up to the EOF marker,
+    searched for in the first LEGACY_SCAN_FRAMES frames only; "" when it is not there.
+    """
+    bits = _pool_bits(video_path, 0, LEGACY_SCAN_FRAMES)
+    end = _find_marker(bits)
+    return binary_to_message(bits[:end]) if end >= 0 else ""
+
+def decode_video(video_path: str, workers: int = VIDEO_WORKERS, progress: Progress = None) -> str:
+    """
+    Read the payload header from the first frame, then exactly the frames the
+    payload spans, as frame ranges decoded on the shared worker pool and stitched
+    back together in order; the calling thread only waits and stitches.
+    A damaged header or body raises ValueError without reading further.
+    """
+    workers = max(1, workers)
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError("Invalid video file")
-
-    binary = ""
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        flat = frame.flatten()
-        for val in flat:
-            binary += str(val & 1)
-            if binary.endswith("1111111111111110"):  # EOF marker
-                cap.release()
-                return binary_to_message(binary[:-16])
-
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
-    return binary_to_message(binary)
-
-# =====================
-# API Routes
-# =====================
-@app.post("/encode")
-async def encode(file: UploadFile = File(...), message: str = Form(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_in:
-        tmp_in.write(await file.read())
-        tmp_in_path = tmp_in.name
+    first = _pool_bits(video_path, 0, 1)
+    if not first.size:
+        return ""
+    header = parse_header(bits_to_bytes(first[:HEADER_BITS]))
+    if header is None:
+        return _decode_marker(video_path)
 
-    tmp_out_path = tempfile.mktemp(suffix=".mp4")
-
-    try:
-        encode_video(tmp_in_path, message, tmp_out_path)
-        return FileResponse(
-            tmp_out_path,
-            filename="encoded.mp4",
-            media_type="video/mp4"
-        )
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=400)
-    finally:
-        os.remove(tmp_in_path)
-
-@app.post("/decode")
-async def decode(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_in:
-        tmp_in.write(await file.read())
-        tmp_in_path = tmp_in.name
-
-    try:
-        message = decode_video(tmp_in_path)
-        return {"decoded_message": message}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=400)
-    finally:
-        os.remove(tmp_in_path)
+    frames_needed = -(-header.total_bits // first.size)
+    if frames_needed > max(total_frames, 1):
+        raise ValueError("Corrupted payload header: length exceeds the video capacity")
+    parts = [first]
+    if progress is not None:
+        progress(1, frames_needed)
+    for chunk, end in _ranged_bits(video_path, 1, frames_needed, workers):
+        parts.append(chunk)
+        if progress is not None:
+            progress(end, frames_needed)
+    payload = bits_to_bytes(np.concatenate(parts)[:header.total_bits])
+    return unpack(header, payload[HEADER_SIZE:]).decode("utf-8", errors="replace")
@@ -0,0 +1,32 @@
+# workers.py
+# Shared process pool that keeps CPU-bound stego work off the event loop.
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from metrics import record_samples, traced
+
+# Number of worker processes; defaults to one per core
+STEGO_WORKERS = int(os.environ.get("STEGO_WORKERS", "0")) or os.cpu_count() or 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=STEGO_WORKERS)
+    return _pool
+
+async def run_in_pool(fn, *args):
+    """Run a picklable top-level function in the pool and await its result."""
+    loop = asyncio.get_running_loop()
+    result, samples = await loop.run_in_executor(get_pool(), traced, fn, *args)
+    record_samples(samples)  # stage timings measured in the worker
+    return result
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None